@@ -26,6 +26,8 @@ class JobAdaptor(object):
     name = 'Abstract adapter'
     #: Remote status need to be mapped with WAVES expected job status
     _states_map = {}
+    #: Prepared jobs from a same submission are launched at once with :func:`run_jobs`
+    bulk_launch = False
 
     def __str__(self):
         return self.__class__.__name__
@@ -129,6 +131,25 @@ class JobAdaptor(object):
         job.status = JobStatus.JOB_QUEUED
         return job
 
+    @check_ready
+    def run_jobs(self, jobs):
+        """ Launch a list of 'prepared' jobs at once, whenever concrete adaptor allows it (see :attr:`bulk_launch`
+        and :func:`_run_jobs`)
+
+        :param jobs: list of jobs to launch
+        :raise: :class:`waves.wcore.adaptors.exceptions.JobRunException` if error during launch
+        :raise: :class:`waves.wcore.adaptors.exceptions.JobInconsistentStateError` if a job status is not 'prepared'
+        :return: the list of launched jobs
+        """
+        for job in jobs:
+            if job.status != JobStatus.JOB_PREPARED:
+                raise JobInconsistentStateError(job=job, expected=[JobStatus.STATUS_LIST[2]])
+        self.connect()
+        self._run_jobs(jobs)
+        for job in jobs:
+            job.status = JobStatus.JOB_QUEUED
+        return jobs
+
     @check_ready
     def cancel_job(self, job):
         """ Cancel a running job on adapter class, if possible
@@ -147,12 +168,10 @@ class JobAdaptor(object):
             self._cancel_job(job)
             job.status = JobStatus.JOB_CANCELLED
         except AdaptorException as exc:
-            job.job_history.create(
-                message="Job for %s '%s' could not be remotely cancelled: %s " % (self.__class__.__name__,
-                                                                                  job.remote_job_id,
-                                                                                  exc.message),
-                status=job.status,
-                is_admin=True)
+            job.add_history("Job for %s '%s' could not be remotely cancelled: %s " % (self.__class__.__name__,
+                                                                                      job.remote_job_id,
+                                                                                      exc.message),
+                            is_admin=True)
         return job
 
     @check_ready
@@ -163,11 +182,38 @@ class JobAdaptor(object):
         :return: one of `waves.wcore.adaptors.STATUS_MAP`
         """
         self.connect()
-        job.status = self._states_map[self._job_status(job)]
-        job.logger.info('Current remote state %s mapped to %s', self._job_status(job),
-                        JobStatus.STATUS_MAP.get(job.status, 'Undefined'))
+        self._update_status(job, self._job_status(job))
         return job
 
+    @check_ready
+    def jobs_status(self, jobs):
+        """ Update current WAVES status for a list of jobs run on this adaptor, remote states are retrieved at once
+        whenever concrete adaptor allows it (see :func:`_jobs_status`)
+
+        :param jobs: list of jobs
+        :return: the list of jobs which status has been updated
+        """
+        self.connect()
+        remote_states = self._jobs_status(jobs)
+        checked = []
+        for job in jobs:
+            try:
+                if job.remote_job_id in remote_states:
+                    remote_state = remote_states[job.remote_job_id]
+                else:
+                    remote_state = self._job_status(job)
+                self._update_status(job, remote_state)
+                checked.append(job)
+            except AdaptorException as exc:
+                job.logger.warning('Unable to retrieve remote state: %s', exc.message)
+        return checked
+
+    def _update_status(self, job, remote_state):
+        """ Map remote state to WAVES job status """
+        job.status = self._states_map[remote_state]
+        job.logger.info('Current remote state %s mapped to %s', remote_state,
+                        JobStatus.STATUS_MAP.get(job.status, 'Undefined'))
+
     @check_ready
     def job_results(self, job):
         """ If job is done, return results
@@ -229,6 +275,13 @@ class JobAdaptor(object):
         :raise: `waves.wcore.adaptors.exception.AdaptorException` if error """
         raise NotImplementedError()
 
+    def _run_jobs(self, jobs):
+        """ Launch a list of jobs on concrete adapter, by default each job is launched with :func:`_run_job`
+
+        :raise: `waves.wcore.adaptors.exception.AdaptorException` if error """
+        for job in jobs:
+            self._run_job(job)
+
     def _cancel_job(self, job):
         """ Try to cancel job on concrete adapter
 
@@ -241,6 +294,15 @@ class JobAdaptor(object):
         :raise: `waves.wcore.adaptors.exception.AdaptorException` if error """
         raise NotImplementedError()
 
+    def _jobs_status(self, jobs):
+        """ Retrieve remote states for a list of jobs with a single call to concrete adapter if possible, by default
+        nothing is retrieved and each job state is retrieved with :func:`_job_status`
+
+        :raise: `waves.wcore.adaptors.exception.AdaptorException` if error
+        :return: dictionary {remote_job_id: raw value to be mapped with defined in _states_map}
+        """
+        return {}
+
     def _job_results(self, job):
         """ Retrieve job results from concrete adapter, may include some file download from remote hosts
         Set attribute result_available for job if success
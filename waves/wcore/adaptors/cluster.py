@@ -1,8 +1,82 @@
 from __future__ import unicode_literals
 
+import logging
+import posixpath
+import re
+import uuid
+
+import radical.saga as saga
+from django.utils.six.moves import shlex_quote
+
+from waves.wcore.adaptors.const import JobRunDetails
+from waves.wcore.adaptors.exceptions import AdaptorJobException
 from waves.wcore.adaptors.shell import SshKeyShellAdaptor, SshShellAdaptor
 from waves.wcore.adaptors.saga_python import SagaAdaptor
 
+logger = logging.getLogger(__name__)
+
+SGE_STATES = {
+    'r': saga.job.RUNNING, 't': saga.job.RUNNING, 'Rr': saga.job.RUNNING, 'Rt': saga.job.RUNNING,
+    'qw': saga.job.PENDING, 'hqw': saga.job.PENDING, 'hRwq': saga.job.PENDING, 'Rq': saga.job.PENDING,
+    's': saga.job.SUSPENDED, 'S': saga.job.SUSPENDED, 'T': saga.job.SUSPENDED, 'ts': saga.job.SUSPENDED,
+    'Eqw': saga.job.FAILED, 'dr': saga.job.CANCELED, 'dt': saga.job.CANCELED,
+}
+SLURM_STATES = {
+    'PD': saga.job.PENDING, 'CF': saga.job.PENDING, 'R': saga.job.RUNNING, 'CG': saga.job.RUNNING,
+    'S': saga.job.SUSPENDED, 'CD': saga.job.DONE, 'CA': saga.job.CANCELED, 'F': saga.job.FAILED,
+    'TO': saga.job.FAILED, 'NF': saga.job.FAILED,
+}
+PBS_STATES = {
+    'Q': saga.job.PENDING, 'W': saga.job.PENDING, 'H': saga.job.PENDING, 'T': saga.job.PENDING,
+    'R': saga.job.RUNNING, 'E': saga.job.RUNNING, 'B': saga.job.RUNNING, 'S': saga.job.SUSPENDED,
+    'C': saga.job.DONE, 'F': saga.job.DONE,
+}
+
+#: Job arrays support per scheduler: submission command, task index environment variable, native task id format
+#: and single task cancel command
+ARRAY_COMMANDS = {
+    'sge': dict(submit='qsub -terse -S /bin/bash -t 1-%(size)i %(options)s %(script)s', queue='-q',
+                task_var='SGE_TASK_ID', task_id='%(array_id)s.%(task)s',
+                cancel='qdel %(array_id)s -t %(task)s'),
+    'slurm': dict(submit='sbatch --parsable --array=1-%(size)i %(options)s %(script)s', queue='-p',
+                  task_var='SLURM_ARRAY_TASK_ID', task_id='%(array_id)s_%(task)s',
+                  cancel='scancel %(array_id)s_%(task)s'),
+    'pbspro': dict(submit='qsub -J 1-%(size)i %(options)s %(script)s', queue='-q',
+                   task_var='PBS_ARRAY_INDEX', task_id='%(array_id)s[%(task)s]',
+                   cancel="qdel '%(array_id)s[%(task)s]'"),
+    'torque': dict(submit='qsub -t 1-%(size)i %(options)s %(script)s', queue='-q',
+                   task_var='PBS_ARRAYID', task_id='%(array_id)s[%(task)s]',
+                   cancel="qdel -t %(task)s '%(array_id)s[]'"),
+}
+
+
+class ArrayTask(object):
+    """ Reference to a job array task, stored in job remote_job_id as 'array:<array id>:<task index>:<exit files>',
+    each task writes its exit code in its own file, named after array exit files prefix and task index
+    """
+    PREFIX = 'array'
+
+    def __init__(self, array_id, task, exit_file):
+        self.array_id = array_id
+        self.task = int(task)
+        self.exit_file = exit_file
+
+    def __str__(self):
+        return '%s:%s:%i:%s' % (self.PREFIX, self.array_id, self.task, self.exit_file)
+
+    @property
+    def task_exit_file(self):
+        """ Task exit code file path """
+        return '%s.%i' % (self.exit_file, self.task)
+
+    @classmethod
+    def parse(cls, remote_job_id):
+        """ Retrieve task from job remote id, None if job is not part of a job array """
+        if not remote_job_id or not str(remote_job_id).startswith(cls.PREFIX + ':'):
+            return None
+        _, array_id, task, exit_file = str(remote_job_id).split(':', 3)
+        return cls(array_id, task, exit_file)
+
 
 class LocalClusterAdaptor(SagaAdaptor):
     """
@@ -33,11 +107,224 @@ class LocalClusterAdaptor(SagaAdaptor):
         base.update(dict(queue=self.queue))
         return base
 
+    #: Scheduler command listing all jobs states at once: (command, state code column, state codes map, task index
+    #: column), job id is expected in first column, job arrays tasks are listed one per line. Task index is either
+    #: part of job id (slurm '1234_1', pbs '1234[1].server') or in its own column (sge 'ja-task-ID', last column)
+    _status_commands = {
+        'sge': ('qstat -g d', 4, SGE_STATES, -1),
+        'slurm': ("squeue -h -r -o '%i %t'", 1, SLURM_STATES, None),
+        'pbs': ('qstat', 4, PBS_STATES, None),
+        'pbspro': ('qstat -t', 4, PBS_STATES, None),
+        'torque': ('qstat -t', 4, PBS_STATES, None),
+    }
+
     def _job_description(self, job):
         jd = super(LocalClusterAdaptor, self)._job_description(job)
         jd.update(dict(queue=self.queue))
         return jd
 
+    @property
+    def bulk_launch(self):
+        """ Prepared jobs from a same submission are launched as a single job array when scheduler supports it """
+        return self.protocol in ARRAY_COMMANDS
+
+    def _run_command(self, shell, command):
+        """ Run a scheduler command in shell, return command output """
+        try:
+            ret, out, err = shell.run_sync(command)
+        except saga.SagaException as exc:
+            raise AdaptorJobException(exc.message)
+        if ret != 0:
+            raise AdaptorJobException('Scheduler command failed [%s]: %s' % (command, err))
+        return out
+
+    @staticmethod
+    def array_script(descriptions, task_var, exit_file):
+        """ Job array dispatch script: run task's job command line in job working dir, then write task exit code
+        to task exit file (see :attr:`ArrayTask.task_exit_file`)
+
+        :param descriptions: jobs descriptions (see :func:`_job_description`), in tasks order
+        :param task_var: scheduler environment variable holding current task index
+        :param exit_file: tasks exit codes files prefix
+        :return: script content
+        """
+        lines = ['#!/bin/bash', 'case "$%s" in' % task_var]
+        for task, desc in enumerate(descriptions, 1):
+            lines.append('    %i) cd %s && %s %s > %s 2> %s ;;' % (
+                task, shlex_quote(desc['working_directory']), desc['executable'], desc['arguments'] or '',
+                shlex_quote(desc['output']), shlex_quote(desc['error'])))
+        lines.extend(['    *) exit 1 ;;',
+                      'esac',
+                      'code=$?',
+                      'echo "$%s $code" > %s.$%s' % (task_var, shlex_quote(exit_file), task_var),
+                      'exit $code', ''])
+        return '\n'.join(lines)
+
+    def _run_jobs(self, jobs):
+        """ Submit jobs as a single job array, dispatch script and tasks exit codes files are stored in jobs working
+        dirs parent, each job remote_job_id references its task (see :class:`ArrayTask`). Dispatch script is
+        removed once submitted (schedulers spool a copy), task exit file once task results are retrieved """
+        if len(jobs) < 2 or self.protocol not in ARRAY_COMMANDS:
+            return super(LocalClusterAdaptor, self)._run_jobs(jobs)
+        array = ARRAY_COMMANDS[self.protocol]
+        descriptions = [self._job_description(job) for job in jobs]
+        # jobs working dirs parent, remote jobs working dirs may be removed once results are retrieved
+        script_dir = posixpath.dirname(descriptions[0]['working_directory'].rstrip('/'))
+        name = 'waves_array_%s' % uuid.uuid4().hex[:8]
+        script = posixpath.join(script_dir, name + '.sh')
+        exit_file = posixpath.join(script_dir, name + '.exit')
+        options = ['-o /dev/null', '-e /dev/null']
+        if self.queue:
+            options.append('%s %s' % (array['queue'], shlex_quote(self.queue)))
+        submit = array['submit'] % dict(size=len(jobs), options=' '.join(options), script=shlex_quote(script))
+        command = 'cd %s && %s' % (shlex_quote(script_dir), submit)
+        shell = self._init_shell()
+        try:
+            shell.write_to_remote(self.array_script(descriptions, array['task_var'], exit_file), script)
+            out = self._run_command(shell, command)
+        except saga.SagaException as exc:
+            raise AdaptorJobException(exc.message)
+        finally:
+            try:
+                shell.run_sync('rm -f %s' % shlex_quote(script))
+            finally:
+                shell.finalize(kill_pty=True)
+        # sge: '1234.1-10:1', slurm: '1234' or '1234;cluster', pbs: '1234[].server'
+        array_id = re.split(r'[.;\[]', out.strip().splitlines()[-1] if out.strip() else '')[0]
+        if not array_id:
+            raise AdaptorJobException('Unable to read job array id from scheduler output [%s]' % out)
+        for task, job in enumerate(jobs, 1):
+            job.remote_job_id = str(ArrayTask(array_id, task, exit_file))
+            job.logger.debug('Submitted as task %i of job array %s', task, array_id)
+        logger.info('Submitted %i jobs as job array %s', len(jobs), array_id)
+        return jobs
+
+    def _scheduler_states(self, shell):
+        """ List all jobs states with one scheduler query, keyed by native job id, job array tasks are keyed by
+        their native task id (see ``ARRAY_COMMANDS``) and also referenced by their array id """
+        command, column, states, task_column = self._status_commands[self.protocol]
+        native_states = {}
+        for line in self._run_command(shell, command).splitlines():
+            columns = line.split()
+            if len(columns) <= column or columns[column] not in states:
+                continue
+            state = states[columns[column]]
+            native_id = columns[0].split('.')[0]
+            if task_column is not None and len(columns) > column + 1 and columns[task_column].isdigit():
+                # non array jobs lines get a meaningless extra key (i.e slots count), never looked up
+                native_states['%s.%s' % (native_id, columns[task_column])] = state
+                native_states.setdefault(native_id, state)
+            else:
+                native_states[native_id] = state
+            native_states.setdefault(re.split(r'[\[_]', native_id)[0], state)
+        return native_states
+
+    def _array_exit_codes(self, shell, exit_files):
+        """ Read job arrays tasks exit codes files
+
+        :param exit_files: job arrays exit files prefixes
+        :return: exit codes keyed by (exit files prefix, task index)
+        """
+        exit_codes = {}
+        for exit_file in exit_files:
+            ret, out, _ = shell.run_sync('cat %s.* 2>/dev/null' % shlex_quote(exit_file))
+            if ret != 0:
+                continue
+            for line in out.splitlines():
+                parts = line.split()
+                if len(parts) == 2 and parts[0].isdigit():
+                    code = int(parts[1]) if parts[1].lstrip('-').isdigit() else None
+                    exit_codes[(exit_file, int(parts[0]))] = code
+        return exit_codes
+
+    def _task_state(self, task, native_states, exit_codes):
+        """ Job array task state: done once its exit code is written, otherwise task (or array) scheduler state,
+        failed if not listed anymore by scheduler """
+        if (task.exit_file, task.task) in exit_codes:
+            return saga.job.DONE
+        native_id = ARRAY_COMMANDS[self.protocol]['task_id'] % dict(array_id=task.array_id, task=task.task)
+        if native_id in native_states:
+            return native_states[native_id]
+        return native_states.get(task.array_id, saga.job.FAILED)
+
+    def _jobs_status(self, jobs):
+        """ Retrieve all jobs states with one scheduler query (i.e qstat, squeue), jobs not listed anymore by
+        scheduler (i.e finished ones) are left to single job status retrieval, except job arrays tasks whose
+        states are always resolved """
+        if self.protocol not in self._status_commands:
+            return super(LocalClusterAdaptor, self)._jobs_status(jobs)
+        tasks = dict((job.remote_job_id, ArrayTask.parse(job.remote_job_id)) for job in jobs)
+        shell = self._init_shell()
+        try:
+            native_states = self._scheduler_states(shell)
+            exit_codes = self._array_exit_codes(shell, set(task.exit_file for task in tasks.values() if task))
+        except saga.SagaException as exc:
+            raise AdaptorJobException(exc.message)
+        finally:
+            shell.finalize(kill_pty=True)
+        remote_states = {}
+        for job in jobs:
+            task = tasks[job.remote_job_id]
+            if task is not None:
+                remote_states[job.remote_job_id] = self._task_state(task, native_states, exit_codes)
+                continue
+            native_id = self.native_job_id(job.remote_job_id).split('.')[0]
+            if native_id in native_states:
+                remote_states[job.remote_job_id] = native_states[native_id]
+        logger.debug('Retrieved %i states for %i jobs', len(remote_states), len(jobs))
+        return remote_states
+
+    def _job_status(self, job):
+        if ArrayTask.parse(job.remote_job_id) is not None:
+            return self._jobs_status([job])[job.remote_job_id]
+        return super(LocalClusterAdaptor, self)._job_status(job)
+
+    def _cancel_job(self, job):
+        task = ArrayTask.parse(job.remote_job_id)
+        if task is None:
+            return super(LocalClusterAdaptor, self)._cancel_job(job)
+        shell = self._init_shell()
+        try:
+            cancel = ARRAY_COMMANDS[self.protocol]['cancel'] % dict(array_id=task.array_id, task=task.task)
+            self._run_command(shell, cancel)
+        finally:
+            shell.finalize(kill_pty=True)
+        return job
+
+    def _remote_exit_code(self, job):
+        task = ArrayTask.parse(job.remote_job_id)
+        if task is None:
+            return super(LocalClusterAdaptor, self)._remote_exit_code(job)
+        shell = self._init_shell()
+        try:
+            exit_codes = self._array_exit_codes(shell, [task.exit_file])
+        except saga.SagaException as exc:
+            raise AdaptorJobException(exc.message)
+        finally:
+            shell.finalize(kill_pty=True)
+        return exit_codes.get((task.exit_file, task.task))
+
+    def _job_results(self, job):
+        job = super(LocalClusterAdaptor, self)._job_results(job)
+        task = ArrayTask.parse(job.remote_job_id)
+        if task is not None:
+            # task exit code is now stored in job
+            shell = self._init_shell()
+            try:
+                shell.run_sync('rm -f %s' % shlex_quote(task.task_exit_file))
+            except saga.SagaException as exc:
+                job.logger.warning('Unable to remove task exit file %s: %s', task.task_exit_file, exc.message)
+            finally:
+                shell.finalize(kill_pty=True)
+        return job
+
+    def _job_run_details(self, job):
+        task = ArrayTask.parse(job.remote_job_id)
+        if task is None:
+            return super(LocalClusterAdaptor, self)._job_run_details(job)
+        native_id = ARRAY_COMMANDS[self.protocol]['task_id'] % dict(array_id=task.array_id, task=task.task)
+        return JobRunDetails(job.id, str(job.slug), native_id, job.title, job.exit_code, '', '', '', [])
+
 
 class SshClusterAdaptor(LocalClusterAdaptor, SshShellAdaptor):
     """
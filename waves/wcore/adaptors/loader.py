@@ -1,6 +1,8 @@
 from __future__ import unicode_literals
 
 import json
+import threading
+from collections import OrderedDict
 
 from waves.wcore.adaptors.exceptions import AdaptorNotAvailableException
 from waves.wcore.settings import import_from_string
@@ -8,7 +10,43 @@ from waves.wcore.settings import import_from_string
 __all__ = ['AdaptorLoader']
 
 
+class LRUCache(object):
+    """ Simple thread safe LRU cache, bounded to 'size' entries """
+
+    def __init__(self, size):
+        self.size = size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.pop(key, None)
+            if value is not None:
+                self._data[key] = value
+            return value
+
+    def set(self, key, value):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
 class AdaptorLoader(object):
+    #: Decoded serialized adaptors (class, init params), keyed by serialized string
+    _cache = None
+    _classes = None
+    _classes_source = None
 
     @classmethod
     def get_adaptors(cls):
@@ -16,25 +54,56 @@ class AdaptorLoader(object):
         return sorted([adaptor_class() for adaptor_class in waves_settings.ADAPTORS_CLASSES])
 
     @classmethod
-    def load(cls, clazz, **params):
+    def available_classes(cls):
+        """ Configured adaptors classes, indexed by class """
         from waves.wcore.settings import waves_settings
+        if cls._classes_source is not waves_settings.ADAPTORS_CLASSES:
+            cls._classes = dict((clazz, clazz) for clazz in waves_settings.ADAPTORS_CLASSES)
+            cls._classes_source = waves_settings.ADAPTORS_CLASSES
+        return cls._classes
 
+    @classmethod
+    def load(cls, clazz, **params):
         if params is None:
             params = {}
-        loaded = next((x(**params) for x in waves_settings.ADAPTORS_CLASSES if x == clazz), None)
+        loaded = cls.available_classes().get(clazz)
         if loaded is None:
             raise AdaptorNotAvailableException("This adapter class %s is not available " % clazz)
-        return loaded
+        return loaded(**params)
 
     @classmethod
     def serialize(cls, adaptor):
         return adaptor.serialize()
 
+    @classmethod
+    def cache(cls):
+        if cls._cache is None:
+            from waves.wcore.settings import waves_settings
+            cls._cache = LRUCache(waves_settings.ADAPTORS_CACHE_SIZE)
+        return cls._cache
+
     @classmethod
     def unserialize(cls, serialized):
-        json_data = json.loads(serialized)
-        clazz = import_from_string(json_data['clazz'])
-        return cls.load(clazz, **json_data['params'])
+        """ Create a new adaptor instance from its serialized value, decoded values are cached.
+
+        .. note::
+            A new instance is returned on each call, adaptors instances hold their own connection and are not
+            meant to be shared between threads.
+        """
+        decoded = cls.cache().get(serialized)
+        if decoded is None:
+            json_data = json.loads(serialized)
+            decoded = (import_from_string(json_data['clazz']), json_data['params'])
+            cls.cache().set(serialized, decoded)
+        clazz, params = decoded
+        return cls.load(clazz, **params)
+
+    @classmethod
+    def invalidate(cls):
+        """ Drop decoded adaptors cache (i.e when runners configuration changes) """
+        if cls._cache is not None:
+            cls._cache.clear()
+        cls._classes_source = None
 
     @classmethod
     def get_class_names(cls):
@@ -0,0 +1,377 @@
+"""
+Local processes job adaptor
+
+Jobs command lines are run as direct child processes of current WAVES process (i.e queue daemon), without
+saga-python shell wrapper: each process exit is caught by a dedicated waiter thread blocked on child termination,
+remote status is read from memory, without any polling of the process table.
+
+Queued jobs state is kept in job working dir (pending file), any WAVES process (another queue worker, or after a
+restart) checking such a job status queues it again in its own registry. Pending file removal is the launch token:
+a job is launched once, whatever the number of processes it is queued in.
+"""
+from __future__ import unicode_literals
+
+import errno
+import logging
+import multiprocessing
+import os
+import shlex
+import signal
+import subprocess
+import sys
+import threading
+from collections import deque
+from os.path import join
+
+from waves.wcore.adaptors import JobAdaptor
+from waves.wcore.adaptors.const import JobStatus
+from waves.wcore.adaptors.exceptions import AdaptorJobException
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['LocalProcessAdaptor', 'ProcessRegistry', 'process_registry', 'popen']
+
+#: File written in job working dir with process id once launched
+PID_FILE = '.waves_pid'
+#: File written in job working dir with process exit code once terminated
+EXIT_FILE = '.waves_exit_code'
+#: File kept in job working dir while job is queued, removed by process launching it (or on cancel)
+PENDING_FILE = '.waves_pending'
+#: File written in job working dir when job is cancelled
+CANCEL_FILE = '.waves_cancelled'
+
+#: Child process wrapper, instead of Popen preexec_fn (not safe in multi threaded processes): new session (process
+#: group killed at once), resources limits, then command exec
+EXEC_WRAPPER = '; '.join([
+    'import os, resource, sys',
+    'os.setsid()',
+    'cpu_time, memory = int(sys.argv[1]), int(sys.argv[2])',
+    'cpu_time and resource.setrlimit(resource.RLIMIT_CPU, (cpu_time, cpu_time))',
+    'memory and resource.setrlimit(resource.RLIMIT_AS, (memory, memory))',
+    'os.execvp(sys.argv[3], sys.argv[3:])',
+])
+
+PENDING = 'pending'
+RUNNING = 'running'
+
+
+def popen(args, cpu_time=0, memory=0, **kwargs):
+    """ Start a command in its own session (see :data:`EXEC_WRAPPER`)
+
+    :param args: command line arguments list
+    :param cpu_time: CPU time limit (seconds), 0 for none
+    :param memory: address space limit (bytes), 0 for none
+    :param kwargs: :class:`subprocess.Popen` extra arguments
+    :return: Popen
+    """
+    return subprocess.Popen([sys.executable, '-c', EXEC_WRAPPER, str(int(cpu_time)), str(int(memory))] + list(args),
+                            **kwargs)
+
+
+def kill(pid):
+    """ Terminate process group, or process itself if it has not set up its own session yet (see :func:`popen`)
+
+    :raise: OSError if process does not exist
+    """
+    try:
+        os.killpg(pid, signal.SIGTERM)
+    except OSError as exc:
+        if exc.errno != errno.ESRCH:
+            raise
+        os.kill(pid, signal.SIGTERM)
+
+
+class ProcessRegistry(object):
+    """
+    Process wide registry of local job processes.
+
+    Launches are bounded per adaptor configuration: when ``max_jobs`` processes are running, next ones are kept
+    pending and started as soon as a running process exits.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._processes = {}
+        self._pending = {}
+        self._running = {}
+        self._returncodes = {}
+        self._cancelled = set()
+
+    def submit(self, limit_key, max_jobs, job_key, launcher):
+        """ Launch a process, or keep it pending if ``max_jobs`` processes are already running for limit key
+
+        :param limit_key: key processes count is limited on (i.e adaptor configuration)
+        :param max_jobs: max running processes for limit key
+        :param job_key: process key (i.e job remote id)
+        :param launcher: callable returning a tuple (started Popen process, exit code file path), None if process
+            has not to be launched anymore (i.e launched by another WAVES process, or cancelled)
+        """
+        with self._lock:
+            self._returncodes.pop(job_key, None)
+            self._cancelled.discard(job_key)
+            if self._running.get(limit_key, 0) >= max_jobs:
+                self._pending.setdefault(limit_key, deque()).append((job_key, launcher))
+                return
+            self._running[limit_key] = self._running.get(limit_key, 0) + 1
+        self._start(limit_key, job_key, launcher)
+
+    def _start(self, limit_key, job_key, launcher):
+        try:
+            launched = launcher()
+        except Exception as exc:
+            logger.error('Unable to launch local process %s: %s', job_key, exc)
+            self._terminated(limit_key, job_key, None, None)
+            return
+        if launched is None:
+            # process state is left to whoever launched or cancelled it
+            self._terminated(limit_key, job_key, None, None, forget=True)
+            return
+        process, exit_file = launched
+        with self._lock:
+            self._processes[job_key] = process
+        waiter = threading.Thread(target=self._wait, args=(limit_key, job_key, process, exit_file),
+                                  name='waves-wait-%s' % process.pid)
+        waiter.daemon = True
+        waiter.start()
+
+    def _wait(self, limit_key, job_key, process, exit_file):
+        """ Block until process terminates, then start next pending process if any """
+        self._terminated(limit_key, job_key, process.wait(), exit_file)
+
+    def _terminated(self, limit_key, job_key, returncode, exit_file, forget=False):
+        if exit_file is not None:
+            try:
+                with open(exit_file, 'w') as fp:
+                    fp.write('%s' % returncode)
+            except IOError as exc:
+                logger.warning('Unable to write exit code for %s: %s', job_key, exc)
+        with self._lock:
+            self._processes.pop(job_key, None)
+            if not forget:
+                self._returncodes[job_key] = returncode
+            pending = self._pending.get(limit_key)
+            if pending:
+                next_key, next_launcher = pending.popleft()
+            else:
+                next_key = None
+                self._running[limit_key] = max(0, self._running.get(limit_key, 0) - 1)
+        if next_key is not None:
+            self._start(limit_key, next_key, next_launcher)
+
+    def state(self, job_key):
+        """ Process state: 'pending', 'running', or a tuple (exit code, cancelled) when terminated, None if unknown
+        """
+        with self._lock:
+            if job_key in self._processes:
+                return RUNNING
+            if job_key in self._returncodes:
+                return self._returncodes[job_key], job_key in self._cancelled
+            if any(key == job_key for pending in self._pending.values() for key, _ in pending):
+                return PENDING
+        return None
+
+    def forget(self, job_key):
+        """ Drop terminated process state, once reported (job working dir files hold it afterwards) """
+        with self._lock:
+            self._returncodes.pop(job_key, None)
+            self._cancelled.discard(job_key)
+
+    def cancel(self, job_key):
+        """ Remove pending process, or kill running process group
+
+        :return: True if process was known
+        """
+        with self._lock:
+            for pending in self._pending.values():
+                for item in list(pending):
+                    if item[0] == job_key:
+                        pending.remove(item)
+                        self._returncodes[job_key] = None
+                        self._cancelled.add(job_key)
+                        return True
+            process = self._processes.get(job_key)
+            if process is None:
+                return False
+            self._cancelled.add(job_key)
+        try:
+            kill(process.pid)
+        except OSError as exc:
+            if exc.errno != errno.ESRCH:
+                raise
+        return True
+
+
+#: Process wide local processes registry
+process_registry = ProcessRegistry()
+
+
+class LocalProcessAdaptor(JobAdaptor):
+    """
+    Run job command lines as local processes, command line tools must be in path or specified as absolute path.
+
+    Each process runs in its own process group, with optional CPU time (seconds) and memory (MB) limits. At most
+    ``max_jobs`` processes run at once for a same adaptor configuration (default to CPU count), others are queued.
+
+    .. note::
+        Processes are children of the process which launched them, status is retrieved from memory, or from exit code
+        file written in job working dir: run the queue with the queue daemon (see :mod:`waves.wcore.management.runner`).
+        Concurrent processes limit applies per WAVES process.
+    """
+    name = 'Local processes'
+    protocol_default = 'local'
+    _states_map = {
+        JobStatus.JOB_UNDEFINED: JobStatus.JOB_UNDEFINED,
+        JobStatus.JOB_QUEUED: JobStatus.JOB_QUEUED,
+        JobStatus.JOB_RUNNING: JobStatus.JOB_RUNNING,
+        JobStatus.JOB_CANCELLED: JobStatus.JOB_CANCELLED,
+        JobStatus.JOB_COMPLETED: JobStatus.JOB_COMPLETED,
+        JobStatus.JOB_ERROR: JobStatus.JOB_ERROR,
+    }
+
+    def __init__(self, command=None, protocol='local', host='localhost', max_jobs=0, cpu_time=0, memory=0,
+                 **kwargs):
+        super(LocalProcessAdaptor, self).__init__(command, protocol, host, **kwargs)
+        self.max_jobs = max_jobs
+        self.cpu_time = cpu_time
+        self.memory = memory
+
+    @property
+    def init_params(self):
+        params = super(LocalProcessAdaptor, self).init_params
+        params.update(dict(max_jobs=self.max_jobs, cpu_time=self.cpu_time, memory=self.memory))
+        return params
+
+    @property
+    def limit_key(self):
+        return '%s:%s' % (self.command, self.max_jobs)
+
+    @property
+    def max_running(self):
+        return int(self.max_jobs or 0) or multiprocessing.cpu_count()
+
+    def connexion_string(self):
+        return 'local://%s' % self.host
+
+    def _connect(self):
+        self.connector = process_registry
+        self._connected = True
+
+    def _disconnect(self):
+        self.connector = None
+        self._connected = False
+
+    def _prepare_job(self, job):
+        job.logger.info('Nothing to prepare, we are local')
+        return job
+
+    def _launcher(self, job):
+        working_dir = job.working_dir
+        args = [self.command] + shlex.split(job.command_line_arguments or '')
+        stdout = join(working_dir, job.stdout)
+        stderr = join(working_dir, job.stderr)
+        cpu_time = int(self.cpu_time or 0)
+        memory = int(self.memory or 0) * 1024 * 1024
+
+        def launch():
+            try:
+                os.remove(join(working_dir, PENDING_FILE))
+            except OSError as exc:
+                if exc.errno == errno.ENOENT:
+                    # already launched by another process, or cancelled
+                    return None
+                raise
+            try:
+                with open(stdout, 'wb') as out, open(stderr, 'wb') as err:
+                    process = popen(args, cpu_time, memory, cwd=working_dir, stdout=out, stderr=err,
+                                    close_fds=True)
+            except (IOError, OSError):
+                # launch failure is reported as an error exit code
+                with open(join(working_dir, EXIT_FILE), 'w') as fp:
+                    fp.write('-1')
+                raise
+            with open(join(working_dir, PID_FILE), 'w') as fp:
+                fp.write('%s' % process.pid)
+            return process, join(working_dir, EXIT_FILE)
+
+        return launch
+
+    def _run_job(self, job):
+        for file_name in (PID_FILE, EXIT_FILE, CANCEL_FILE):
+            if os.path.exists(join(job.working_dir, file_name)):
+                os.remove(join(job.working_dir, file_name))
+        job.remote_job_id = 'local-%s' % job.slug
+        open(join(job.working_dir, PENDING_FILE), 'w').close()
+        self.connector.submit(self.limit_key, self.max_running, job.remote_job_id, self._launcher(job))
+        return job
+
+    def _cancel_job(self, job):
+        open(join(job.working_dir, CANCEL_FILE), 'w').close()
+        try:
+            # job queued in any process is not launched anymore
+            os.remove(join(job.working_dir, PENDING_FILE))
+            pending = True
+        except OSError:
+            pending = False
+        if not self.connector.cancel(job.remote_job_id) and not pending:
+            pid = self._read_file(job, PID_FILE)
+            if pid is None:
+                raise AdaptorJobException('Local process %s is not running' % job.remote_job_id)
+            try:
+                kill(pid)
+            except OSError as exc:
+                raise AdaptorJobException('Unable to kill local process %s: %s' % (pid, exc))
+        return job
+
+    @staticmethod
+    def _read_file(job, file_name):
+        try:
+            with open(join(job.working_dir, file_name)) as fp:
+                return int(fp.read().strip())
+        except (IOError, ValueError):
+            return None
+
+    @staticmethod
+    def _pid_alive(pid):
+        try:
+            os.kill(pid, 0)
+        except OSError as exc:
+            return exc.errno == errno.EPERM
+        return True
+
+    def _job_status(self, job):
+        state = self.connector.state(job.remote_job_id)
+        if state == PENDING:
+            return JobStatus.JOB_QUEUED
+        if state == RUNNING:
+            return JobStatus.JOB_RUNNING
+        if state is not None:
+            returncode, cancelled = state
+            # terminated state is reported once from memory, then from files in job working dir
+            self.connector.forget(job.remote_job_id)
+        else:
+            # Unknown to this process (queued or launched by another process), rely on files in job working dir
+            returncode = self._read_file(job, EXIT_FILE)
+            cancelled = os.path.exists(join(job.working_dir, CANCEL_FILE))
+            if returncode is None:
+                pid = self._read_file(job, PID_FILE)
+                if pid is not None and self._pid_alive(pid):
+                    return JobStatus.JOB_RUNNING
+                if cancelled:
+                    return JobStatus.JOB_CANCELLED
+                if os.path.exists(join(job.working_dir, PENDING_FILE)):
+                    # queued job not launched yet (i.e lost on restart): queued in this process too
+                    self.connector.submit(self.limit_key, self.max_running, job.remote_job_id, self._launcher(job))
+                    return JobStatus.JOB_QUEUED
+                return JobStatus.JOB_UNDEFINED
+        if cancelled:
+            return JobStatus.JOB_CANCELLED
+        if returncode is None or returncode < 0:
+            # launch failure, or killed by signal (i.e resources limits)
+            return JobStatus.JOB_ERROR
+        return JobStatus.JOB_COMPLETED
+
+    def _job_results(self, job):
+        state = self.connector.state(job.remote_job_id)
+        job.exit_code = state[0] if isinstance(state, tuple) else self._read_file(job, EXIT_FILE)
+        job.results_available = True
+        return job
@@ -0,0 +1,189 @@
+"""
+WAVES adaptors connection pool
+
+Remote connections (i.e saga-python job services over SSH) are costly to establish, the pool keeps released
+connections alive in order to reuse them for next jobs run with the very same adaptor configuration.
+"""
+from __future__ import unicode_literals
+
+import logging
+import threading
+import time
+
+from waves.wcore.adaptors.exceptions import AdaptorConnectException
+from waves.wcore.settings import waves_settings
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['ConnectionPool', 'connection_pool']
+
+
+class PooledConnection(object):
+    """ A connection held by pool """
+
+    def __init__(self, key, host, connector):
+        self.key = key
+        self.host = host
+        self.connector = connector
+        self.released_at = time.time()
+
+
+class ConnectionPool(object):
+    """
+    Process wide adaptors connections pool.
+
+    Idle connections are stored per key (adaptor serialized configuration), the number of connections opened on a
+    same host is limited to ``max_per_host``: when limit is reached, ``acquire`` waits for another thread to release a
+    connection. Idle connections are checked before reuse and evicted after ``idle_timeout`` seconds.
+    """
+
+    def __init__(self, max_per_host=None, idle_timeout=None, wait_timeout=None):
+        self._max_per_host = max_per_host
+        self._idle_timeout = idle_timeout
+        self._wait_timeout = wait_timeout
+        self._idle = {}
+        self._opened = {}
+        self._cond = threading.Condition(threading.Lock())
+
+    @property
+    def max_per_host(self):
+        return self._max_per_host if self._max_per_host is not None else waves_settings.CONNECTION_POOL_SIZE
+
+    @property
+    def idle_timeout(self):
+        return self._idle_timeout if self._idle_timeout is not None else waves_settings.CONNECTION_POOL_IDLE
+
+    @property
+    def wait_timeout(self):
+        return self._wait_timeout if self._wait_timeout is not None else waves_settings.CONNECTION_POOL_WAIT
+
+    @property
+    def enabled(self):
+        return self.max_per_host > 0
+
+    @staticmethod
+    def is_valid(connector):
+        """ Health check on a connection, any connector exposing a falsy 'valid' attribute is considered dead """
+        try:
+            return connector is not None and getattr(connector, 'valid', True) is not False
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.connector.close()
+        except Exception as exc:
+            logger.warning('Error closing pooled connection to %s: %s', connection.host, exc)
+
+    def _discard(self, connection):
+        """ Forget about a connection (lock must be held) """
+        self._opened[connection.host] = max(0, self._opened.get(connection.host, 0) - 1)
+        self._cond.notify_all()
+
+    def _evict_idle(self):
+        """ Remove expired idle connections, (lock must be held)
+
+        :return: the list of evicted connections, to be closed outside lock
+        """
+        expired = []
+        limit = time.time() - self.idle_timeout
+        for key, connections in self._idle.items():
+            alive = [c for c in connections if c.released_at >= limit]
+            expired.extend([c for c in connections if c.released_at < limit])
+            self._idle[key] = alive
+        for connection in expired:
+            self._discard(connection)
+        return expired
+
+    def acquire(self, key, host, factory):
+        """ Retrieve a live connection for key, create a new one with factory if none is idle
+
+        :param key: pool key, i.e adaptor serialized configuration
+        :param host: remote host, used for connections count limit
+        :param factory: callable returning a new connector
+        :raise: :class:`waves.wcore.adaptors.exceptions.AdaptorConnectException` when no connection is available
+        :return: connector
+        """
+        deadline = time.time() + self.wait_timeout
+        to_close = []
+        try:
+            with self._cond:
+                while True:
+                    to_close.extend(self._evict_idle())
+                    connections = self._idle.get(key, [])
+                    while connections:
+                        connection = connections.pop()
+                        if self.is_valid(connection.connector):
+                            logger.debug('Reused pooled connection to %s', host)
+                            return connection.connector
+                        self._discard(connection)
+                        to_close.append(connection)
+                    if self._opened.get(host, 0) < self.max_per_host:
+                        self._opened[host] = self._opened.get(host, 0) + 1
+                        break
+                    # Host limit reached, close another configuration idle connection, or wait for a release
+                    others = [c for idle in self._idle.values() for c in idle if c.host == host]
+                    if others:
+                        oldest = min(others, key=lambda c: c.released_at)
+                        self._idle[oldest.key].remove(oldest)
+                        self._discard(oldest)
+                        to_close.append(oldest)
+                        continue
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise AdaptorConnectException('No connection available to %s (max %i)' %
+                                                      (host, self.max_per_host))
+                    self._cond.wait(remaining)
+        finally:
+            for connection in to_close:
+                self._close(connection)
+        try:
+            return factory()
+        except Exception:
+            with self._cond:
+                self._opened[host] = max(0, self._opened.get(host, 0) - 1)
+                self._cond.notify_all()
+            raise
+
+    def release(self, key, host, connector, discard=False):
+        """ Give back a connection to pool
+
+        :param key: pool key used on acquire
+        :param host: remote host
+        :param connector: the connector
+        :param discard: close connector instead of keeping it idle
+        """
+        connection = PooledConnection(key, host, connector)
+        keep = not discard and self.is_valid(connector)
+        with self._cond:
+            if keep:
+                self._idle.setdefault(key, []).append(connection)
+                self._cond.notify_all()
+            else:
+                self._discard(connection)
+        if not keep:
+            self._close(connection)
+
+    def clear(self):
+        """ Close all idle connections """
+        with self._cond:
+            connections = [c for idle in self._idle.values() for c in idle]
+            self._idle = {}
+            for connection in connections:
+                self._discard(connection)
+        for connection in connections:
+            self._close(connection)
+
+    def stats(self):
+        """ Current opened / idle connections count per host """
+        with self._cond:
+            idle = {}
+            for connections in self._idle.values():
+                for connection in connections:
+                    idle[connection.host] = idle.get(connection.host, 0) + 1
+            return dict((host, dict(opened=count, idle=idle.get(host, 0))) for host, count in self._opened.items())
+
+
+#: Process wide connection pool
+connection_pool = ConnectionPool()
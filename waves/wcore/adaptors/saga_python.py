@@ -1,11 +1,15 @@
 from __future__ import unicode_literals
 
-import radical.saga as saga
 import logging
+import re
+
+import radical.saga as saga
+from radical.saga.utils.pty_shell import PTYShell
 
 from waves.wcore.adaptors import JobAdaptor
 from waves.wcore.adaptors.const import JobStatus, JobRunDetails
 from waves.wcore.adaptors import exceptions
+from waves.wcore.adaptors.pool import connection_pool
 
 logger = logging.getLogger(__name__)
 
@@ -45,10 +49,20 @@ class SagaAdaptor(JobAdaptor):
             self._session = session
         return self._session
 
+    @property
+    def pool_key(self):
+        """ Connections are shared between adaptors with the very same configuration """
+        return self.serialize()
+
     def _connect(self):
         try:
             logger.debug('Connection to %s', self.saga_host)
-            self.connector = self._init_service()
+            if connection_pool.enabled:
+                self.connector = connection_pool.acquire(self.pool_key, self.host, self._init_service)
+                if self.connector is not None and self.connector.session is not None:
+                    self._session = self.connector.session
+            else:
+                self.connector = self._init_service()
             self._connected = self.connector is not None and self.connector.valid and self.connector.session is not None
             logger.debug('Connected to %s', self.saga_host)
         except saga.SagaException as exc:
@@ -83,9 +97,27 @@ class SagaAdaptor(JobAdaptor):
     def _init_service(self):
         return saga.job.Service(self.saga_host)
 
+    @property
+    def shell_host(self):
+        """ Saga-python uri scheme to open a shell on job service host """
+        return 'fork://localhost'
+
+    def _init_shell(self):
+        """ Open a shell on job service host, allowing to run commands directly """
+        return PTYShell(saga.Url(self.shell_host))
+
+    @staticmethod
+    def native_job_id(remote_job_id):
+        """ Extract native job id (i.e scheduler one) from saga-python job id '[backend url]-[native id]' """
+        match = re.match(r'^\[.*\]-\[(.*)\]$', str(remote_job_id))
+        return match.group(1) if match else str(remote_job_id)
+
     def _disconnect(self):
         logger.debug('Disconnect')
-        self.connector.close()
+        if connection_pool.enabled:
+            connection_pool.release(self.pool_key, self.host, self.connector)
+        else:
+            self.connector.close()
         self.connector = None
         self._connected = False
         self._context = None
@@ -140,11 +172,15 @@ class SagaAdaptor(JobAdaptor):
                     error=job.stderr)
         return desc
 
+    def _remote_exit_code(self, job):
+        """ Retrieve job exit code from remote job service """
+        return self.connector.get_job(str(job.remote_job_id)).exit_code
+
     def _job_results(self, job):
         try:
-            saga_job = self.connector.get_job(str(job.remote_job_id))
+            exit_code = self._remote_exit_code(job)
             job.results_available = True
-            job.exit_code = saga_job.exit_code
+            job.exit_code = exit_code
             return job
         except saga.SagaException as exc:
             raise exceptions.AdaptorJobException(exc.message)
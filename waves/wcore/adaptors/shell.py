@@ -1,12 +1,17 @@
 from __future__ import unicode_literals
 
 import logging
+import os
 from os.path import join
 
 import radical.saga as saga
+from radical.saga.utils.pty_shell import PTYShell
 
 from waves.wcore.adaptors.exceptions import AdaptorJobException
 from waves.wcore.adaptors.saga_python import SagaAdaptor
+from waves.wcore.adaptors.staging import InputStager, OutputRetriever
+from waves.wcore.settings import waves_settings
+from waves.wcore.utils.layout import job_dir_layout
 
 logger = logging.getLogger(__name__)
 
@@ -38,18 +43,27 @@ class SshShellAdaptor(LocalShellAdaptor):
         del self._session
 
     def __init__(self, command=None, protocol='ssh', host="localhost", port=22, password=None, user_id=None,
-                 basedir="$HOME/", **kwargs):
+                 basedir="$HOME/", results_glob='', **kwargs):
         super(SshShellAdaptor, self).__init__(command=command, protocol=protocol, host=host, **kwargs)
         self.user_id = user_id
         self.password = password
         self.port = port
         self.basedir = basedir
+        self.results_glob = results_glob
         self._context = None
         self._session = None
 
     def _init_service(self):
         return saga.job.Service(self.saga_host, self.session)
 
+    @property
+    def shell_host(self):
+        """ Saga-python uri scheme to open a ssh shell on remote host """
+        return 'ssh://%s:%s' % (self.host, self.port)
+
+    def _init_shell(self):
+        return PTYShell(saga.Url(self.shell_host), self.session)
+
     @property
     def saga_host(self):
         """ Construct saga-python host scheme str """
@@ -66,6 +80,7 @@ class SshShellAdaptor(LocalShellAdaptor):
         params.update(dict(user_id=self.user_id,
                            port=self.port,
                            basedir=self.basedir,
+                           results_glob=self.results_glob,
                            password=self.password))
         return params
 
@@ -97,41 +112,52 @@ class SshShellAdaptor(LocalShellAdaptor):
         return self._context
 
     def job_work_dir(self, job, mode=saga.filesystem.READ):
-        """ Setup remote host working dir """
-        return saga.filesystem.Directory(saga.Url('%s/%s' % (self.remote_dir, str(job.slug))), mode,
+        """ Setup remote host working dir, with same relative path as local one (see ``JOB_DIR_LAYOUT`` setting) """
+        layout = job_dir_layout()
+        relative_path = os.path.relpath(layout.path(job.slug), layout.base_dir).replace(os.sep, '/')
+        return saga.filesystem.Directory(saga.Url('%s/%s' % (self.remote_dir, relative_path)), mode,
                                          session=self.session)
 
     def _prepare_job(self, job):
         """
         Prepare job on remote host
           - Create remote working dir
-          - Upload job input files
+          - Upload job input files (see :class:`waves.wcore.adaptors.staging.InputStager`)
         """
         job.logger.debug('Prepared job in ShellAdapter')
         try:
             work_dir = self.job_work_dir(job, saga.filesystem.CREATE_PARENTS)
-            for input_file in job.input_files:
-                wrapper = saga.filesystem.File(
-                    saga.Url('file://localhost/%s' % join(job.working_dir, input_file.value)))
-                wrapper.copy(work_dir.get_url())
-                job.logger.debug("Uploaded file %s to %s", join(job.working_dir, input_file.value), work_dir.get_url())
+            stager = InputStager(self._init_shell, work_dir.get_url().path, job_logger=job.logger)
+            stager.stage([join(job.working_dir, input_file.value) for input_file in job.input_files])
             return job
         except saga.SagaException as exc:
             raise AdaptorJobException(exc.message)
 
+    def results_patterns(self, job):
+        """ Remote files to retrieve: job declared outputs, standard output and error, and for dynamic outputs
+        services ``results_glob`` patterns (comma separated, all files if not set) """
+        patterns = [job.stdout, job.stderr] + [output.value for output in job.outputs.all() if output.value]
+        if job.submission and job.submission.service and job.submission.service.partial:
+            patterns.extend([pattern.strip() for pattern in (self.results_glob or '').split(',')
+                             if pattern.strip()] or ['*'])
+        return patterns
+
     def _job_results(self, job):
         """
-        Download all files located in remote job working dir
+        Download job results files located in remote job working dir (see :func:`results_patterns`), remote
+        working dir is removed afterwards (unless ``RESULTS_CLEAN_REMOTE`` setting is False)
 
         :param job: the Job to retrieve file for
         :return: None
         """
         try:
-            work_dir = self.job_work_dir(job)
-            for remote_file in work_dir.list('*'):
-                work_dir.copy(remote_file, 'file://localhost/%s/' % job.working_dir)
-                job.logger.debug("Retrieved file from %s to %s", remote_file, job.working_dir)
-            return super(SshShellAdaptor, self)._job_results(job)
+            retriever = OutputRetriever(self._init_shell, self.job_work_dir(job).get_url().path, job.working_dir,
+                                        job_logger=job.logger)
+            retriever.retrieve(self.results_patterns(job))
+            job = super(SshShellAdaptor, self)._job_results(job)
+            if waves_settings.RESULTS_CLEAN_REMOTE:
+                retriever.clean()
+            return job
         except saga.SagaException as exc:
             raise AdaptorJobException(exc.message)
 
@@ -0,0 +1,258 @@
+"""
+Job files staging to / from remote hosts
+
+Job input files are uploaded concurrently through saga-python shells (multiplexed over adaptor session SSH
+connection), files already present remotely with same size and checksum are skipped, partial uploads are resumed
+(resumed uploads are checked against local checksum, uploaded again in full on mismatch).
+Job results files are retrieved concurrently, checked against remote checksums.
+"""
+from __future__ import unicode_literals
+
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+from contextlib import contextmanager
+from fnmatch import fnmatch
+from multiprocessing.pool import ThreadPool
+from os.path import basename, dirname, getsize, join
+
+import radical.saga as saga
+
+from waves.wcore.adaptors.exceptions import AdaptorJobException
+from waves.wcore.settings import waves_settings
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['InputStager', 'OutputRetriever']
+
+#: Files not worth compressing before upload
+COMPRESSED_EXTENSIONS = ('.gz', '.bz2', '.zip', '.xz', '.bam', '.cram', '.7z')
+
+
+def file_checksum(path, block_size=1024 * 1024):
+    """ MD5 hex digest of local file """
+    digest = hashlib.md5()
+    with open(path, 'rb') as fp:
+        for block in iter(lambda: fp.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def remote_path(path):
+    """ Double quote remote path, variables (i.e $HOME) are still expanded by remote shell """
+    return '"%s"' % path.replace('\\', '\\\\').replace('"', '\\"').replace('`', '\\`')
+
+
+@contextmanager
+def staging_errors():
+    """ Report transfers errors as adaptor exceptions """
+    try:
+        yield
+    except saga.SagaException as exc:
+        raise AdaptorJobException(exc.message)
+    except (IOError, OSError) as exc:
+        raise AdaptorJobException('Staging failed: %s' % exc)
+
+
+class RemoteStaging(object):
+    """
+    Base files transfers with a remote directory
+
+    :param shell_factory: callable returning a new saga-python PTYShell on remote host
+    :param remote_dir: remote directory path
+    :param workers: concurrent transfers, default to ``STAGING_WORKERS`` setting
+    """
+
+    def __init__(self, shell_factory, remote_dir, workers=None, job_logger=None):
+        self.shell_factory = shell_factory
+        self.remote_dir = remote_dir.rstrip('/')
+        self.workers = workers if workers is not None else waves_settings.STAGING_WORKERS
+        self.logger = job_logger or logger
+
+    def _run(self, shell, command, check=False):
+        ret, out, err = shell.run_sync('cd %s && %s' % (remote_path(self.remote_dir), command))
+        if check and ret != 0:
+            raise AdaptorJobException('Remote command failed [%s]: %s' % (command, err))
+        return out
+
+    def remote_sizes(self, shell, names):
+        """ Remote files sizes, missing files are not listed """
+        if not names:
+            return {}
+        out = self._run(shell, "stat -c '%%s %%n' -- %s 2>/dev/null" % ' '.join(remote_path(n) for n in names))
+        sizes = {}
+        for line in out.splitlines():
+            parts = line.strip().split(' ', 1)
+            if len(parts) == 2 and parts[0].isdigit():
+                sizes[parts[1]] = int(parts[0])
+        return sizes
+
+    def remote_checksums(self, shell, names):
+        """ Remote files MD5 checksums """
+        if not names:
+            return {}
+        out = self._run(shell, 'md5sum -- %s 2>/dev/null' % ' '.join(remote_path(n) for n in names))
+        checksums = {}
+        for line in out.splitlines():
+            parts = line.strip().split(None, 1)
+            if len(parts) == 2:
+                checksums[parts[1].lstrip('*')] = parts[0]
+        return checksums
+
+    def with_shell(self, function, *args):
+        """ Call function with a new remote shell as first argument """
+        shell = self.shell_factory()
+        try:
+            return function(shell, *args)
+        finally:
+            shell.finalize(kill_pty=True)
+
+    def transfer(self, function, items):
+        """ Apply transfer function on items, concurrently within ``workers`` threads
+
+        :return: list of transfer function results
+        """
+        if len(items) <= 1 or self.workers <= 1:
+            return [function(item) for item in items]
+        pool = ThreadPool(processes=min(self.workers, len(items)))
+        try:
+            return pool.map(function, items)
+        finally:
+            pool.close()
+            pool.join()
+
+
+class InputStager(RemoteStaging):
+    """
+    Upload local files to a remote directory
+
+    :param compress: gzip files before upload (uncompressed remotely), default to ``STAGING_COMPRESS`` setting
+    """
+
+    def __init__(self, shell_factory, remote_dir, workers=None, compress=None, job_logger=None):
+        super(InputStager, self).__init__(shell_factory, remote_dir, workers, job_logger)
+        self.compress = compress if compress is not None else waves_settings.STAGING_COMPRESS
+
+    def _compressed(self, path):
+        return self.compress and not path.lower().endswith(COMPRESSED_EXTENSIONS)
+
+    def plan(self, shell, paths):
+        """ Determine which files need to be uploaded
+
+        :return: list of tuples (local path, resume partial upload)
+        """
+        names = [basename(path) for path in paths]
+        sizes = self.remote_sizes(shell, names + [name + '.gz' for name in names])
+        same_size = [basename(path) for path in paths if sizes.get(basename(path)) == getsize(path)]
+        checksums = self.remote_checksums(shell, same_size)
+        uploads = []
+        for path in paths:
+            name = basename(path)
+            if name in checksums and checksums[name] == file_checksum(path):
+                self.logger.debug('Skipped upload of %s, already present on remote host', name)
+                continue
+            if self._compressed(path):
+                remote_size = sizes.get(name + '.gz', 0)
+                local_size = getsize(path + '.gz') if os.path.isfile(path + '.gz') else None
+            else:
+                remote_size = sizes.get(name, 0)
+                local_size = getsize(path)
+            uploads.append((path, local_size is not None and 0 < remote_size < local_size))
+        return uploads
+
+    def _gzip(self, path):
+        """ Compress file for upload, keeping a previous compressed copy (to resume its upload) """
+        target = path + '.gz'
+        if not os.path.isfile(target):
+            with open(path, 'rb') as src:
+                dest = gzip.GzipFile(target + '.part', 'wb', mtime=0)
+                try:
+                    shutil.copyfileobj(src, dest, 1024 * 1024)
+                finally:
+                    dest.close()
+            os.rename(target + '.part', target)
+        return target
+
+    def upload(self, item):
+        path, resume = item
+        source = self._gzip(path) if self._compressed(path) else path
+        target = '%s/%s' % (self.remote_dir, basename(source))
+
+        def send(shell):
+            shell.stage_to_remote(source, target, cp_flags='-a' if resume else '')
+            if resume and self.remote_checksums(shell, [basename(source)]).get(basename(source)) \
+                    != file_checksum(source):
+                # remote partial file was not a prefix of local file
+                self.logger.warning('Resumed upload of %s does not match local file, uploaded again', source)
+                shell.stage_to_remote(source, target)
+            if source != path:
+                self._run(shell, 'gzip -d -f -- %s' % remote_path(basename(source)), check=True)
+
+        self.with_shell(send)
+        if source != path:
+            os.remove(source)
+        self.logger.debug('Uploaded file %s to %s%s', path, target, ' (resumed)' if resume else '')
+        return basename(path)
+
+    def stage(self, paths):
+        """ Upload files to remote directory
+
+        :param paths: local files paths
+        :raise: :class:`waves.wcore.adaptors.exceptions.AdaptorJobException` if an upload failed
+        :return: list of uploaded files names
+        """
+        if not paths:
+            return []
+        with staging_errors():
+            return self.transfer(self.upload, self.with_shell(self.plan, paths))
+
+
+class OutputRetriever(RemoteStaging):
+    """
+    Download remote files matching patterns to a local directory
+
+    :param local_dir: local directory path
+    """
+
+    def __init__(self, shell_factory, remote_dir, local_dir, workers=None, job_logger=None):
+        super(OutputRetriever, self).__init__(shell_factory, remote_dir, workers, job_logger)
+        self.local_dir = local_dir
+
+    def remote_files(self, shell, patterns):
+        """ Remote files (relative paths) matching any of patterns, with one remote listing """
+        out = self._run(shell, "find . -type f -printf '%P\\n'")
+        return [name for name in out.splitlines() if any(fnmatch(name, pattern) for pattern in patterns)]
+
+    def download(self, item):
+        name, checksum = item
+        local_path = join(self.local_dir, name)
+        if dirname(local_path) and not os.path.isdir(dirname(local_path)):
+            os.makedirs(dirname(local_path))
+        self.with_shell(lambda shell: shell.stage_from_remote('%s/%s' % (self.remote_dir, name), local_path))
+        if checksum is not None and file_checksum(local_path) != checksum:
+            raise AdaptorJobException('Checksum mismatch for retrieved file %s' % name)
+        self.logger.debug('Retrieved file %s to %s', name, local_path)
+        return name
+
+    def retrieve(self, patterns):
+        """ Download remote files matching patterns
+
+        :param patterns: list of glob patterns, relative to remote directory
+        :raise: :class:`waves.wcore.adaptors.exceptions.AdaptorJobException` if a download failed
+        :return: list of retrieved files names
+        """
+        def listing(shell):
+            names = self.remote_files(shell, patterns)
+            return names, self.remote_checksums(shell, names)
+
+        with staging_errors():
+            names, checksums = self.with_shell(listing)
+            return self.transfer(self.download, [(name, checksums.get(name)) for name in names])
+
+    def clean(self):
+        """ Remove remote directory """
+        ret, out, err = self.with_shell(lambda shell: shell.run_sync('rm -rf -- %s' % remote_path(self.remote_dir)))
+        if ret != 0:
+            self.logger.warning('Unable to remove remote dir %s: %s', self.remote_dir, err)
@@ -1,16 +1,25 @@
 from __future__ import unicode_literals
 
+import hashlib
 import logging
 import os
+import shutil
+import tempfile
+import time
 import unittest
+import uuid
 
+import radical.saga as saga
 from django.conf import settings
 
-from waves.wcore.adaptors.cluster import SshClusterAdaptor
+from waves.wcore.adaptors.cluster import ArrayTask, LocalClusterAdaptor, SshClusterAdaptor
 from waves.wcore.adaptors.const import JobStatus
-from waves.wcore.adaptors.exceptions import AdaptorException
+from waves.wcore.adaptors.exceptions import AdaptorException, AdaptorConnectException
+from waves.wcore.adaptors.local import LocalProcessAdaptor, ProcessRegistry, EXIT_FILE, PENDING_FILE, PID_FILE
 from waves.wcore.adaptors.mocks import MockJobRunnerAdaptor
+from waves.wcore.adaptors.pool import ConnectionPool
 from waves.wcore.adaptors.shell import LocalShellAdaptor, SshShellAdaptor, SshKeyShellAdaptor
+from waves.wcore.adaptors.staging import InputStager, OutputRetriever
 from waves.wcore.exceptions.jobs import JobInconsistentStateError
 from waves.wcore.settings import waves_settings
 from waves.wcore.tests.base import BaseTestCase, TestJobWorkflowMixin
@@ -31,7 +40,8 @@ def skip_unless_sge():
 
 class AdaptorTestCase(BaseTestCase, TestJobWorkflowMixin):
     loader = AdaptorLoader
-    adaptors = {"local": LocalShellAdaptor(command='cp')}
+    adaptors = {"local": LocalShellAdaptor(command='cp'),
+                "localProcess": LocalProcessAdaptor(command='cp')}
 
     def setUp(self):
         super(AdaptorTestCase, self).setUp()
@@ -85,6 +95,9 @@ class AdaptorTestCase(BaseTestCase, TestJobWorkflowMixin):
         for code, adaptor in self.adaptors.items():
             logger.info("Testing availability for %s ", adaptor.name)
             try:
+                if not hasattr(adaptor, 'saga_host'):
+                    # not a saga-python adaptor
+                    continue
                 if adaptor.available:
                     logger.debug("Saga host %s, protocol %s", adaptor.saga_host, adaptor.host)
                     self.assertTrue(adaptor.saga_host.startswith(adaptor.protocol))
@@ -100,6 +113,21 @@ class AdaptorTestCase(BaseTestCase, TestJobWorkflowMixin):
         self.assertTrue(all([clazz.__class__ in waves_settings.ADAPTORS_CLASSES for clazz in list_adaptors]))
         [logger.debug(c) for c in list_adaptors]
 
+    def test_loader_cache(self):
+        AdaptorLoader.invalidate()
+        adaptor = LocalShellAdaptor(command='cp')
+        serialized = adaptor.serialize()
+        first = AdaptorLoader.unserialize(serialized)
+        self.assertEqual(len(AdaptorLoader.cache()), 1)
+        second = AdaptorLoader.unserialize(serialized)
+        self.assertIsNot(first, second)
+        self.assertEqual(first.init_params, second.init_params)
+        self.assertEqual(len(AdaptorLoader.cache()), 1)
+        self.sample_runner()
+        self.assertEqual(len(AdaptorLoader.cache()), 0)
+        with self.assertRaises(AdaptorException):
+            AdaptorLoader.load(FakeConnector)
+
     def test_init(self):
         for adaptor in waves_settings.ADAPTORS_CLASSES:
             new_instance = self.loader.load(adaptor, host="localTestHost", protocol="httpTest",
@@ -162,3 +190,274 @@ class AdaptorTestCase(BaseTestCase, TestJobWorkflowMixin):
         self.current_job.delete()
 
 
+class FakeConnector(object):
+    def __init__(self):
+        self.valid = True
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTestCase(unittest.TestCase):
+
+    def test_reuse(self):
+        pool = ConnectionPool(max_per_host=2, idle_timeout=300, wait_timeout=0)
+        connector = pool.acquire('key', 'host', FakeConnector)
+        pool.release('key', 'host', connector)
+        self.assertIs(pool.acquire('key', 'host', FakeConnector), connector)
+        self.assertFalse(connector.closed)
+        self.assertEqual(pool.stats()['host'], dict(opened=1, idle=0))
+
+    def test_health_check(self):
+        pool = ConnectionPool(max_per_host=2, idle_timeout=300, wait_timeout=0)
+        connector = pool.acquire('key', 'host', FakeConnector)
+        pool.release('key', 'host', connector)
+        connector.valid = False
+        other = pool.acquire('key', 'host', FakeConnector)
+        self.assertIsNot(other, connector)
+        self.assertTrue(connector.closed)
+
+    def test_idle_eviction(self):
+        pool = ConnectionPool(max_per_host=2, idle_timeout=-1, wait_timeout=0)
+        connector = pool.acquire('key', 'host', FakeConnector)
+        pool.release('key', 'host', connector)
+        self.assertIsNot(pool.acquire('key', 'host', FakeConnector), connector)
+        self.assertTrue(connector.closed)
+
+    def test_max_per_host(self):
+        pool = ConnectionPool(max_per_host=1, idle_timeout=300, wait_timeout=0)
+        connector = pool.acquire('key', 'host', FakeConnector)
+        with self.assertRaises(AdaptorConnectException):
+            pool.acquire('other_key', 'host', FakeConnector)
+        pool.acquire('key', 'other_host', FakeConnector)
+        # idle connection for another configuration on same host is closed to free a slot
+        pool.release('key', 'host', connector)
+        self.assertIsNot(pool.acquire('other_key', 'host', FakeConnector), connector)
+        self.assertTrue(connector.closed)
+
+
+class JobArrayTestCase(unittest.TestCase):
+
+    def test_array_task(self):
+        task = ArrayTask('1234', 3, '/tmp/job/waves_array.exit')
+        self.assertEqual(str(task), 'array:1234:3:/tmp/job/waves_array.exit')
+        parsed = ArrayTask.parse(str(task))
+        self.assertEqual((parsed.array_id, parsed.task, parsed.exit_file), ('1234', 3, '/tmp/job/waves_array.exit'))
+        self.assertIsNone(ArrayTask.parse('[sge://localhost]-[1234]'))
+        self.assertIsNone(ArrayTask.parse(None))
+
+    def test_array_script(self):
+        descriptions = [dict(working_directory='/tmp/job %i' % i, executable='cp', arguments='a b',
+                             output='job.stdout', error='job.stderr') for i in range(1, 3)]
+        script = LocalClusterAdaptor.array_script(descriptions, 'SGE_TASK_ID', '/tmp/array.exit')
+        self.assertIn("1) cd '/tmp/job 1' && cp a b > job.stdout 2> job.stderr ;;", script)
+        self.assertIn("2) cd '/tmp/job 2' && cp a b > job.stdout 2> job.stderr ;;", script)
+        self.assertIn('echo "$SGE_TASK_ID $code" > /tmp/array.exit.$SGE_TASK_ID', script)
+        self.assertEqual(ArrayTask('1234', 2, '/tmp/array.exit').task_exit_file, '/tmp/array.exit.2')
+
+    def test_task_state(self):
+        adaptor = LocalClusterAdaptor(command='cp', protocol='slurm')
+        self.assertTrue(adaptor.bulk_launch)
+        task = ArrayTask('1234', 2, '/tmp/array.exit')
+        states = {'1234_2': saga.job.RUNNING, '1234': saga.job.PENDING}
+        self.assertEqual(adaptor._task_state(task, states, {}), saga.job.RUNNING)
+        self.assertEqual(adaptor._task_state(ArrayTask('1234', 5, '/tmp/array.exit'), states, {}), saga.job.PENDING)
+        self.assertEqual(adaptor._task_state(task, states, {('/tmp/array.exit', 2): 0}), saga.job.DONE)
+        self.assertEqual(adaptor._task_state(task, {}, {}), saga.job.FAILED)
+
+    def test_scheduler_states(self):
+        shell = FakeSchedulerShell('\n'.join([
+            'job-ID  prior   name       user  state submit/start at     queue        slots ja-task-ID',
+            '--------------------------------------------------------------------------------------',
+            '   1234 0.55500 waves_arra waves r     10/18/2026 10:00:00 all.q@node1  1 1',
+            '   1234 0.55500 waves_arra waves qw    10/18/2026 10:00:00              1 2',
+            '   1300 0.55500 single     waves r     10/18/2026 10:00:00 all.q@node1  1']))
+        adaptor = LocalClusterAdaptor(command='cp', protocol='sge')
+        states = adaptor._scheduler_states(shell)
+        self.assertEqual(shell.commands, ['qstat -g d'])
+        self.assertEqual(states['1300'], saga.job.RUNNING)
+        self.assertEqual(adaptor._task_state(ArrayTask('1234', 1, '/tmp/array.exit'), states, {}), saga.job.RUNNING)
+        self.assertEqual(adaptor._task_state(ArrayTask('1234', 2, '/tmp/array.exit'), states, {}), saga.job.PENDING)
+        shell = FakeSchedulerShell('\n'.join([
+            'Job id            Name             User              Time Use S Queue',
+            '----------------  ---------------- ----------------  -------- - -----',
+            '1234[].server     waves_array      waves             0        B workq',
+            '1234[1].server    waves_array      waves             00:00:01 R workq',
+            '1234[2].server    waves_array      waves             0        Q workq']))
+        adaptor = LocalClusterAdaptor(command='cp', protocol='pbspro')
+        states = adaptor._scheduler_states(shell)
+        self.assertEqual(adaptor._task_state(ArrayTask('1234', 1, '/tmp/array.exit'), states, {}), saga.job.RUNNING)
+        self.assertEqual(adaptor._task_state(ArrayTask('1234', 2, '/tmp/array.exit'), states, {}), saga.job.PENDING)
+
+    def test_array_exit_codes(self):
+        shell = FakeSchedulerShell('1 0\n2 3\n')
+        exit_codes = LocalClusterAdaptor(command='cp', protocol='sge')._array_exit_codes(shell, ['/tmp/array.exit'])
+        self.assertEqual(shell.commands, ["cat /tmp/array.exit.* 2>/dev/null"])
+        self.assertEqual(exit_codes, {('/tmp/array.exit', 1): 0, ('/tmp/array.exit', 2): 3})
+
+
+class FakeSchedulerShell(object):
+    """ Remote shell answering any command with given output """
+
+    def __init__(self, output):
+        self.output = output
+        self.commands = []
+
+    def run_sync(self, command):
+        self.commands.append(command)
+        return 0, self.output, ''
+
+
+class FakeShell(object):
+    """ Remote shell answering stat / md5sum / find commands from a dict {name: content} """
+
+    def __init__(self, remote_files):
+        self.remote_files = remote_files
+        self.staged = []
+
+    def run_sync(self, command):
+        if 'stat' in command:
+            return 0, '\n'.join('%s %s' % (len(data), name) for name, data in self.remote_files.items()), ''
+        if 'md5sum' in command:
+            return 0, '\n'.join('%s  %s' % (hashlib.md5(data).hexdigest(), name)
+                                for name, data in self.remote_files.items() if name in command), ''
+        if 'find' in command:
+            return 0, '\n'.join(self.remote_files.keys()), ''
+        return 0, '', ''
+
+    def stage_to_remote(self, src, tgt, cp_flags=''):
+        name = os.path.basename(src)
+        self.staged.append((name, cp_flags))
+        with open(src, 'rb') as fp:
+            data = fp.read()
+        if cp_flags == '-a':
+            # resumed upload only appends missing data to remote file
+            partial = self.remote_files.get(name, b'')
+            data = partial + data[len(partial):]
+        self.remote_files[name] = data
+
+    def stage_from_remote(self, src, tgt, cp_flags=''):
+        with open(tgt, 'wb') as fp:
+            fp.write(self.remote_files[os.path.basename(src)])
+
+    def finalize(self, kill_pty=False):
+        pass
+
+
+class StagingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.local_dir = tempfile.mkdtemp()
+        for name, content in (('same.txt', b'same'), ('partial.txt', b'partial content'), ('new.txt', b'new')):
+            with open(os.path.join(self.local_dir, name), 'wb') as fp:
+                fp.write(content)
+
+    def tearDown(self):
+        shutil.rmtree(self.local_dir)
+
+    def test_stage(self):
+        shell = FakeShell({'same.txt': b'same', 'partial.txt': b'partial'})
+        stager = InputStager(lambda: shell, '/remote/job', workers=2, compress=False)
+        uploaded = stager.stage([os.path.join(self.local_dir, name) for name in ('same.txt', 'partial.txt',
+                                                                                 'new.txt')])
+        self.assertEqual(sorted(uploaded), ['new.txt', 'partial.txt'])
+        self.assertEqual(sorted(shell.staged), [('new.txt', ''), ('partial.txt', '-a')])
+        self.assertEqual(shell.remote_files['partial.txt'], b'partial content')
+
+    def test_stage_resume_mismatch(self):
+        shell = FakeShell({'partial.txt': b'PARTIAL'})
+        stager = InputStager(lambda: shell, '/remote/job', workers=1, compress=False)
+        self.assertEqual(stager.stage([os.path.join(self.local_dir, 'partial.txt')]), ['partial.txt'])
+        # resumed upload is corrupted, file is uploaded again in full
+        self.assertEqual(shell.staged, [('partial.txt', '-a'), ('partial.txt', '')])
+        self.assertEqual(shell.remote_files['partial.txt'], b'partial content')
+
+    def test_retrieve(self):
+        shell = FakeShell({'job.stdout': b'out', 'result.txt': b'result', 'scratch.tmp': b'tmp'})
+        retriever = OutputRetriever(lambda: shell, '/remote/job', self.local_dir, workers=2)
+        retrieved = retriever.retrieve(['job.stdout', 'job.stderr', 'result.*'])
+        self.assertEqual(sorted(retrieved), ['job.stdout', 'result.txt'])
+        self.assertFalse(os.path.exists(os.path.join(self.local_dir, 'scratch.tmp')))
+        with open(os.path.join(self.local_dir, 'result.txt'), 'rb') as fp:
+            self.assertEqual(fp.read(), b'result')
+
+
+class LocalJob(object):
+    """ Minimal job for local processes tests """
+    stdout = 'job.stdout'
+    stderr = 'job.stderr'
+
+    def __init__(self, working_dir, arguments):
+        self.working_dir = working_dir
+        self.command_line_arguments = arguments
+        self.slug = uuid.uuid4()
+        self.remote_job_id = 'local-%s' % self.slug
+
+
+class LocalProcessTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dirs = []
+        self.adaptor = LocalProcessAdaptor(command='sleep', max_jobs=1)
+        self.adaptor.connector = ProcessRegistry()
+
+    def tearDown(self):
+        for dir_path in self.dirs:
+            shutil.rmtree(dir_path)
+
+    def new_job(self, arguments):
+        self.dirs.append(tempfile.mkdtemp())
+        return LocalJob(self.dirs[-1], arguments)
+
+    def wait_status(self, job, expected, timeout=10):
+        start = time.time()
+        while self.adaptor._job_status(job) != expected and time.time() - start < timeout:
+            time.sleep(0.1)
+        self.assertEqual(self.adaptor._job_status(job), expected)
+
+    def test_max_jobs(self):
+        jobs = [self.new_job('0.5'), self.new_job('0')]
+        for job in jobs:
+            self.adaptor._run_job(job)
+        # max one process at once, second one is queued
+        self.assertEqual([self.adaptor._job_status(job) for job in jobs],
+                         [JobStatus.JOB_RUNNING, JobStatus.JOB_QUEUED])
+        self.wait_status(jobs[0], JobStatus.JOB_COMPLETED)
+        self.wait_status(jobs[1], JobStatus.JOB_COMPLETED)
+        self.assertEqual(self.adaptor._job_results(jobs[1]).exit_code, 0)
+        # terminated states are dropped from registry once reported
+        self.assertEqual([self.adaptor.connector.state(job.remote_job_id) for job in jobs], [None, None])
+
+    def test_cancel(self):
+        jobs = [self.new_job('30'), self.new_job('30')]
+        for job in jobs:
+            self.adaptor._run_job(job)
+        self.adaptor._cancel_job(jobs[1])
+        self.assertEqual(self.adaptor._job_status(jobs[1]), JobStatus.JOB_CANCELLED)
+        self.assertFalse(os.path.exists(os.path.join(jobs[1].working_dir, PENDING_FILE)))
+        self.adaptor._cancel_job(jobs[0])
+        self.wait_status(jobs[0], JobStatus.JOB_CANCELLED)
+        self.assertEqual([self.adaptor.connector.state(job.remote_job_id) for job in jobs], [None, None])
+        self.assertEqual(self.adaptor._job_status(jobs[1]), JobStatus.JOB_CANCELLED)
+
+    def test_files_fallback(self):
+        job = self.new_job('0')
+        exit_file, pid_file = os.path.join(job.working_dir, EXIT_FILE), os.path.join(job.working_dir, PID_FILE)
+        # job unknown in this process registry: state read from job working dir files
+        with open(exit_file, 'w') as fp:
+            fp.write('0')
+        self.assertEqual(self.adaptor._job_status(job), JobStatus.JOB_COMPLETED)
+        with open(exit_file, 'w') as fp:
+            fp.write('-9')
+        self.assertEqual(self.adaptor._job_status(job), JobStatus.JOB_ERROR)
+        os.remove(exit_file)
+        with open(pid_file, 'w') as fp:
+            fp.write('%s' % os.getpid())
+        self.assertEqual(self.adaptor._job_status(job), JobStatus.JOB_RUNNING)
+        os.remove(pid_file)
+        self.assertEqual(self.adaptor._job_status(job), JobStatus.JOB_UNDEFINED)
+        # queued state lost by its process (i.e restart) is picked up from pending file
+        open(os.path.join(job.working_dir, PENDING_FILE), 'w').close()
+        self.assertEqual(self.adaptor._job_status(job), JobStatus.JOB_QUEUED)
+        self.wait_status(job, JobStatus.JOB_COMPLETED)
@@ -71,7 +71,7 @@ class ServiceAdmin(ExportInMassMixin, DuplicateInMassMixin, MarkPublicInMassMixi
 
         }),
         ('Computing infrastructure', {
-            'fields': ['runner', 'binary_file', 'display_run_params'],
+            'fields': ['runner', 'binary_file', 'display_run_params', 'cache_results'],
             'classes': ['collapse', ]
         }),
         ('Manage Access', {
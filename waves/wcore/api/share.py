@@ -1,7 +1,16 @@
 from __future__ import unicode_literals
 
+import datetime
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+
+from waves.wcore.models import get_submission_model
 from waves.wcore.models.inputs import AParam
+from waves.wcore.settings import waves_settings
 
 
 class DynamicFieldsModelSerializer(serializers.ModelSerializer):
@@ -36,3 +45,98 @@ class RecursiveField(serializers.ModelSerializer):
     def to_representation(self, value):
         serializer = self.parent.parent.__class__(value, context=self.context)
         return serializer.data
+
+
+class JobsCursorPagination(CursorPagination):
+    """
+    Jobs lists cursor pagination, ordered by last update (then id): pages are retrieved from an indexed position
+    whatever the total number of jobs. Page size may be set with `page_size` query param, up to
+    ``API_JOBS_PAGE_SIZE_MAX``.
+    """
+    ordering = ('-updated', '-id')
+    page_size_query_param = 'page_size'
+
+    def __init__(self):
+        self.page_size = waves_settings.API_JOBS_PAGE_SIZE
+        self.max_page_size = waves_settings.API_JOBS_PAGE_SIZE_MAX
+
+
+#: Jobs lists date range filters (query param: lookup)
+JOBS_DATE_FILTERS = {
+    'created_after': 'created__gte',
+    'created_before': 'created__lt',
+    'updated_after': 'updated__gte',
+    'updated_before': 'updated__lt',
+}
+
+
+def parse_filter_date(name, value):
+    """ Parse date range filter value, either an ISO date or datetime
+
+    :raise: :class:`rest_framework.exceptions.ValidationError` if value is not a valid date
+    """
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            date = parse_date(value)
+            parsed = datetime.datetime.combine(date, datetime.time()) if date is not None else None
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: 'Expected an ISO formatted date or datetime'})
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def filter_jobs(queryset, params):
+    """ Filter jobs queryset according to request query params:
+
+        - status: comma separated jobs status codes
+        - service: service api_name
+        - submission: submission api_name
+        - created_after / created_before / updated_after / updated_before: ISO dates or datetimes
+
+    :raise: :class:`rest_framework.exceptions.ValidationError` on invalid filter value
+    :return: QuerySet
+    """
+    if params.get('status'):
+        try:
+            queryset = queryset.filter(_status__in=[int(code) for code in params['status'].split(',')])
+        except ValueError:
+            raise ValidationError({'status': 'Expected comma separated status codes'})
+    if params.get('service'):
+        submissions = get_submission_model().objects.filter(service__api_name=params['service'])
+        queryset = queryset.filter(submission__in=submissions.values('pk'))
+    if params.get('submission'):
+        queryset = queryset.filter(submission__api_name=params['submission'])
+    for name, lookup in JOBS_DATE_FILTERS.items():
+        if params.get(name):
+            queryset = queryset.filter(**{lookup: parse_filter_date(name, params[name])})
+    return queryset
+
+
+class JobsListMixin(object):
+    """
+    API viewsets mixin for jobs lists: jobs are filtered (see :func:`filter_jobs`) and paginated (see
+    :class:`JobsCursorPagination`), serialized fields may be selected with `fields` query param (comma separated)
+    """
+    jobs_pagination_class = JobsCursorPagination
+
+    def list_jobs(self, queryset, serializer_class, hidden=None):
+        """ Paginated jobs list response
+
+        :param queryset: jobs queryset
+        :param serializer_class: jobs serializer, a :class:`DynamicFieldsModelSerializer` providing `setup_queryset`
+            and `prefetch` static methods (related objects loaded with a constant number of queries)
+        :param hidden: fields hidden when no fields are selected
+        :return: Response
+        """
+        paginator = self.jobs_pagination_class()
+        queryset = serializer_class.setup_queryset(filter_jobs(queryset, self.request.query_params))
+        page = paginator.paginate_queryset(queryset, self.request, view=self)
+        fields = [field.strip() for field in self.request.query_params.get('fields', '').split(',') if field.strip()]
+        serializer = serializer_class(page, many=True, context=self.get_serializer_context(), fields=fields,
+                                      hidden=hidden or [])
+        serializer_class.prefetch(page, serializer.child.fields.keys())
+        return paginator.get_paginated_response(serializer.data)
@@ -10,6 +10,8 @@ import string
 from django.core.urlresolvers import reverse
 from django.core.exceptions import ObjectDoesNotExist
 from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APITestCase
 
@@ -276,6 +278,67 @@ class WavesAPIV2TestCase(BaseAPITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertDictContainsSubset(response.data, {u'input_file': [u'File Input (:input_file:) is required field']})
 
+    def test_batch_jobs(self):
+        tool_list = self.client.get(reverse('wapi:v2:waves-services-list'), format="json")
+        service_tool = tool_list.data[0]
+        default_submission = self.client.get(service_tool['submissions'][0]['url'])
+        jobs_params = []
+        for _ in range(3):
+            job_params = self.create_job_inputs_for_submission(default_submission.data)
+            for name, value in job_params.items():
+                if hasattr(value, 'read'):
+                    value.close()
+                    job_params[name] = 'ACGT'
+                elif isinstance(value, decimal.Decimal):
+                    job_params[name] = float(value)
+            jobs_params.append(job_params)
+        jobs_params[2].pop('input_file')
+        batch_url = reverse('wapi:v2:waves-services-submission-jobs-batch',
+                            kwargs=dict(service_app_name=service_tool['service_app_name'],
+                                        submission_app_name=default_submission.data['submission_app_name']))
+        self.login("api_user")
+        response = self.client.post(batch_url, data={'jobs': jobs_params}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([job['index'] for job in response.data['jobs']], [0, 1])
+        self.assertEqual(response.data['errors'][0]['index'], 2)
+        self.assertEqual(Job.objects.filter(slug__in=[job['slug'] for job in response.data['jobs']]).count(), 2)
+        response = self.client.post(batch_url, data={'jobs': [jobs_params[2]]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_jobs_list(self):
+        jobs = [self.create_random_job(user=self.users['api_user']) for _ in range(3)]
+        self.login("api_user")
+        jobs_url = reverse('wapi:v2:waves-jobs-list')
+        response = self.client.get(jobs_url, {'page_size': 2, 'fields': 'slug,status'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(set(response.data['results'][0].keys()), {'slug', 'status'})
+        self.assertIsNotNone(response.data['next'])
+        next_page = self.client.get(response.data['next'])
+        listed = [job['slug'] for job in response.data['results'] + next_page.data['results']]
+        self.assertEqual(sorted(listed), sorted(str(job.slug) for job in jobs))
+        response = self.client.get(jobs_url, {'status': JobStatus.JOB_ERROR})
+        self.assertEqual(len(response.data['results']), 0)
+        response = self.client.get(jobs_url, {'updated_after': '2000-01-01', 'status': JobStatus.JOB_CREATED})
+        self.assertEqual(len(response.data['results']), 3)
+        response = self.client.get(jobs_url, {'updated_after': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_jobs_list_queries(self):
+        self.login("api_user")
+        jobs_url = reverse('wapi:v2:waves-jobs-list')
+        params = {'fields': 'url,slug,service,submission,status,inputs,outputs,history,last_message'}
+        counts = []
+        for nb_jobs in (1, 5):
+            while Job.objects.filter(client=self.users['api_user']).count() < nb_jobs:
+                self.create_random_job(user=self.users['api_user'])
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(jobs_url, params)
+            self.assertEqual(len(response.data['results']), nb_jobs)
+            counts.append(len(queries))
+        # constant queries count, whatever the number of listed jobs
+        self.assertEqual(counts[0], counts[1])
+
     def test_token_auth(self):
 
         self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.users['api_user'].waves_user.key)
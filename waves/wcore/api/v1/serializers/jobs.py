@@ -3,8 +3,6 @@
 from __future__ import unicode_literals
 
 import logging
-from os import stat
-from os.path import getsize, isfile
 
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
@@ -12,6 +10,7 @@ from rest_framework.reverse import reverse
 
 from waves.wcore.api.share import DynamicFieldsModelSerializer
 from waves.wcore.models import JobHistory, JobInput, Job, JobOutput, get_service_model
+from waves.wcore.utils.archive import file_size, open_file
 
 Service = get_service_model()
 User = get_user_model()
@@ -100,10 +99,11 @@ class JobOutputSerializer(serializers.ModelSerializer):
     def file_get_content(self, instance):
         """ Either returns output content, or text of content size exceeds 500ko"""
         file_path = instance['file_path']
-        if not isfile(file_path) or stat(file_path).st_size == 0:
+        size = file_size(file_path)
+        if not size:
             return None
-        if getsize(file_path) < 500:
-            with open(file_path) as fp:
+        if size < 500:
+            with open_file(file_path) as fp:
                 file_content = fp.read()
             return file_content.decode()
         return None
@@ -3,15 +3,16 @@
 from __future__ import unicode_literals
 
 from collections import OrderedDict
-from os.path import isfile
 
 from django.contrib.auth import get_user_model
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
 from rest_framework.reverse import reverse
 
 from waves.wcore.api.share import DynamicFieldsModelSerializer
 from waves.wcore.models import JobInput, Job, JobOutput, JobHistory, get_service_model
 from waves.wcore.models.const import ParamType
+from waves.wcore.utils.archive import dir_files, file_exists
 
 Service = get_service_model()
 User = get_user_model()
@@ -96,8 +97,16 @@ class JobOutputSerializer(serializers.ModelSerializer):
 
     content = serializers.FileField(read_only=True, source="file_content")
 
-    def get_url(self, output):
-        if isfile(output.file_path):
+    def get_url(self, output, files=None):
+        """ Output download url, if output file exists
+
+        :param files: job working dir files names, if already listed (see :func:`dir_files`)
+        """
+        if files is not None and '/' not in output.file_name:
+            exists = output.file_name in files
+        else:
+            exists = file_exists(output.file_path)
+        if exists:
             return reverse(viewname='wapi:v2:waves-jobs-output-detail', request=self.context['request'],
                            kwargs={
                                'unique_id': output.job.slug,
@@ -108,12 +117,16 @@ class JobOutputSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         """ Representation for a output """
         to_repr = {}
+        files = None
         for output in instance:
+            if files is None:
+                # outputs share job working dir, listed once
+                files = dir_files(output.job.working_dir)
             to_repr[output.api_name] = OrderedDict([
                 ("label", output.name),
                 ("file_name", output.file_name),
                 ("extension", output.get_extension()),
-                ("url", self.get_url(output)),
+                ("url", self.get_url(output, files)),
             ])
         return to_repr
 
@@ -144,6 +157,31 @@ class JobSerializer(DynamicFieldsModelSerializer,
     last_message = JobHistorySerializer(source='last_history', many=False, fields=['timestamp', 'message'],
                                         read_only=True)
 
+    @staticmethod
+    def setup_queryset(queryset):
+        """ Join jobs related submission and service (see :func:`get_service` / :func:`get_submission`)
+
+        :rtype: QuerySet
+        """
+        return queryset.select_related('submission__service')
+
+    @staticmethod
+    def prefetch(jobs, fields):
+        """ Prefetch related objects for serialized fields, one query per relation whatever the number of jobs
+
+        :param jobs: list of jobs to serialize
+        :param fields: serialized fields names
+        """
+        lookups = []
+        if 'history' in fields or 'last_message' in fields:
+            lookups.append(Job.public_history_prefetch())
+        if 'inputs' in fields:
+            lookups.append('job_inputs')
+        if 'outputs' in fields:
+            lookups.append('outputs')
+        if lookups:
+            prefetch_related_objects(jobs, *lookups)
+
     def get_submission(self, obj):
         if obj.submission and obj.submission.service:
             return reverse(viewname='wapi:v2:waves-services-submission-detail', request=self.context['request'],
@@ -4,7 +4,6 @@
 from __future__ import unicode_literals, print_function
 
 import logging
-from os.path import getsize
 
 import magic
 from django.http import HttpResponse, HttpResponseNotFound, HttpResponseForbidden
@@ -17,10 +16,12 @@ from rest_framework.parsers import JSONParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from waves.wcore.api.share import JobsListMixin
 from waves.wcore.api.v2.serializers.jobs import JobSerializer, JobStatusSerializer, JobOutputSerializer, \
     JobInputSerializer
 from waves.wcore.exceptions.jobs import JobInconsistentStateError
 from waves.wcore.models import Job
+from waves.wcore.utils.archive import file_size, open_file, read_head
 
 logger = logging.getLogger(__name__)
 
@@ -32,14 +33,14 @@ class JobFileView(object):
         if hasattr(instance, 'file_path'):
             try:
                 mime = magic.Magic(mime=True)
-                mime_type = mime.from_file(instance.file_path)
-                with open(instance.file_path) as fp:
+                mime_type = mime.from_buffer(read_head(instance.file_path))
+                with open_file(instance.file_path) as fp:
                     if 'text' or 'x-empty' in mime_type:
                         response = Response(data=fp.read())
                     else:
                         response = HttpResponse(content=fp)
                         response['Content-Type'] = mime_type
-                        response['Content-Length'] = getsize(instance.file_path)
+                        response['Content-Length'] = file_size(instance.file_path)
                         response['Content-Disposition'] = 'attachment; filename=%s' % instance.file_name
                 return response
             except IOError:
@@ -49,7 +50,8 @@ class JobFileView(object):
 
 
 @permission_classes((IsAuthenticated,))
-class JobViewSet(mixins.ListModelMixin,
+class JobViewSet(JobsListMixin,
+                 mixins.ListModelMixin,
                  mixins.RetrieveModelMixin,
                  mixins.DestroyModelMixin,
                  viewsets.GenericViewSet):
@@ -57,11 +59,10 @@ class JobViewSet(mixins.ListModelMixin,
     API entry point for ServiceJobs
     """
     serializer_class = JobSerializer
-    queryset = Job.objects.all()
+    queryset = JobSerializer.setup_queryset(Job.objects.all())
     parser_classes = (JSONParser,)
     lookup_field = 'slug'
     lookup_url_kwarg = 'unique_id'
-    filter_fields = ('_status', 'updated', 'submission')
     http_method_names = ['get', 'options', 'post', 'delete']
 
     @detail_route(methods=['post'], url_path="cancel")
@@ -84,16 +85,20 @@ class JobViewSet(mixins.ListModelMixin,
         """
         Retrieve detailed WAVES job info
         """
-        return super(JobViewSet, self).retrieve(request, *args, **kwargs)
+        instance = self.get_object()
+        serializer = self.get_serializer(instance)
+        JobSerializer.prefetch([instance], serializer.fields.keys())
+        return Response(serializer.data)
 
     @permission_classes((IsAuthenticated,))
     def list(self, request, *args, **kwargs):
         """
-        List current jobs related to user, require to be logged in
+        List current jobs related to user, require to be logged in. Jobs are paginated (cursor) from most recently
+        updated ones, filtered with status, service, submission, created_after, created_before, updated_after,
+        updated_before query params, serialized fields may be selected with fields query param
         """
-        queryset = Job.objects.get_user_job(user=request.user)
-        serializer = self.get_serializer(queryset, many=True, hidden=['inputs', 'outputs', 'history'])
-        return Response(serializer.data)
+        return self.list_jobs(Job.objects.get_user_job(user=request.user), self.get_serializer_class(),
+                              hidden=['inputs', 'outputs', 'history'])
 
     @permission_classes((IsAuthenticated,))
     def destroy(self, request, *args, **kwargs):
@@ -104,7 +109,7 @@ class JobViewSet(mixins.ListModelMixin,
         job = self.get_object()
         try:
             job.run_cancel()
-        except JobInconsistentStateError as e:
+        except JobInconsistentStateError:
             # Even if we can't cancel job, delete it from db, so let it run on adaptor.
             pass
         return super(JobViewSet, self).destroy(request, *args, **kwargs)
@@ -15,13 +15,15 @@ from rest_framework.exceptions import ValidationError as DRFValidationError
 from rest_framework.renderers import StaticHTMLRenderer
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
-from rest_framework.parsers import MultiPartParser, DjangoMultiPartParser
+from rest_framework.parsers import MultiPartParser, JSONParser
 
 from waves.wcore.api.permissions import ServiceAccessPermission
+from waves.wcore.api.share import JobsListMixin
 from waves.wcore.api.v2.serializers.jobs import JobSerializer
 from waves.wcore.api.v2.serializers.services import ServiceSerializer, ServiceSubmissionSerializer
 from waves.wcore.exceptions.jobs import JobException
 from waves.wcore.models import Job, get_service_model, get_submission_model
+from waves.wcore.settings import waves_settings
 from waves.wcore.views.services import ServiceSubmissionForm
 
 Submission = get_submission_model()
@@ -44,7 +46,7 @@ def get_js(obj):
     ]
 
 
-class ServiceViewSet(viewsets.ReadOnlyModelViewSet):
+class ServiceViewSet(JobsListMixin, viewsets.ReadOnlyModelViewSet):
     """
     API entry point to Services (Retrieve, job submission)
     """
@@ -71,12 +73,10 @@ class ServiceViewSet(viewsets.ReadOnlyModelViewSet):
 
     @detail_route(methods=['get'])
     def jobs(self, request, service_app_name):
-        """ Retrieves services Jobs """
+        """ Retrieves services Jobs (paginated, filtered, see :class:`waves.wcore.api.share.JobsListMixin`) """
         service_tool = get_object_or_404(self.get_queryset(), api_name=service_app_name)
         queryset_jobs = Job.objects.get_service_job(user=request.user, service=service_tool)
-        serializer = JobSerializer(queryset_jobs, many=True, context={'request': request},
-                                   hidden=['inputs', 'outputs', 'history'])
-        return Response(serializer.data)
+        return self.list_jobs(queryset_jobs, JobSerializer, hidden=['inputs', 'outputs', 'history'])
 
     @detail_route(methods=['get'])
     @renderer_classes((StaticHTMLRenderer,))
@@ -152,9 +152,7 @@ class ServiceViewSet(viewsets.ReadOnlyModelViewSet):
         obj = service.submissions_api.filter(api_name=submission_app_name)[0]
         if self.request.method == 'GET':
             queryset_jobs = Job.objects.get_submission_job(user=request.user, submission=obj)
-            serializer = JobSerializer(queryset_jobs, many=True, context={'request': request},
-                                       hidden=['inputs', 'outputs', 'history'])
-            return Response(serializer.data)
+            return self.list_jobs(queryset_jobs, JobSerializer, hidden=['inputs', 'outputs', 'history'])
         elif self.request.method == 'POST':
             # CREATE a new job for this submission
             logger.debug("Create Job")
@@ -185,6 +183,47 @@ class ServiceViewSet(viewsets.ReadOnlyModelViewSet):
                 logger.fatal("Create Error %s", e.message)
                 return Response({'error': e.message}, status=status.HTTP_400_BAD_REQUEST)
 
+    @detail_route(methods=['post'], url_name='submission-jobs-batch', parser_classes=(JSONParser,),
+                  url_path=r"submissions/(?P<submission_app_name>[\w-]+)/jobs/batch")
+    def submission_jobs_batch(self, request, service_app_name, submission_app_name, *args, **kwargs):
+        """
+        Create a batch of jobs for a submission, expects a JSON body:
+        {"email": "optional@email.com", "jobs": [{"param1": "value1", ...}, {"param1": "value2", ...}]}
+
+        Response reports created jobs and errors, along with their index in submitted list. Status is 201 when all jobs
+        are created, 207 when some failed, 400 if none has been created.
+        """
+        service = self.get_object()
+        obj = get_object_or_404(service.submissions_api, api_name=submission_app_name)
+        passed_data = request.data
+        jobs_params = passed_data.get('jobs') if isinstance(passed_data, dict) else passed_data
+        if not isinstance(jobs_params, list) or not all(isinstance(params, dict) for params in jobs_params):
+            raise DRFValidationError({'jobs': 'Expected a list of parameters sets'})
+        if len(jobs_params) > waves_settings.JOBS_BATCH_MAX:
+            raise DRFValidationError({'jobs': 'Batch is limited to %i jobs' % waves_settings.JOBS_BATCH_MAX})
+        email = passed_data.get('email', None) if isinstance(passed_data, dict) else None
+        created, errors = Job.objects.create_batch_from_submission(submission=obj,
+                                                                   submitted_inputs_list=jobs_params,
+                                                                   email_to=email,
+                                                                   user=self.request.user)
+        jobs = []
+        for index, created_job in created:
+            job_data = dict(JobSerializer(created_job, many=False, context={'request': request},
+                                          fields=('slug', 'url', 'created', 'status', 'service',
+                                                  'submission')).data)
+            job_data['index'] = index
+            jobs.append(job_data)
+        logger.debug('Batch jobs created %i, errors %i', len(created), len(errors))
+        if len(errors) == 0:
+            response_status = status.HTTP_201_CREATED
+        elif len(created) > 0:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({'jobs': jobs,
+                         'errors': [{'index': index, 'errors': error} for index, error in errors]},
+                        status=response_status)
+
     @detail_route(methods=['get'], url_name='submission-list')
     def submissions_list(self, request, service_app_name):
         obj = self.get_object()
@@ -14,3 +14,4 @@
 """
 from .process_queue import process_job_queue
 from .purge_jobs import purge_old_jobs
+from .send_mails import send_queued_mails
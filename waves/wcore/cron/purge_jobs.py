@@ -16,22 +16,17 @@ from __future__ import unicode_literals
 
 import datetime
 import logging
-from itertools import chain
 
-from waves.wcore.models import Job
+from waves.wcore.job_purge import JobPurger, JobArchiver
+from waves.wcore.utils.blobs import blob_store
 
 logger = logging.getLogger('waves.cron')
 
 
 def purge_old_jobs():
-    from waves.wcore.settings import waves_settings
-
     logger.info("Purge job launched at: %s", datetime.datetime.now().strftime('%A, %d %B %Y %H:%M:%I'))
-    date_anonymous = datetime.date.today() - datetime.timedelta(waves_settings.KEEP_ANONYMOUS_JOBS)
-    date_registered = datetime.date.today() - datetime.timedelta(waves_settings.KEEP_REGISTERED_JOBS)
-    anonymous = Job.objects.filter(client__isnull=True, updated__lt=date_anonymous)
-    registered = Job.objects.filter(client__isnull=False, updated__lt=date_registered)
-    for job in list(chain(*[anonymous, registered])):
-        logger.info('Deleting job %s created on %s', job.slug, job.created)
-        job.delete()
+    report = JobPurger().purge()
+    logger.info('Purged %i jobs, removed %i working dirs', report['jobs'], report['dirs'])
+    JobArchiver().archive()
+    logger.info('Released %i unused stored input files', blob_store.collect())
     logger.info("Purge job terminated at: %s", datetime.datetime.now().strftime('%A, %d %B %Y %H:%M:%I'))
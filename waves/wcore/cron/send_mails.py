@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+from __future__ import unicode_literals
+
+
+import logging
+
+from waves.wcore.mails import OutboxSender
+
+logger = logging.getLogger('waves.cron')
+
+
+def send_queued_mails():
+    """ Send notification emails queued in outbox
+
+    :return: None
+    """
+    logger.info('Sent %i queued emails', OutboxSender().send())
@@ -0,0 +1,308 @@
+""" WAVES expired jobs purge engine, finished jobs archival, jobs working dirs consistency checks """
+from __future__ import unicode_literals
+
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
+from os.path import basename, dirname, join
+
+from django.db import transaction
+
+from waves.wcore.settings import waves_settings
+from waves.wcore.utils.archive import archive_dir as archive_job_dir
+from waves.wcore.utils.blobs import blob_store
+from waves.wcore.utils.layout import job_dir_layout
+from waves.wcore.utils.logged import log_files
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['JobPurger', 'JobArchiver', 'JobDirsChecker', 'defer_dirs_removal', 'dirs_removal_deferred']
+
+_state = threading.local()
+
+
+@contextmanager
+def defer_dirs_removal():
+    """ Within context, deleted jobs working dirs are not removed by job post_delete handler """
+    _state.deferred = True
+    try:
+        yield
+    finally:
+        _state.deferred = False
+
+
+def dirs_removal_deferred():
+    return getattr(_state, 'deferred', False)
+
+
+def dir_size(path):
+    """ Size of files only linked in dir (stored input files linked elsewhere may not be freed) """
+    total = 0
+    for dir_path, _, file_names in os.walk(path):
+        for file_name in file_names:
+            try:
+                stat = os.lstat(os.path.join(dir_path, file_name))
+            except OSError:
+                continue
+            if stat.st_nlink <= 1:
+                total += stat.st_size
+    return total
+
+
+def remove_dir(path):
+    """ Remove job working dir, release stored input files """
+    try:
+        log_files.close_dir(path)
+        digests = blob_store.manifest(path)
+        shutil.rmtree(path, ignore_errors=True)
+        blob_store.release(digests)
+    except Exception as exc:
+        logger.warning('Unable to remove job dir %s: %s', path, exc)
+
+
+def archive_dir(path, archive_root):
+    """ Archive job working dir as <archive_root>/<dir name>.tar.gz, then remove it """
+    try:
+        shutil.make_archive(join(archive_root, basename(path)), 'gztar',
+                            root_dir=dirname(path), base_dir=basename(path))
+    except Exception as exc:
+        logger.warning('Unable to archive job dir %s: %s', path, exc)
+        return
+    remove_dir(path)
+
+
+def stream_chunks(queryset, chunk_size):
+    """ Stream jobs (pk, slug) by chunks, without loading whole queryset """
+    last = None
+    while True:
+        chunk_qs = queryset if last is None else queryset.filter(pk__gt=last)
+        chunk = list(chunk_qs.order_by('pk').values_list('pk', 'slug')[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last = chunk[-1][0]
+
+
+def run_pool(function, items, workers):
+    """ Apply function on items within ``workers`` threads """
+    if not items:
+        return []
+    pool = ThreadPool(processes=max(1, min(workers, len(items))))
+    try:
+        return pool.map(function, items)
+    finally:
+        pool.close()
+        pool.join()
+
+
+class JobPurger(object):
+    """
+    Purge expired jobs (see ``KEEP_ANONYMOUS_JOBS`` and ``KEEP_REGISTERED_JOBS`` settings).
+
+    Expired jobs ids are streamed by chunks of ``PURGE_CHUNK_SIZE`` jobs, each chunk is deleted with bulk deletes
+    in its own short transaction. Jobs working dirs are removed by ``PURGE_WORKERS`` background threads meanwhile.
+    In dry run mode, nothing is deleted: jobs, working dirs counts and bytes to be freed are only reported.
+    """
+
+    def __init__(self, chunk_size=None, workers=None, dry_run=False, progress=None):
+        self.chunk_size = chunk_size or waves_settings.PURGE_CHUNK_SIZE
+        self.workers = workers or waves_settings.PURGE_WORKERS
+        self.dry_run = dry_run
+        self.progress = progress or self.log_progress
+
+    def log_progress(self, report, total):
+        logger.info('%s %i/%i jobs (%i dirs, %i bytes)', 'Checked' if self.dry_run else 'Purged',
+                    report['jobs'], total, report['dirs'], report['bytes'])
+
+    def get_queryset(self):
+        from waves.wcore.models import Job
+        return Job.objects.expired()
+
+    @staticmethod
+    def delete(pks):
+        """ Delete jobs rows (and related inputs, outputs, history) at once, leave working dirs """
+        from waves.wcore.models import Job
+        with transaction.atomic(), defer_dirs_removal():
+            Job.objects.filter(pk__in=pks).delete()
+
+    def purge(self, queryset=None):
+        """ Purge jobs
+
+        :param queryset: jobs to purge, default to expired jobs
+        :return: dictionary with purged jobs count, removed working dirs count, freed bytes (dry run only)
+        """
+        queryset = queryset if queryset is not None else self.get_queryset()
+        total = queryset.count()
+        report = dict(jobs=0, dirs=0, bytes=0)
+        layout = job_dir_layout()
+        pool = ThreadPool(processes=max(1, self.workers))
+        try:
+            for chunk in stream_chunks(queryset, self.chunk_size):
+                paths = [path for path in (layout.path(slug) for _, slug in chunk) if os.path.isdir(path)]
+                if self.dry_run:
+                    report['bytes'] += sum(pool.map(dir_size, paths))
+                else:
+                    self.delete([pk for pk, _ in chunk])
+                    for path in paths:
+                        pool.apply_async(remove_dir, (path,))
+                report['jobs'] += len(chunk)
+                report['dirs'] += len(paths)
+                self.progress(report, total)
+        finally:
+            pool.close()
+            pool.join()
+        return report
+
+
+class JobArchiver(object):
+    """
+    Archive finished jobs working dirs not updated for ``ARCHIVE_JOBS_AFTER`` days (0 disables archival): files are
+    moved to a compressed archive in working dir, still readable one by one (see :mod:`waves.wcore.utils.archive`).
+    Jobs are streamed by chunks of ``PURGE_CHUNK_SIZE``, dirs are archived by ``PURGE_WORKERS`` threads.
+    """
+
+    def __init__(self, age=None, chunk_size=None, workers=None):
+        self.age = age if age is not None else waves_settings.ARCHIVE_JOBS_AFTER
+        self.chunk_size = chunk_size or waves_settings.PURGE_CHUNK_SIZE
+        self.workers = workers or waves_settings.PURGE_WORKERS
+
+    def get_queryset(self):
+        from waves.wcore.models import Job
+        return Job.objects.archivable(self.age)
+
+    @staticmethod
+    def archive_path(path):
+        try:
+            return archive_job_dir(path)
+        except Exception as exc:
+            logger.warning('Unable to archive job dir %s: %s', path, exc)
+            return 0, 0
+
+    def archive(self, queryset=None):
+        """ Archive jobs working dirs
+
+        :param queryset: jobs to archive, default to finished jobs idle for ``ARCHIVE_JOBS_AFTER`` days
+        :return: dictionary with archived jobs count, archived files count, freed bytes
+        """
+        report = dict(jobs=0, files=0, bytes=0)
+        if not self.age and queryset is None:
+            return report
+        queryset = queryset if queryset is not None else self.get_queryset()
+        layout = job_dir_layout()
+        for chunk in stream_chunks(queryset, self.chunk_size):
+            paths = [path for path in (layout.path(slug) for _, slug in chunk) if os.path.isdir(path)]
+            for files, freed in run_pool(self.archive_path, paths, self.workers):
+                if files:
+                    report['jobs'] += 1
+                    report['files'] += files
+                    report['bytes'] += freed
+        logger.info('Archived %i jobs dirs (%i files), %i bytes freed', report['jobs'], report['files'],
+                    report['bytes'])
+        return report
+
+
+class JobDirsChecker(object):
+    """
+    Check jobs working dirs consistency with database, without one query per dir.
+
+    Working dirs found on disk and jobs slugs in database (read by chunks of ``PURGE_CHUNK_SIZE`` rows) are both
+    iterated in slug order and merged: dirs without job in database are orphans, jobs without working dir are missing.
+    Dirs modified within ``PURGE_ORPHANS_GRACE`` seconds are never orphans (jobs being created have their working
+    dir before their database row is committed), orphans are checked again against database before being removed.
+    """
+
+    def __init__(self, chunk_size=None, workers=None, grace=None):
+        self.chunk_size = chunk_size or waves_settings.PURGE_CHUNK_SIZE
+        self.workers = workers or waves_settings.PURGE_WORKERS
+        self.grace = grace if grace is not None else waves_settings.PURGE_ORPHANS_GRACE
+
+    @staticmethod
+    def disk_dirs():
+        """ Jobs working dirs found on disk
+
+        :return: list of tuples (slug hex, path), sorted by slug
+        """
+        return sorted((slug.hex, path) for slug, path in job_dir_layout().scan())
+
+    def db_slugs(self):
+        """ Stream jobs slugs from database, sorted """
+        from waves.wcore.models import Job
+        last = None
+        while True:
+            chunk_qs = Job.objects.all() if last is None else Job.objects.filter(slug__gt=last)
+            chunk = list(chunk_qs.order_by('slug').values_list('slug', flat=True)[:self.chunk_size])
+            if not chunk:
+                return
+            for slug in chunk:
+                yield slug
+            last = chunk[-1]
+
+    def diff(self):
+        """ Merge sorted disk dirs and database slugs
+
+        :return: tuple (orphan dirs paths, slugs of jobs without working dir)
+        """
+        orphans, missing = [], []
+        dirs = iter(self.disk_dirs())
+        current = next(dirs, None)
+        for slug in self.db_slugs():
+            while current is not None and current[0] < slug.hex:
+                orphans.append(current[1])
+                current = next(dirs, None)
+            if current is None or current[0] != slug.hex:
+                missing.append(slug)
+            while current is not None and current[0] == slug.hex:
+                current = next(dirs, None)
+        while current is not None:
+            orphans.append(current[1])
+            current = next(dirs, None)
+        return [path for path in orphans if self.is_stale(path)], missing
+
+    def is_stale(self, path):
+        """ Whether dir has not been modified for grace period """
+        try:
+            return os.path.getmtime(path) < time.time() - self.grace
+        except OSError:
+            return False
+
+    def unknown(self, paths):
+        """ Check again orphan dirs against database, right before they are removed
+
+        :return: dirs paths still without job in database
+        """
+        from waves.wcore.models import Job
+        slugs = dict((basename(path.rstrip(os.sep)), path) for path in paths)
+        known = set()
+        names = list(slugs.keys())
+        for start in range(0, len(names), self.chunk_size):
+            known.update(str(slug) for slug in Job.objects.filter(
+                slug__in=names[start:start + self.chunk_size]).values_list('slug', flat=True))
+        return [path for name, path in slugs.items() if name not in known]
+
+    def sizes(self, paths):
+        """ Bytes freed by removing dirs """
+        return sum(run_pool(dir_size, paths, self.workers))
+
+    def delete(self, paths):
+        """ Remove orphan dirs
+
+        :return: removed dirs paths
+        """
+        paths = self.unknown(paths)
+        run_pool(remove_dir, paths, self.workers)
+        return paths
+
+    def archive(self, paths, archive_root):
+        """ Move orphan dirs as compressed archives in archive_root
+
+        :return: archived dirs paths
+        """
+        paths = self.unknown(paths)
+        if not os.path.isdir(archive_root):
+            os.makedirs(archive_root)
+        run_pool(lambda path: archive_dir(path, archive_root), paths, self.workers)
+        return paths
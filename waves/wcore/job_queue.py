@@ -0,0 +1,384 @@
+""" WAVES job queue processing engine """
+from __future__ import unicode_literals
+
+import errno
+import logging
+import os
+import select
+import socket
+import threading
+import time
+import uuid
+from multiprocessing.pool import ThreadPool
+
+try:
+    from contextlib import ExitStack
+except ImportError:
+    from contextlib2 import ExitStack
+
+from django.db import connection
+from django.db.models import prefetch_related_objects
+
+import waves.wcore.exceptions
+from waves.wcore.adaptors.const import JobStatus
+from waves.wcore.adaptors.exceptions import AdaptorException
+from waves.wcore.settings import waves_settings
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['JobQueueProcessor', 'QueueListener', 'notify_queue']
+
+
+def runner_setting(runner, values, default):
+    """ Retrieve a per runner setting value, keyed by adaptor connexion string or adaptor class path
+
+    :param runner: adaptor instance (may be None)
+    :param values: dictionary of per runner values
+    :param default: value returned when runner is not configured
+    """
+    if runner is not None and values:
+        clazz = '.'.join([runner.__module__, runner.__class__.__name__])
+        for key in (runner.connexion_string(), clazz):
+            if key in values:
+                return values[key]
+    return default
+
+
+class JobQueueProcessor(object):
+    """
+    Process WAVES job queue: each non terminated job is moved to its next lifecycle step.
+
+    Jobs are grouped by runner (i.e their serialized adaptor configuration), each group is dispatched to its own
+    bounded thread pool, so that a slow runner (i.e long SSH uploads) does not block jobs running elsewhere.
+    Prepared jobs from a same submission are launched at once when runner allows it (i.e cluster job arrays).
+    Pool size is read from ``QUEUE_RUNNER_WORKERS`` (keyed by adaptor connexion string or adaptor class path),
+    falling back to ``QUEUE_WORKERS``.
+    Only jobs due for a status check are retrieved (see :func:`waves.wcore.models.jobs.Job.schedule_status_check`),
+    they are leased to current processor for the pass duration, several processors can run concurrently.
+
+    .. note::
+        Job lifecycle steps are processed within threads (Django models objects are not picklable), runners whose
+        pool size is 1 are processed sequentially within calling thread when ``QUEUE_WORKERS`` is set to 1.
+    """
+
+    def __init__(self, workers=None, runner_workers=None, batch_size=None):
+        self.workers = workers if workers is not None else waves_settings.QUEUE_WORKERS
+        self.runner_workers = runner_workers if runner_workers is not None else waves_settings.QUEUE_RUNNER_WORKERS
+        self.batch_size = batch_size if batch_size is not None else waves_settings.QUEUE_BATCH_SIZE
+        self.owner = '%s-%s-%s' % (waves_settings.HOST, os.getpid(), uuid.uuid4().hex[:8])
+
+    def get_queryset(self):
+        """ Lease jobs to process in this queue pass, bounded to ``QUEUE_BATCH_SIZE`` jobs
+
+        :return: QuerySet
+        """
+        from waves.wcore.models import Job
+        return Job.objects.claim_queue_jobs(self.owner, limit=self.batch_size)
+
+    @staticmethod
+    def prefetch(jobs):
+        """ Prefetch inputs and outputs only for jobs whose next step needs them (prepare, launch, results) """
+        steps_jobs = [job for job in jobs if job.status in (JobStatus.JOB_CREATED,
+                                                            JobStatus.JOB_PREPARED,
+                                                            JobStatus.JOB_COMPLETED)]
+        if steps_jobs:
+            prefetch_related_objects(steps_jobs, 'job_inputs', 'outputs')
+
+    @staticmethod
+    def runner_key(job):
+        """ Group jobs executed with the very same adaptor configuration """
+        return job._adaptor or 'submission-%s' % job.submission_id
+
+    def pool_size(self, runner, nb_jobs):
+        """ Determine pool size for a runner
+
+        :param runner: the adaptor instance related to jobs group (may be None)
+        :param nb_jobs: number of jobs to process for this runner
+        :return: int
+        """
+        size = runner_setting(runner, self.runner_workers, self.workers)
+        return max(1, min(size, nb_jobs))
+
+    def process(self, jobs=None):
+        """ Process a queue pass
+
+        :param jobs: jobs to process, default to :func:`get_queryset` (leased jobs are released at the end of pass)
+        :return: the number of processed jobs
+        :rtype: int
+        """
+        start = time.time()
+        if jobs is not None:
+            return self._process(list(jobs), start)
+        try:
+            return self._process(list(self.get_queryset()), start)
+        finally:
+            from waves.wcore.models import Job
+            Job.objects.release_queue_jobs(self.owner)
+
+    def _process(self, jobs, start):
+        if len(jobs) == 0:
+            return 0
+        self.prefetch(jobs)
+        logger.info("Starting queue process with %i(s) unfinished jobs (loaded in %.3fs)", len(jobs),
+                    time.time() - start)
+        groups = {}
+        for job in jobs:
+            groups.setdefault(self.runner_key(job), []).append(job)
+        pools = []
+        for runner_jobs in groups.values():
+            # a broken runner does not prevent other runners jobs processing
+            runner = None
+            try:
+                runner = runner_jobs[0].adaptor
+                launched = set(id(job) for job in self.launch_jobs(runner, runner_jobs))
+                checked = set(id(job) for job in self.check_status(runner, runner_jobs))
+                steps = [(job, id(job) in checked) for job in runner_jobs if id(job) not in launched]
+                if not steps:
+                    continue
+                size = self.pool_size(runner, len(runner_jobs))
+                if size == 1 and (self.workers <= 1 or len(groups) == 1):
+                    for step in steps:
+                        self.process_job(*step)
+                else:
+                    pool = ThreadPool(processes=size)
+                    pools.append((pool, pool.map_async(self._threaded_process_job, steps)))
+                    pool.close()
+            except Exception as exc:
+                logger.exception('Unable to process %i jobs with %s: %s', len(runner_jobs), runner, exc)
+        for pool, result in pools:
+            pool.join()
+            try:
+                result.get()
+            except Exception as exc:
+                logger.exception('Queue worker raised unrecoverable exception %s', exc)
+        return len(jobs)
+
+    def _threaded_process_job(self, step):
+        """ Process job in a worker thread, release thread dedicated db connection afterwards """
+        try:
+            self.process_job(*step)
+        finally:
+            if threading.current_thread().name != 'MainThread':
+                connection.close()
+
+    def launch_jobs(self, runner, jobs):
+        """ Launch at once prepared jobs from a same submission (i.e as a cluster job array), whenever runner allows
+        it (see :attr:`waves.wcore.adaptors.JobAdaptor.bulk_launch`). Each job launch is processed as a lifecycle
+        step (see :func:`process_job`), steps are written once launch is done, unexpected launch errors are recorded
+        as jobs fatal errors.
+
+        :param runner: the adaptor instance related to jobs
+        :param jobs: runner's jobs to process
+        :return: the list of launched jobs, others are left to single job launch
+        """
+        if runner is None or not runner.bulk_launch:
+            return []
+        submissions = {}
+        for job in jobs:
+            if job.status == JobStatus.JOB_PREPARED:
+                submissions.setdefault(job.submission_id, []).append(job)
+        launched = []
+        for submission_jobs in submissions.values():
+            submission_jobs = [job for job in submission_jobs if self.renew_lease(job)]
+            if len(submission_jobs) < 2:
+                continue
+            try:
+                with ExitStack() as steps:
+                    for job in submission_jobs:
+                        steps.enter_context(job.lifecycle_step(lease_owner=self.step_owner(job)))
+                    try:
+                        runner.run_jobs(submission_jobs)
+                        for job in submission_jobs:
+                            job.nb_retry = 0
+                            job.save()
+                            job.check_send_mail()
+                    except AdaptorException as exc:
+                        logger.warning('Unable to launch %i jobs at once with %s: %s', len(submission_jobs), runner,
+                                       exc.message)
+                        continue
+                    except Exception as exc:
+                        logger.exception('Jobs launch raised unrecoverable exception %s', exc)
+                        for job in submission_jobs:
+                            job.fatal_error(exc)
+                    finally:
+                        runner.disconnect()
+            except Exception as exc:
+                logger.exception('Unable to write %i launched jobs steps: %s', len(submission_jobs), exc)
+            launched.extend(submission_jobs)
+        return launched
+
+    @staticmethod
+    def check_status(runner, jobs):
+        """ Retrieve remote status at once for all jobs of a runner waiting for a status check
+
+        :param runner: the adaptor instance related to jobs
+        :param jobs: runner's jobs to process
+        :return: the list of jobs which status has been retrieved
+        """
+        status_jobs = [job for job in jobs if job.status not in (JobStatus.JOB_CREATED,
+                                                                 JobStatus.JOB_PREPARED,
+                                                                 JobStatus.JOB_COMPLETED)]
+        if runner is None or len(status_jobs) == 0:
+            return []
+        try:
+            return runner.jobs_status(status_jobs)
+        except AdaptorException as exc:
+            logger.warning('Unable to retrieve jobs status at once for %s: %s', runner, exc.message)
+            return []
+        finally:
+            runner.disconnect()
+
+    def step_owner(self, job):
+        """ Lease owner for job lifecycle steps: current processor for jobs it leased, step changes are then written
+        only if job is still leased (see :class:`waves.wcore.models.jobs.JobStep`), None for other jobs """
+        return self.owner if job.lease_owner == self.owner else None
+
+    def renew_lease(self, job):
+        """ Extend current processor lease on job before a lifecycle step
+
+        :return: True if job can be processed, False if lease has been lost (i.e reclaimed by another processor)
+        """
+        from waves.wcore.models import Job
+        if self.step_owner(job) is None or Job.objects.renew_queue_lease(job, self.owner):
+            return True
+        logger.warning('Job %s lease lost by %s, skipped', job.slug, self.owner)
+        return False
+
+    def process_job(self, job, status_checked=False):
+        """ Move job to its next lifecycle step, according to its current status, step changes are written at once
+        (see :func:`waves.wcore.models.jobs.Job.lifecycle_step`)
+
+        :param job: the job to process
+        :param status_checked: job remote status has already been retrieved (see :func:`check_status`)
+        :return: None
+        """
+        runner = job.adaptor
+        if runner and logger.isEnabledFor(logging.DEBUG):
+            logger.debug('[Runner]-------\n%s\n----------------', runner.dump_config())
+        if not self.renew_lease(job):
+            return
+        # history events and job saves are written at once at step end
+        with job.lifecycle_step(lease_owner=self.step_owner(job)):
+            try:
+                job.check_send_mail()
+                logger.debug("Launching Job %s (adapter:%s)", job, runner)
+                if job.status == JobStatus.JOB_CREATED:
+                    job.run_prepare()
+                    logger.debug("[PrepareJob] %s (adapter:%s)", job, runner)
+                elif job.status == JobStatus.JOB_PREPARED:
+                    logger.debug("[LaunchJob] %s (adapter:%s)", job, runner)
+                    job.run_launch()
+                elif job.status == JobStatus.JOB_COMPLETED:
+                    job.run_results()
+                    logger.debug("[JobExecutionEnded] %s (adapter:%s)", job.get_status_display(), runner)
+                else:
+                    job.run_status(status_checked=status_checked)
+            except (waves.wcore.exceptions.WavesException, AdaptorException) as e:
+                logger.error("Error Job %s (adapter:%s-state:%s): %s", job, runner, job.get_status_display(),
+                             e.message)
+            except IOError as exc:
+                logger.error('IO error on job %s [%s]', job.slug, exc)
+                job.status = JobStatus.JOB_ERROR
+                job.save()
+            except Exception as exc:
+                logger.exception('Current job raised unrecoverable exception %s', exc)
+                job.fatal_error(exc)
+            finally:
+                job.check_send_mail()
+                if runner is not None:
+                    runner.disconnect()
+
+
+def queue_socket_path():
+    """ Local socket used to wake up queue daemon """
+    return os.path.join(waves_settings.DATA_ROOT, 'waves_queue.sock')
+
+
+def notify_queue():
+    """ Wake up job queue daemon (if any is listening), to process newly created or re-run jobs immediately
+
+    :return: True if notification has been sent
+    """
+    path = queue_socket_path()
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(path):
+        return False
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+        sock.setblocking(False)
+        sock.sendto(b'1', path)
+        return True
+    except socket.error as exc:
+        logger.debug('Unable to notify job queue: %s', exc)
+        return False
+    finally:
+        sock.close()
+
+
+class QueueListener(object):
+    """
+    Wait for next queue pass: returns as soon as a job notification is received (see :func:`notify_queue`),
+    either after a poll delay, which doubles each time queue is idle, from ``QUEUE_POLL_MIN`` up to
+    ``QUEUE_POLL_MAX`` seconds.
+    """
+
+    def __init__(self, path=None, min_wait=None, max_wait=None):
+        self.path = path or queue_socket_path()
+        self.min_wait = min_wait if min_wait is not None else waves_settings.QUEUE_POLL_MIN
+        self.max_wait = max_wait if max_wait is not None else waves_settings.QUEUE_POLL_MAX
+        self.delay = self.min_wait
+        self._sock = None
+
+    def open(self):
+        if not hasattr(socket, 'AF_UNIX'):
+            logger.warning('Unix sockets not available, job queue is polled every %s seconds', self.min_wait)
+            return
+        try:
+            os.unlink(self.path)
+        except OSError as exc:
+            if exc.errno != errno.ENOENT:
+                raise
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            sock.bind(self.path)
+        except socket.error as exc:
+            sock.close()
+            logger.warning('Unable to listen for job notifications on %s: %s', self.path, exc)
+            return
+        sock.setblocking(False)
+        self._sock = sock
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+    def _drain(self):
+        try:
+            while self._sock.recv(64):
+                pass
+        except socket.error:
+            pass
+
+    def wait(self, busy=True):
+        """ Wait for next queue pass
+
+        :param busy: whether last pass had jobs to process, if not poll delay is increased
+        :return: True if woken up by a notification
+        """
+        self.delay = self.min_wait if busy else min(self.delay * 2, self.max_wait)
+        if self._sock is None:
+            time.sleep(self.delay)
+            return False
+        try:
+            readable, _, _ = select.select([self._sock], [], [], self.delay)
+        except select.error:
+            return False
+        if readable:
+            self._drain()
+            self.delay = self.min_wait
+            return True
+        return False
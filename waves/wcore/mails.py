@@ -1,15 +1,23 @@
 from __future__ import unicode_literals
 
 import logging
+import os
+import threading
+import uuid
+from datetime import timedelta
 
-from django.core.mail import EmailMessage
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
 from django.template.loader import get_template
+from django.utils import timezone
 
 from waves.wcore.adaptors.const import JobStatus
 from waves.wcore.settings import waves_settings as config
 
 logger = logging.getLogger(__name__)
 
+__all__ = ['JobMailer', 'OutboxSender', 'job_mailer']
+
 
 class JobMailer(object):
     """
@@ -37,7 +45,8 @@ class JobMailer(object):
         return config.NOTIFY_RESULTS
 
     def _send_job_mail(self, job, template, subject=None):
-        """ Check if send mail is needed, in such case, create a template email and... send it to specified client
+        """ Check if send mail is needed, in such case, create a template email and queue it in outbox for
+        specified client (sent afterwards by :class:`OutboxSender`)
 
         :return: the number of mail sent, should be 0 or 1
         :rtype: int
@@ -49,14 +58,15 @@ class JobMailer(object):
                 job.title, job.get_status_display()) if subject is None else subject
             try:
                 message = get_template(template_name=template).render(context)
-                msg = EmailMessage(subject=mail_subject, body=message, to=[job.email_to],
-                                   from_email=config.SERVICES_EMAIL)
-                msg.send(fail_silently=True)
-                job.job_history.create(message='Notification email sent', status=job.status, is_admin=True)
+                from waves.wcore.models import OutboxMail
+                job.add_related(OutboxMail(job=job, subject=mail_subject, body=message, to=job.email_to,
+                                           from_email=config.SERVICES_EMAIL))
+                job.add_history('Notification email queued', is_admin=True)
+                return 1
             except Exception as e:
-                job.job_history.create(message='Notification email not sent %s' % e.message, status=job.status,
-                                       is_admin=True)
-                logger.exception("Failed to send mail to %s from %s :%s", job.email_to, config.SERVICES_EMAIL, e)
+                job.add_history('Notification email not queued %s' % e, is_admin=True)
+                logger.exception("Failed to queue mail to %s from %s :%s", job.email_to, config.SERVICES_EMAIL, e)
+                return 0
         else:
             logger.info('Mail not sent to %s, mails are not activated', job.email_to)
             return 0
@@ -116,9 +126,17 @@ class JobMailer(object):
     def check_send_mail(self, job):
         """According to job status, check needs for sending notification emails
 
+        Emails are queued in outbox within same transaction as job last status mail update.
+
         :return: the nmmber of mail sent (should be one)
         :rtype: int
         """
+        if job.status == job.status_mail:
+            return 0
+        with transaction.atomic():
+            return self._check_send_mail(job)
+
+    def _check_send_mail(self, job):
         if job.status != job.status_mail and job.status == JobStatus.JOB_ERROR:
             self.send_job_admin_error(job)
         if config.NOTIFY_RESULTS and job.notify:
@@ -148,3 +166,129 @@ class JobMailer(object):
                 logger.warn('Job [%s] email not sent to %s', job.slug, job.email_to)
         else:
             logger.debug('Jobs notification are not activated')
+
+
+_mailer = None
+
+
+def job_mailer():
+    """ Process wide mailer instance (see ``MAILER_CLASS`` setting) """
+    global _mailer
+    clazz = config.MAILER_CLASS
+    if _mailer is None or _mailer.__class__ is not clazz:
+        _mailer = clazz()
+    return _mailer
+
+
+class OutboxSender(object):
+    """
+    Send queued notification emails (see :class:`waves.wcore.models.outbox.OutboxMail`) by batches of
+    ``MAILS_BATCH_SIZE`` over one reused SMTP connection. Failed emails are retried later, with an exponential backoff
+    starting at ``MAILS_RETRY_DELAY`` seconds, up to ``MAILS_MAX_RETRY`` attempts.
+
+    Several senders may run at once (i.e queue daemons sender threads, ``waves send_mails`` cron command), each batch
+    is leased to its sender for ``MAILS_LEASE_TIME`` seconds (see :func:`OutboxMailManager.claim`).
+    """
+
+    def __init__(self, batch_size=None, max_retry=None, retry_delay=None, lease_time=None):
+        self.batch_size = batch_size or config.MAILS_BATCH_SIZE
+        self.max_retry = max_retry or config.MAILS_MAX_RETRY
+        self.retry_delay = retry_delay or config.MAILS_RETRY_DELAY
+        self.lease_time = lease_time or config.MAILS_LEASE_TIME
+        self.owner = '%s-%s-%s' % (config.HOST, os.getpid(), uuid.uuid4().hex[:8])
+
+    def backoff(self, attempts):
+        return timedelta(seconds=self.retry_delay * 2 ** max(0, attempts - 1))
+
+    def claim(self):
+        """ Lease a batch of pending emails to this sender
+
+        :return: list of :class:`waves.wcore.models.outbox.OutboxMail`
+        """
+        from waves.wcore.models import OutboxMail
+        return list(OutboxMail.objects.claim(self.owner, self.max_retry, self.batch_size, self.lease_time))
+
+    def deliver(self, mails):
+        """ Send claimed emails over one SMTP connection, emails whose lease has been lost are not updated
+
+        :return: tuple (sent emails count, failed emails count)
+        """
+        from waves.wcore.models import OutboxMail
+        if not mails:
+            return 0, 0
+        sent = failed = 0
+        connection = get_connection()
+        try:
+            connection.open()
+            for mail in mails:
+                try:
+                    EmailMessage(subject=mail.subject, body=mail.body, to=mail.recipients, from_email=mail.from_email,
+                                 connection=connection).send()
+                    mail.sent_at = timezone.now()
+                    mail.next_try_at = None
+                    sent += 1
+                except Exception as exc:
+                    logger.warning('Failed to send mail %s to %s: %s', mail.pk, mail.to, exc)
+                    mail.last_error = '%s' % exc
+                    mail.next_try_at = timezone.now() + self.backoff(mail.attempts + 1)
+                    failed += 1
+                    # connection may be lost, re-opened for next mail
+                    connection.close()
+                    try:
+                        connection.open()
+                    except Exception as exc:
+                        logger.warning('Unable to re-open mail connection: %s', exc)
+                mail.attempts += 1
+                mail.lease_owner = None
+                OutboxMail.objects.filter(pk=mail.pk, lease_owner=self.owner).update(
+                    sent_at=mail.sent_at, attempts=mail.attempts, last_error=mail.last_error,
+                    next_try_at=mail.next_try_at, lease_owner=None)
+        except Exception as exc:
+            logger.error('Unable to open mail connection: %s', exc)
+        finally:
+            connection.close()
+        return sent, failed
+
+    def send_batch(self):
+        """ Claim and send one batch of pending emails
+
+        :return: tuple (sent emails count, failed emails count)
+        """
+        return self.deliver(self.claim())
+
+    def send(self):
+        """ Send pending emails by batches, until no email is sent in a batch
+
+        :return: sent emails count
+        """
+        total = 0
+        while True:
+            sent, _ = self.send_batch()
+            total += sent
+            if sent == 0:
+                return total
+
+
+class OutboxSenderThread(threading.Thread):
+    """ Background thread sending queued emails every ``MAILS_SEND_INTERVAL`` seconds """
+
+    def __init__(self, interval=None):
+        super(OutboxSenderThread, self).__init__(name='waves-mails')
+        self.daemon = True
+        self.interval = interval or config.MAILS_SEND_INTERVAL
+        self.stopped = threading.Event()
+
+    def run(self):
+        sender = OutboxSender()
+        while not self.stopped.is_set():
+            try:
+                sender.send()
+            except Exception as exc:
+                logger.exception('Outbox sender error: %s', exc)
+            finally:
+                from django.db import connection
+                connection.close()
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
@@ -3,24 +3,31 @@ from __future__ import unicode_literals
 
 from ..base import SubcommandDispatcher
 from ..command import JobQueueCommand, PurgeDaemonCommand
-from ..subcommands import CleanUpCommand, ImportCommand, DumpConfigCommand, ShowUrlsCommand
+from ..subcommands import CleanUpCommand, ImportCommand, DumpConfigCommand, ShowUrlsCommand, RelayoutCommand, \
+    PurgeJobsCommand, ArchiveJobsCommand, SendMailsCommand
 
+ARCHIVE_JOBS = 'archive_jobs'
 CLEAN = 'clean'
 CONFIG = 'config'
 DUMP = 'dump'
 LOAD = 'load'
 QUEUE = 'queue'
 PURGE = 'purge'
+PURGE_JOBS = 'purge_jobs'
+RELAYOUT = 'relayout'
+SEND_MAILS = 'send_mails'
 SHOWURLS = 'show_urls'
 
 
 class Command(SubcommandDispatcher):
     """ WAVES dedicated administration Django subcommand line interface (./manage.py) """
     help = 'WAVES Administration dedicated commands: type manage.py waves <sub_command> --help for sub-commands help'
-    command_list = (CLEAN, CONFIG, LOAD, SHOWURLS)
+    command_list = (ARCHIVE_JOBS, CLEAN, CONFIG, LOAD, PURGE_JOBS, RELAYOUT, SEND_MAILS, SHOWURLS)
 
     def _subcommand(self, name):
-        if name == CLEAN:
+        if name == ARCHIVE_JOBS:
+            return ArchiveJobsCommand()
+        elif name == CLEAN:
             return CleanUpCommand()
         elif name == QUEUE:
             return JobQueueCommand()
@@ -30,6 +37,12 @@ class Command(SubcommandDispatcher):
             return DumpConfigCommand()
         elif name == PURGE:
             return PurgeDaemonCommand()
+        elif name == PURGE_JOBS:
+            return PurgeJobsCommand()
+        elif name == RELAYOUT:
+            return RelayoutCommand()
+        elif name == SEND_MAILS:
+            return SendMailsCommand()
         elif name == SHOWURLS:
             return ShowUrlsCommand()
         else:
@@ -6,15 +6,14 @@ import logging
 import os
 import signal
 import time
-from itertools import chain
 
 from daemons.prefab import run
 
-import waves.wcore.exceptions
-from waves.wcore.adaptors.exceptions import AdaptorException
-from waves.wcore.adaptors.const import JobStatus
-from waves.wcore.models import Job
+from waves.wcore.job_purge import JobPurger, JobArchiver
+from waves.wcore.job_queue import JobQueueProcessor, QueueListener
+from waves.wcore.mails import OutboxSenderThread
 from waves.wcore.settings import waves_settings
+from waves.wcore.utils.blobs import blob_store
 
 logger = logging.getLogger('waves.daemon')
 LOG = logging.getLogger('daemons')
@@ -96,53 +95,40 @@ class JobQueueRunDaemon(BaseRunDaemon):
     pidfile = os.path.join(waves_settings.DATA_ROOT, 'waves_queue.pid')
     pidfile_timeout = 5
 
+    listener = None
+    mail_sender = None
+
+    def preloop_callback(self):
+        super(JobQueueRunDaemon, self).preloop_callback()
+        self.listener = QueueListener()
+        self.listener.open()
+        # notification emails are sent apart from queue processing
+        self.mail_sender = OutboxSenderThread()
+        self.mail_sender.start()
+
+    def exit_callback(self):
+        if self.listener is not None:
+            self.listener.close()
+        if self.mail_sender is not None:
+            self.mail_sender.stop()
+        super(JobQueueRunDaemon, self).exit_callback()
+
     def loop_callback(self):
         """
         Very very simple daemon to monitor jobs queue.
 
         - Retrieve all current non terminated job, and process according to current status.
-        - Jobs are run on a stateless process
+        - Jobs are run on a stateless process, dispatched to per runner worker pools
+        - Wait for a new job notification, or next poll delay (increased while queue is empty)
 
         :return: None
         """
-        jobs = Job.objects.prefetch_related('job_inputs'). \
-            prefetch_related('outputs').filter(_status__lt=JobStatus.JOB_TERMINATED)
-        if jobs.count() > 0:
-            logger.info("Starting queue process with %i(s) unfinished jobs", jobs.count())
-        for job in jobs:
-            runner = job.adaptor
-            if runner and logger.isEnabledFor(logging.DEBUG):
-                logger.debug('[Runner]-------\n%s\n----------------', runner.dump_config())
-            try:
-                job.check_send_mail()
-                logger.debug("Launching Job %s (adapter:%s)", job, runner)
-                if job.status == JobStatus.JOB_CREATED:
-                    job.run_prepare()
-                    logger.debug("[PrepareJob] %s (adapter:%s)", job, runner)
-                elif job.status == JobStatus.JOB_PREPARED:
-                    logger.debug("[LaunchJob] %s (adapter:%s)", job, runner)
-                    job.run_launch()
-                elif job.status == JobStatus.JOB_COMPLETED:
-                    job.run_results()
-                    logger.debug("[JobExecutionEnded] %s (adapter:%s)", job.get_status_display(), runner)
-                else:
-                    job.run_status()
-            except (waves.wcore.exceptions.WavesException, AdaptorException) as e:
-                logger.error("Error Job %s (adapter:%s-state:%s): %s", job, runner, job.get_status_display(),
-                             e.message)
-            except IOError as exc:
-                logger.error('IO error on job %s [%s]', job.slug, exc)
-                job.status = JobStatus.JOB_ERROR
-                job.save()
-            except Exception as exc:
-                logger.exception('Current job raised unrecoverable exception %s', exc)
-                job.fatal_error(exc)
-            finally:
-                logger.info("Queue job terminated at: %s", datetime.datetime.now().strftime('%A, %d %B %Y %H:%M:%I'))
-                job.check_send_mail()
-                if runner is not None:
-                    runner.disconnect()
-        time.sleep(5)
+        nb_jobs = JobQueueProcessor().process()
+        logger.info("Queue job terminated at: %s", datetime.datetime.now().strftime('%A, %d %B %Y %H:%M:%I'))
+        if self.listener is None:
+            time.sleep(waves_settings.QUEUE_POLL_MIN)
+        elif self.listener.wait(busy=nb_jobs > 0):
+            logger.debug("Queue woken up by job notification")
 
 
 class PurgeDaemon(BaseRunDaemon):
@@ -152,12 +138,9 @@ class PurgeDaemon(BaseRunDaemon):
 
     def loop_callback(self):
         logger.info("Purge job launched at: %s", datetime.datetime.now().strftime('%A, %d %B %Y %H:%M:%I'))
-        date_anonymous = datetime.date.today() - datetime.timedelta(waves_settings.KEEP_ANONYMOUS_JOBS)
-        date_registered = datetime.date.today() - datetime.timedelta(waves_settings.KEEP_REGISTERED_JOBS)
-        anonymous = Job.objects.filter(client__isnull=True, updated__lt=date_anonymous)
-        registered = Job.objects.filter(client__isnull=False, updated__lt=date_registered)
-        for job in list(chain(*[anonymous, registered])):
-            logger.info('Deleting job %s created on %s', job.slug, job.created)
-            job.delete()
+        report = JobPurger().purge()
+        logger.info('Purged %i jobs, removed %i working dirs', report['jobs'], report['dirs'])
+        JobArchiver().archive()
+        logger.info('Released %i unused stored input files', blob_store.collect())
         logger.info("Purge job terminated at: %s", datetime.datetime.now().strftime('%A, %d %B %Y %H:%M:%I'))
         time.sleep(waves_settings.PURGE_WAIT)
@@ -5,26 +5,28 @@ from __future__ import unicode_literals, print_function
 import json
 import logging
 import os
-import uuid
-from shutil import rmtree
 
 # noinspection PyProtectedMember,PyProtectedMember
 from django.conf.urls import RegexURLPattern, RegexURLResolver
 from django.core import urlresolvers
-from django.core.exceptions import ObjectDoesNotExist
 from django.core.management import BaseCommand
 from django.core.management import CommandError
 from django.db import (
     DEFAULT_DB_ALIAS, transaction,
 )
+from django.utils.module_loading import import_string
 from rest_framework.exceptions import ValidationError
 
-from waves.wcore.management.utils import choice_input
+from waves.wcore.adaptors.const import JobStatus
+from waves.wcore.job_purge import JobPurger, JobArchiver, JobDirsChecker
+from waves.wcore.mails import OutboxSender
 from waves.wcore.models import Job
 from waves.wcore.import_export.services import ServiceSerializer
 from waves.wcore.settings import waves_settings as config
+from waves.wcore.utils.layout import job_dir_layout
 
-__all__ = ['CleanUpCommand', 'ImportCommand', 'DumpConfigCommand', 'ShowUrlsCommand']
+__all__ = ['CleanUpCommand', 'RelayoutCommand', 'PurgeJobsCommand', 'ArchiveJobsCommand', 'SendMailsCommand',
+           'ImportCommand', 'DumpConfigCommand', 'ShowUrlsCommand']
 
 logger = logging.getLogger(__name__)
 
@@ -33,47 +35,134 @@ class CleanUpCommand(BaseCommand):
     """ Clean up file system according to jobs in database """
     help = "Clean up inconsistent data on disk related to jobs"
 
-    # args = '[--from-date date] to limit clean up until date'
-    def print_file_error(self, islink, path, exe_info):
-        self.stderr.write("Unable to remove dir %s (%s)" % (path, exe_info))
+    def add_arguments(self, parser):
+        parser.add_argument('--list', action='store_true', dest='list', default=False,
+                            help="List orphan dirs and jobs without working dir")
+        parser.add_argument('--delete', action='store_true', dest='delete', default=False,
+                            help="Delete orphan dirs, this operation is not reversible")
+        parser.add_argument('--archive', dest='archive', default=None, metavar='ARCHIVE_DIR',
+                            help="Move orphan dirs as compressed archives in ARCHIVE_DIR")
+        parser.add_argument('--workers', type=int, dest='workers', default=None,
+                            help="Concurrent dirs operations (default to PURGE_WORKERS setting)")
+
+    def handle(self, *args, **options):
+        if options.get('delete') and options.get('archive'):
+            raise CommandError('--delete and --archive are mutually exclusive')
+        checker = JobDirsChecker(workers=options.get('workers'))
+        orphans, missing = checker.diff()
+        if options.get('list'):
+            for dir_path in orphans:
+                self.stdout.write('Orphan dir: %s' % dir_path)
+            for slug in missing:
+                self.stdout.write('Missing dir for job: %s' % slug)
+        if not orphans and not missing:
+            self.stdout.write("Your jobs data dir is sane, nothing wrong here")
+            return
+        self.stdout.write('%i orphan dir(s) (%i bytes), %i job(s) without working dir' % (
+            len(orphans), checker.sizes(orphans), len(missing)))
+        if options.get('delete'):
+            deleted = checker.delete(orphans)
+            self.stdout.write('%i orphan dir(s) deleted' % len(deleted))
+        elif options.get('archive'):
+            archived = checker.archive(orphans, options.get('archive'))
+            self.stdout.write('%i orphan dir(s) archived in %s' % (len(archived), options.get('archive')))
+
+
+class RelayoutCommand(BaseCommand):
+    """ Move jobs working dirs to their place according to current ``JOB_DIR_LAYOUT`` setting """
+    help = "Move jobs working dirs to current layout (JOB_DIR_LAYOUT setting), while WAVES is running"
 
     def add_arguments(self, parser):
-        parser.add_argument('--to-date', default=None, help="Restrict purge to a date (anterior)")
+        parser.add_argument('--all', action='store_true', dest='all', default=False,
+                            help="Move also dirs of jobs currently processed by adaptors (queue daemon stopped)")
+        parser.add_argument('--dry-run', action='store_true', dest='dry_run', default=False,
+                            help="Only list dirs to move")
+        parser.add_argument('--layout', dest='layout', default=None,
+                            help="Layout class dirs are moved to (default to JOB_DIR_LAYOUT setting)")
+
+    #: Jobs which working dir is still used by adaptors (results not yet retrieved)
+    active_status = JobStatus.PENDING_STATUS + (JobStatus.JOB_SUSPENDED, JobStatus.JOB_COMPLETED)
 
     def handle(self, *args, **options):
-        removed = []
-        for dir_name in os.listdir(config.JOB_BASE_DIR):
+        layout = import_string(options['layout'])() if options.get('layout') else job_dir_layout()
+        misplaced = list(layout.misplaced())
+        active = set()
+        if not options.get('all') and misplaced:
+            # Jobs currently run may have their working dir path stored on remote side (i.e cluster job script)
+            active = set(Job.objects.filter(slug__in=[slug for slug, _, _ in misplaced],
+                                            _status__in=self.active_status).values_list('slug', flat=True))
+        moved = skipped = 0
+        for slug, current, expected in misplaced:
+            if slug in active:
+                skipped += 1
+                continue
+            if options.get('dry_run'):
+                self.stdout.write('%s -> %s' % (current, expected))
+                moved += 1
+                continue
+            if os.path.exists(expected):
+                self.stderr.write('Unable to move %s, %s already exists' % (current, expected))
+                continue
             try:
-                # DO nothing, job exists in DB
-                Job.objects.get(slug=uuid.UUID('{%s}' % dir_name))
-            except ObjectDoesNotExist:
-                removed.append(str(dir_name))
-            except ValueError:
-                pass
-        if len(removed) > 0:
-            while True:
-                choice = choice_input(
-                    "%i directory(ies) to be deleted, this operation is not reversible" % len(removed), choices=[
-                        "List directories to delete",
-                        "Perform delete",
-                        "Exit"
-                    ])
-                if choice == 1:
-                    self.stdout.write("Directories to delete: ")
-                    for dir_name in removed:
-                        self.stdout.write(os.path.join(config.JOB_BASE_DIR, dir_name))
-                elif choice == 2:
-                    for dir_name in removed:
-                        self.stdout.write('Removed directory: %s' % dir_name)
-                        # onerror(os.path.islink, path, sys.exc_info())
-                        rmtree(os.path.join(config.JOB_BASE_DIR, dir_name),
-                               onerror=self.print_file_error)
-                    removed = []
-                else:
-                    break
-            self.stdout.write("...Bye")
+                if not os.path.isdir(os.path.dirname(expected)):
+                    os.makedirs(os.path.dirname(expected))
+                # rename is atomic on same file system: job dir is always found by layout in one place or the other
+                os.rename(current, expected)
+                moved += 1
+            except OSError as exc:
+                self.stderr.write('Unable to move %s (%s)' % (current, exc))
+        self.stdout.write('%i job dir(s) %s, %i active job dir(s) skipped' % (
+            moved, 'to move' if options.get('dry_run') else 'moved', skipped))
+
+
+class PurgeJobsCommand(BaseCommand):
+    """ Purge expired jobs (see ``KEEP_ANONYMOUS_JOBS`` and ``KEEP_REGISTERED_JOBS`` settings) """
+    help = "Purge expired jobs from database and disk"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', dest='dry_run', default=False,
+                            help="Only report jobs to purge and bytes to be freed")
+        parser.add_argument('--chunk-size', type=int, dest='chunk_size', default=None,
+                            help="Jobs deleted per transaction (default to PURGE_CHUNK_SIZE setting)")
+        parser.add_argument('--workers', type=int, dest='workers', default=None,
+                            help="Concurrent working dirs removals (default to PURGE_WORKERS setting)")
+
+    def progress(self, report, total):
+        self.stdout.write('%i/%i jobs, %i dirs' % (report['jobs'], total, report['dirs']))
+
+    def handle(self, *args, **options):
+        purger = JobPurger(chunk_size=options.get('chunk_size'), workers=options.get('workers'),
+                           dry_run=options.get('dry_run'), progress=self.progress)
+        report = purger.purge()
+        if purger.dry_run:
+            self.stdout.write('%i job(s) to purge, %i working dir(s), at least %i bytes to be freed' % (
+                report['jobs'], report['dirs'], report['bytes']))
         else:
-            self.stdout.write("Your jobs data dir is sane, nothing wrong here")
+            self.stdout.write('%i job(s) purged, %i working dir(s) removed' % (report['jobs'], report['dirs']))
+
+
+class ArchiveJobsCommand(BaseCommand):
+    """ Archive finished jobs working dirs (see ``ARCHIVE_JOBS_AFTER`` setting) """
+    help = "Pack finished jobs working dirs in compressed archives"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--age', type=int, dest='age', default=None,
+                            help="Archive jobs not updated for AGE days (default to ARCHIVE_JOBS_AFTER setting)")
+        parser.add_argument('--workers', type=int, dest='workers', default=None,
+                            help="Concurrent archivals (default to PURGE_WORKERS setting)")
+
+    def handle(self, *args, **options):
+        report = JobArchiver(age=options.get('age'), workers=options.get('workers')).archive()
+        self.stdout.write('%i job dir(s) archived (%i files), %i bytes freed' % (
+            report['jobs'], report['files'], report['bytes']))
+
+
+class SendMailsCommand(BaseCommand):
+    """ Send notification emails queued in outbox (when queue daemon is not used) """
+    help = "Send queued notification emails"
+
+    def handle(self, *args, **options):
+        self.stdout.write('%i email(s) sent' % OutboxSender().send())
 
 
 class ImportCommand(BaseCommand):
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.21 on 2026-10-18 17:40
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wcore', '0002_auto_20190624_1122'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='next_check_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Next status check'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.21 on 2026-10-18 18:30
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wcore', '0004_job_queue_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='lease_owner',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True,
+                                   verbose_name='Queue lease owner'),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='lease_expires',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Queue lease expiration'),
+        ),
+    ]
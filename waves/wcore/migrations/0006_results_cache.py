@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.21 on 2026-10-18 21:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wcore', '0005_job_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='cache_results',
+            field=models.BooleanField(default=False,
+                                      help_text='Jobs with identical inputs values and files reuse results from a '
+                                                'previous job',
+                                      verbose_name='Cache results'),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='fingerprint',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, null=True,
+                                   verbose_name='Results fingerprint'),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='cached_from',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True,
+                                   verbose_name='Results cached from job'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.21 on 2026-10-18 23:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wcore', '0006_results_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMail',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Created on')),
+                ('subject', models.CharField(max_length=255, verbose_name='Subject')),
+                ('body', models.TextField(verbose_name='Body')),
+                ('from_email', models.CharField(max_length=255, verbose_name='From')),
+                ('to', models.TextField(verbose_name='To')),
+                ('attempts', models.IntegerField(default=0, verbose_name='Send attempts')),
+                ('next_try_at', models.DateTimeField(blank=True, null=True, verbose_name='Next send attempt')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Sent on')),
+                ('last_error', models.TextField(blank=True, null=True, verbose_name='Last send error')),
+                ('job', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL,
+                                          related_name='outbox_mails', to='wcore.Job')),
+            ],
+            options={
+                'ordering': ['-created'],
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='outboxmail',
+            index_together=set([('sent_at', 'next_try_at')]),
+        ),
+    ]
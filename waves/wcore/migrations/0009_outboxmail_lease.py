@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.21 on 2026-10-18 21:40
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wcore', '0008_job_api_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxmail',
+            name='lease_owner',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True,
+                                   verbose_name='Sender lease owner'),
+        ),
+    ]
@@ -10,6 +10,7 @@ from waves.wcore.models.binaries import ServiceBinaryFile
 from waves.wcore.models.services import SubmissionOutput, SubmissionExitCode
 from waves.wcore.models.inputs import AParam, TextParam, BooleanParam, IntegerParam, DecimalParam, ListParam
 from waves.wcore.models.jobs import JobOutput, JobInput, Job
+from waves.wcore.models.outbox import OutboxMail
 from waves.wcore.models.binaries import ServiceBinaryFile
 
 
@@ -11,7 +11,7 @@ from waves.wcore.compat import RichTextField
 from waves.wcore.settings import waves_settings
 
 __all__ = ['TimeStamped', 'Ordered', 'ExportAbleMixin', 'Described', 'Slugged', 'ApiModel',
-           'UrlMixin', 'WavesBaseModel', 'ExportError']
+           'UrlMixin', 'WavesBaseModel', 'ExportError', 'set_api_names']
 
 
 class WavesBaseModel(models.Model):
@@ -127,6 +127,25 @@ class ApiModel(WavesBaseModel):
             pass
 
 
+def set_api_names(instances, existing=None):
+    """ Setup unique api_name for ApiModel objects created in bulk (pre_save signal handler is not called)
+
+    :param instances: list of ApiModel objects
+    :param existing: api names already used
+    """
+    used = set(existing or [])
+    for instance in instances:
+        if not instance.api_name:
+            # noinspection PyProtectedMember
+            instance.api_name = instance._create_api_name()
+        if instance.api_name in used:
+            deb = 2
+            while '%s_%s' % (instance.api_name, deb) in used:
+                deb += 1
+            instance.api_name = '%s_%s' % (instance.api_name, deb)
+        used.add(instance.api_name)
+
+
 class UrlMixin(object):
     """ Url Mixin allow easy generation or absolute url related to any model object
 
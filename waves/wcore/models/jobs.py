@@ -1,10 +1,14 @@
 """ WAVES job related models class objects """
 from __future__ import unicode_literals
 
+import hashlib
 import json
 import logging
 import os
 import shutil
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import timedelta
 from os import path as path
 from os.path import join
 
@@ -13,22 +17,26 @@ from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.exceptions import ValidationError
 from django.core.files.base import File
-from django.db import models, transaction
-from django.db.models import Q
-from django.utils.encoding import smart_text
+from django.db import models, transaction, connections, DatabaseError, IntegrityError
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+from django.utils.encoding import force_bytes, smart_text
 from django.utils.html import format_html
 
 import waves.wcore.adaptors.exceptions
 from waves.wcore.adaptors.const import JobStatus, JobRunDetails
 from waves.wcore.exceptions import WavesException
 from waves.wcore.exceptions.jobs import JobInconsistentStateError, JobMissingMandatoryParam
-from waves.wcore.utils.logged import LoggerClass
+from waves.wcore.utils.logged import LoggerClass, log_files
 from waves.wcore.models.const import OptType, ParamType
-from waves.wcore.models.base import TimeStamped, Slugged, Ordered, UrlMixin, ApiModel
+from waves.wcore.models.base import TimeStamped, Slugged, Ordered, UrlMixin, ApiModel, set_api_names
+from waves.wcore.models.history import JobHistory
 from waves.wcore.models.inputs import FileInputSample
 from waves.wcore.models.services import SubmissionOutput
 from waves.wcore.settings import waves_settings
 from waves.wcore.utils import random_analysis_name
+from waves.wcore.utils.archive import ARCHIVE_NAME, file_exists, file_size, open_file, restore_dir
+from waves.wcore.utils.blobs import blob_store, file_digest, is_shared, link_file, unshare_file
 from waves.wcore.utils.storage import allow_display_online
 
 logger = logging.getLogger(__name__)
@@ -130,10 +138,155 @@ class JobManager(models.Manager):
         return self.filter(_status=JobStatus.JOB_CREATED,
                            **extra_filter).order_by('-created').all()
 
+    def queue_jobs(self, limit=None):
+        """
+        Return jobs to process in a queue pass: non terminated jobs due for their next status check, least recently
+        updated first (see indexes on Job model)
+
+        :param limit: max number of jobs to return
+        :return: QuerySet
+        """
+        queryset = self.filter(_status__lt=JobStatus.JOB_TERMINATED). \
+            filter(Q(next_check_at__isnull=True) | Q(next_check_at__lte=timezone.now())).order_by('updated')
+        if limit:
+            queryset = queryset[:limit]
+        return queryset
+
+    def claim_queue_jobs(self, owner, limit=None, lease_time=None):
+        """
+        Lease jobs to process for a queue worker, so that several workers (daemons or celery tasks on multiple hosts)
+        never process the same job. Leases expire after lease_time seconds, allowing to reclaim jobs from a crashed
+        worker.
+
+        Rows are locked with 'SELECT ... FOR UPDATE SKIP LOCKED' when database supports it, claim itself is a
+        conditional UPDATE on unleased rows, safe on any database.
+
+        :param owner: unique worker identifier
+        :param limit: max number of jobs to claim
+        :param lease_time: lease duration in seconds, default to QUEUE_LEASE_TIME setting
+        :return: QuerySet of claimed jobs
+        """
+        now = timezone.now()
+        lease_time = lease_time if lease_time is not None else waves_settings.QUEUE_LEASE_TIME
+        unleased = Q(lease_expires__isnull=True) | Q(lease_expires__lt=now)
+        candidates = self.queue_jobs().filter(unleased)
+        with transaction.atomic(using=self.db):
+            if connections[self.db].features.has_select_for_update_skip_locked:
+                candidates = candidates.select_for_update(skip_locked=True)
+            ids = list(candidates.values_list('id', flat=True)[:limit] if limit else
+                       candidates.values_list('id', flat=True))
+            self.filter(unleased, id__in=ids).update(lease_owner=owner,
+                                                     lease_expires=now + timedelta(seconds=lease_time))
+        return self.filter(id__in=ids, lease_owner=owner).order_by('updated')
+
+    def renew_queue_lease(self, job, owner, lease_time=None):
+        """ Extend a queue worker lease on job before a lifecycle step, so that long passes (or long steps) do not let
+        another worker reclaim the job. Lease is renewed only when less than half of lease_time remains.
+
+        :param job: leased job (as returned by :func:`claim_queue_jobs`)
+        :param owner: queue worker identifier
+        :param lease_time: lease duration in seconds, default to QUEUE_LEASE_TIME setting
+        :return: True if job is still leased by owner
+        """
+        now = timezone.now()
+        lease_time = lease_time if lease_time is not None else waves_settings.QUEUE_LEASE_TIME
+        if job.lease_owner == owner and job.lease_expires is not None \
+                and job.lease_expires - now > timedelta(seconds=lease_time / 2.0):
+            return True
+        expires = now + timedelta(seconds=lease_time)
+        if self.filter(pk=job.pk, lease_owner=owner).update(lease_expires=expires) == 0:
+            return False
+        job.lease_owner, job.lease_expires = owner, expires
+        return True
+
+    def release_queue_jobs(self, owner):
+        """ Release jobs leased by a queue worker
+
+        :param owner: worker identifier used in :func:`claim_queue_jobs`
+        :return: number of released jobs
+        """
+        return self.filter(lease_owner=owner).update(lease_owner=None, lease_expires=None)
+
+    @staticmethod
+    def submission_data(submission):
+        """ Retrieve submission related objects needed to create jobs, allowing to share them between jobs
+
+        :param submission: the submission jobs are created for
+        :return: dictionary
+        """
+        inputs = list(submission.inputs.all())
+        return dict(inputs=inputs,
+                    mandatory=[m for m in inputs if m.parent_id is None and m.required is True],
+                    outputs=list(submission.outputs.select_related('from_input')),
+                    service=submission.service,
+                    adaptor=submission.adaptor.serialize(),
+                    command=submission.run_params.get('command'))
+
+    @staticmethod
+    def fingerprint(job, data, job_inputs):
+        """ Job results fingerprint, identical for jobs with same submission, service version, runner configuration,
+        inputs values and inputs files contents
+
+        :param job: the job being created
+        :param data: submission related objects, as returned by :func:`submission_data`
+        :param job_inputs: all job inputs
+        :return: SHA-256 hex digest
+        """
+        parts = [job.submission_id, data['service'].api_name, data['service'].version, data['adaptor']]
+        for job_input in sorted(job_inputs, key=lambda i: (i.order, i.api_name or '', i.value or '')):
+            content = None
+            if job_input.param_type == ParamType.TYPE_FILE and job_input.value:
+                content = getattr(job_input, 'content_digest', None)
+                file_path = join(job.working_dir, job_input.value)
+                if content is None and os.path.isfile(file_path):
+                    content = file_digest(file_path)
+            parts.append([job_input.api_name, job_input.value, content])
+        return hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()
+
+    def cached_results_job(self, fingerprint):
+        """ Most recent terminated job with this fingerprint, not yet due for purge (see ``KEEP_ANONYMOUS_JOBS`` and
+        ``KEEP_REGISTERED_JOBS`` settings)
+
+        :return: :class:`waves.wcore.models.jobs.Job` or None
+        """
+        now = timezone.now()
+        retained = Q(client__isnull=True, updated__gte=now - timedelta(days=waves_settings.KEEP_ANONYMOUS_JOBS)) | \
+            Q(client__isnull=False, updated__gte=now - timedelta(days=waves_settings.KEEP_REGISTERED_JOBS))
+        return self.filter(retained, fingerprint=fingerprint,
+                           _status=JobStatus.JOB_TERMINATED).order_by('-updated').first()
+
+    def expired(self):
+        """ Jobs due for purge (see ``KEEP_ANONYMOUS_JOBS`` and ``KEEP_REGISTERED_JOBS`` settings)
+
+        :return: QuerySet
+        """
+        now = timezone.now()
+        return self.filter(
+            Q(client__isnull=True, updated__lt=now - timedelta(days=waves_settings.KEEP_ANONYMOUS_JOBS)) |
+            Q(client__isnull=False, updated__lt=now - timedelta(days=waves_settings.KEEP_REGISTERED_JOBS)))
+
+    def archivable(self, age):
+        """ Finished jobs not updated for age days, their working dirs may be archived
+
+        :return: QuerySet
+        """
+        return self.filter(_status__in=(JobStatus.JOB_TERMINATED, JobStatus.JOB_WARNING, JobStatus.JOB_ERROR,
+                                        JobStatus.JOB_CANCELLED),
+                           updated__lt=timezone.now() - timedelta(days=age))
+
+    def results_cache_stats(self):
+        """ Results cache hits and misses among jobs created for cached services
+
+        :return: dictionary
+        """
+        total = self.filter(fingerprint__isnull=False).count()
+        hits = self.filter(fingerprint__isnull=False, cached_from__isnull=False).count()
+        return dict(hits=hits, misses=total - hits, ratio=float(hits) / total if total else 0.0)
+
     @transaction.atomic
     def create_from_submission(self, submission, submitted_inputs,
                                email_to=None, user=None,
-                               force_status=None, update=None):
+                               force_status=None, update=None, submission_data=None):
         """ Create a new job from service submission data and submitted inputs values
         :type update: Existing Job to extend
         :param force_status: Force initial job status
@@ -141,13 +294,15 @@ class JobManager(models.Manager):
         :param submitted_inputs: received input from client submission
         :param email_to: if given, email address to notify job process to
         :param user: associated user (may be anonymous)
+        :param submission_data: submission related objects, as returned by :func:`submission_data`
         :return: a newly create Job instance
         :rtype: :class:`waves.wcore.models.jobs.Job`
         """
+        data = submission_data or self.submission_data(submission)
         default_email = user.email if user and not user.is_anonymous() else None
         follow_email = email_to or default_email
         client = user if user and not user.is_anonymous() else None
-        mandatory_params = submission.expected_inputs.filter(required=True)
+        mandatory_params = data['mandatory']
         missing = {m.name: '%s (:%s:) is required field' % (m.label, m.api_name) for m in mandatory_params if
                    m.api_name not in submitted_inputs.keys()}
         if len(missing) > 0:
@@ -155,58 +310,210 @@ class JobManager(models.Manager):
             logger.warning("Expected mandatory %s", [(m.label, m.api_name) for m in mandatory_params])
             logger.warning("Missing %s", [m for m in missing])
             raise ValidationError(missing)
+        submission_inputs = [service_input for service_input in data['inputs'] if
+                             service_input.api_name in submitted_inputs and service_input.required is not None]
         if update is None:
-            job = Job.objects.create(email_to=follow_email,
-                                     client=client,
-                                     title=submitted_inputs.get('title', None),
-                                     submission=submission,
-                                     service=submission.service.name,
-                                     _adaptor=submission.adaptor.serialize(),
-                                     notify=submission.service.email_on)
+            job = Job(email_to=follow_email,
+                      client=client,
+                      title=submitted_inputs.get('title', None),
+                      submission=submission,
+                      service=data['service'].name,
+                      _adaptor=data['adaptor'],
+                      notify=data['service'].email_on)
+            # defaults inputs, outputs and history are created below, not in post_save signal
+            job.bulk_created = True
+            existing_inputs, existing_outputs = [], []
         else:
             job = update
             job.submission = submission
             job.adaptor = submission.adaptor
             job.notify = submission.service.email_on
             job.service = submission.service.name
-
-        # First create inputs
-        submission_inputs = submission.inputs.filter(api_name__in=submitted_inputs.keys()).exclude(required=None)
+            existing_inputs = list(job.job_inputs.values_list('api_name', flat=True))
+            existing_outputs = list(job.outputs.values_list('api_name', flat=True))
+        # Validate all inputs before any creation
         for service_input in submission_inputs:
             incoming_input = submitted_inputs.get(service_input.api_name, None)
             # test service input mandatory, without default and no value
             if service_input.required and not service_input.default and incoming_input is None:
                 raise JobMissingMandatoryParam(service_input.label, job)
-            logger.debug("Current Service Input: %s, %s", service_input, service_input.required)
-            job.logger.debug('Param %s', service_input.api_name)
-            logger.debug('Param %s', service_input.api_name)
+        # input files are written in job working dir before job is saved, it is removed if creation fails
+        job.make_job_dirs()
+        try:
+            job_inputs, job_outputs, history = [], [], []
+            if update is None:
+                job_inputs.extend(job.build_non_editable_inputs(
+                    [service_input for service_input in data['inputs'] if service_input.required is None]))
+                job_outputs.extend(job.build_default_outputs())
+                history.append(JobHistory(job=job, message="Job defaults created", status=job.status))
+            # First create inputs
+            for service_input in submission_inputs:
+                incoming_input = submitted_inputs.get(service_input.api_name, None)
+                logger.debug("Current Service Input: %s, %s", service_input, service_input.required)
+                job.logger.debug('Param %s', service_input.api_name)
+                if incoming_input:
+                    # transform single incoming into list to keep process iso
+                    incoming_input = [incoming_input] if type(incoming_input) != list else incoming_input
+                    for in_input in incoming_input:
+                        job_inputs.append(
+                            JobInput.objects.build_from_submission(job, service_input, service_input.order, in_input))
+            # create expected outputs
+            for service_output in data['outputs']:
+                job_outputs.append(JobOutput.objects.build_from_submission(job, service_output, submitted_inputs))
+            set_api_names(job_inputs, existing_inputs)
+            set_api_names(job_outputs, existing_outputs)
+            cached = False
+            if update is None and data['service'].cache_results:
+                job.fingerprint = self.fingerprint(job, data, job_inputs)
+                source = self.cached_results_job(job.fingerprint)
+                logger.info('Results cache %s for job %s [%s]', 'hit' if source else 'miss', job.slug, job.fingerprint)
+                if source is not None:
+                    job.link_results(source)
+                    job.cached_from = str(source.slug)
+                    job.exit_code = source.exit_code
+                    job.results_available = True
+                    history.append(JobHistory(job=job, message="Results retrieved from job {}".format(source.slug),
+                                              status=JobStatus.JOB_TERMINATED))
+                    job._status = JobStatus.JOB_TERMINATED
+                    cached = True
+            if update is None:
+                command_inputs = sorted(job_inputs, key=lambda job_input: job_input.order)
+            else:
+                command_inputs = sorted(list(job.job_inputs.all()) + job_inputs, key=lambda job_input: job_input.order)
+            job._command_line = "{} {}".format(data['command'],
+                                               job.command_parser.create_command_line(inputs=command_inputs))
+            if not cached and force_status is not None and force_status in JobStatus.STATUS_MAP.keys() and \
+                    force_status != job.status:
+                history.append(JobHistory(job=job, message="New job status {}".format(force_status),
+                                          status=force_status))
+                job._status = force_status
             job.save()
-            if incoming_input:
-                # transform single incoming into list to keep process iso
-                incoming_input = [incoming_input] if type(incoming_input) != list else incoming_input
-                for in_input in incoming_input:
-                    job.job_inputs.add(
-                        JobInput.objects.create_from_submission(job, service_input, service_input.order, in_input))
-
-        # create expected outputs
-        for service_output in submission.outputs.all():
-            job.outputs.add(
-                JobOutput.objects.create_from_submission(job, service_output, submitted_inputs))
-        job.logger.debug('Job %s created with %i inputs', job.slug, job.job_inputs.count())
-        if job.logger.isEnabledFor(logging.DEBUG):
-            # LOG full command line
-            logger.debug('Job %s command will be :', job.title)
-            logger.debug('Job %s command will be :', job.title)
-            logger.debug('%s %s', job.command, job.command_line_arguments)
-            logger.debug('Expected outputs will be:')
-            for j_output in job.outputs.all():
-                logger.debug('Output %s: %s', j_output.name, j_output.value)
-                logger.debug('Output %s: %s', j_output.name, j_output.value)
-        job._command_line = "{} {}".format(job.command, job.command_line_arguments)
-        if force_status is not None and force_status in JobStatus.STATUS_MAP.keys():
-            job.status = force_status
-        job.save()
-        return job
+            for related in job_inputs + job_outputs + history:
+                # related objects were attached to job before it got a primary key
+                related.job = job
+            JobInput.objects.bulk_create(job_inputs)
+            JobOutput.objects.bulk_create(job_outputs)
+            JobHistory.objects.bulk_create(history)
+            if cached:
+                transaction.on_commit(job.check_send_mail)
+            job.logger.debug('Job %s created with %i inputs', job.slug, len(job_inputs))
+            if job.logger.isEnabledFor(logging.DEBUG):
+                # LOG full command line
+                logger.debug('Job %s command will be : %s', job.title, job._command_line)
+                logger.debug('Expected outputs will be:')
+                for j_output in job_outputs:
+                    logger.debug('Output %s: %s', j_output.name, j_output.value)
+            return job
+        except Exception:
+            if update is None:
+                job.delete_job_dirs()
+            raise
+
+    def create_batch_from_submission(self, submission, submitted_inputs_list, email_to=None, user=None):
+        """ Create a batch of jobs for a submission, submission data is retrieved once for all jobs. Batch is created
+        in one transaction, each job in its own savepoint: a failing job does not prevent others from being created,
+        its working dir is removed (see :func:`create_from_submission`).
+
+        :param submission: the submission
+        :param submitted_inputs_list: list of submitted inputs values (one dictionary per job)
+        :param email_to: default email address to notify jobs process to (may be overridden with 'email' key)
+        :param user: associated user (may be anonymous)
+        :return: tuple (list of (index, created job), list of (index, errors))
+        """
+        data = self.submission_data(submission)
+        created, errors = [], []
+        try:
+            with transaction.atomic():
+                for index, submitted_inputs in enumerate(submitted_inputs_list):
+                    try:
+                        with transaction.atomic():
+                            job = self.create_from_submission(submission, submitted_inputs,
+                                                              email_to=submitted_inputs.get('email', email_to),
+                                                              user=user, submission_data=data)
+                        created.append((index, job))
+                    except ValidationError as e:
+                        errors.append((index, e.message_dict if hasattr(e, 'error_dict') else e.messages))
+                    except WavesException as e:
+                        errors.append((index, [e.message]))
+                    except ObjectDoesNotExist as e:
+                        # i.e unknown sample file
+                        errors.append((index, ['%s' % e]))
+                    except (IOError, OSError) as e:
+                        logger.error('Batch job %i files error: %s', index, e)
+                        errors.append((index, ['Unable to write job files']))
+                    except DatabaseError as e:
+                        logger.error('Batch job %i database error: %s', index, e)
+                        errors.append((index, ['Unable to save job']))
+        except Exception:
+            # whole batch is rolled back
+            for _, job in created:
+                job.delete_job_dirs()
+            raise
+        return created, errors
+
+
+class JobStep(object):
+    """
+    Unit of work for a job lifecycle step (see :func:`Job.lifecycle_step`): history events, new related objects and
+    job changes are buffered during step, then written at step end in one transaction, one bulk insert per model
+    and one job update.
+    When step runs on behalf of a queue worker (lease_owner), changes are written only if job is still leased by
+    this worker, they are discarded otherwise.
+    """
+
+    def __init__(self, job, lease_owner=None):
+        self.job = job
+        self.lease_owner = lease_owner
+        self.history = []
+        self.objects = []
+        self.save_job = False
+
+    def add_history(self, message, status, is_admin=False):
+        """ Buffer a history event
+
+        :return: the buffered JobHistory
+        """
+        event = JobHistory(job=self.job, message=message, status=status, is_admin=is_admin)
+        self.history.append(event)
+        return event
+
+    def flush(self):
+        """ Write buffered changes, buffers are emptied """
+        models_objects = OrderedDict()
+        if self.history:
+            models_objects[JobHistory] = self.history
+        for obj in self.objects:
+            models_objects.setdefault(obj.__class__, []).append(obj)
+        save_job = self.save_job
+        self.history, self.objects, self.save_job = [], [], False
+        if not models_objects and not save_job:
+            return
+        with transaction.atomic():
+            if self.lease_owner is not None:
+                if not self.job.save_leased(self.lease_owner):
+                    logger.warning('Job %s lease lost by %s, step changes discarded', self.job.slug, self.lease_owner)
+                    return
+            elif save_job:
+                self.job.save()
+            for model, objs in models_objects.items():
+                if model is JobHistory:
+                    self.write_history(objs)
+                else:
+                    model.objects.bulk_create(objs)
+
+    @staticmethod
+    def write_history(events):
+        """ Insert history events at once. History unicity relies on timestamp, which is not granted for bulk
+        inserted events sharing a status: events are then saved one by one (duplicates are ignored as for any
+        history save)
+        """
+        try:
+            with transaction.atomic():
+                JobHistory.objects.bulk_create(events)
+        except IntegrityError:
+            for event in events:
+                with transaction.atomic():
+                    event.save()
 
 
 class Job(TimeStamped, Slugged, UrlMixin, LoggerClass):
@@ -219,11 +526,23 @@ class Job(TimeStamped, Slugged, UrlMixin, LoggerClass):
     message = None
     #: Job run details retrieved or not
     _run_details = None
+    #: Current lifecycle step unit of work, if any (see :func:`lifecycle_step`)
+    _step = None
+    #: Queue lease fields, only written by :class:`JobManager` queue methods, never by job saves
+    LEASE_FIELDS = ('lease_owner', 'lease_expires')
 
     class Meta(TimeStamped.Meta):
         verbose_name = 'Job'
         verbose_name_plural = "Jobs"
         ordering = ['-updated', '-created']
+        indexes = [
+            models.Index(fields=['_status', 'updated'], name='wcore_job_status_updated_idx'),
+            models.Index(fields=['_status', 'next_check_at'], name='wcore_job_status_check_idx'),
+            # API jobs lists (see :class:`waves.wcore.api.share.JobsCursorPagination`)
+            models.Index(fields=['client', 'updated'], name='wcore_job_client_updated_idx'),
+            models.Index(fields=['email_to', 'updated'], name='wcore_job_email_updated_idx'),
+            models.Index(fields=['submission', 'updated'], name='wcore_job_submission_upd_idx'),
+        ]
 
     objects = JobManager()
     #: Job Title, automatic or set by user upon submission
@@ -255,10 +574,25 @@ class Job(TimeStamped, Slugged, UrlMixin, LoggerClass):
     _command_line = models.CharField('Final generated command line', max_length=255, editable=False, null=True)
     #: adaptor serialized values
     _adaptor = models.TextField('Adapter classed used for this Job', editable=False, null=True)
+    #: adaptor instance loaded from serialized values (serialized, instance)
+    _loaded_adaptor = None
+    #: job created along with its default inputs, outputs and history (post_save signal skip their creation)
+    bulk_created = False
     #: remind th Service Name
     service = models.CharField('Service name', max_length=255, editable=False, null=True, default="")
     #: Should Waves Notify client about Job Status
     notify = models.BooleanField("Notify this result", default=False, editable=False)
+    #: Next remote status check date (null when job is due for next queue pass)
+    next_check_at = models.DateTimeField('Next status check', null=True, blank=True, editable=False)
+    #: Queue worker currently processing job
+    lease_owner = models.CharField('Queue lease owner', max_length=255, null=True, blank=True, editable=False)
+    #: Queue worker lease expiration date
+    lease_expires = models.DateTimeField('Queue lease expiration', null=True, blank=True, editable=False)
+    #: Job results fingerprint (submission, service version, inputs values and contents), for cached services
+    fingerprint = models.CharField('Results fingerprint', max_length=64, null=True, blank=True, editable=False,
+                                   db_index=True)
+    #: Job results have been copied from this job (slug)
+    cached_from = models.CharField('Results cached from job', max_length=255, null=True, blank=True, editable=False)
 
     LOG_LEVEL = waves_settings.JOB_LOG_LEVEL
 
@@ -302,7 +636,11 @@ class Job(TimeStamped, Slugged, UrlMixin, LoggerClass):
             message = "[{}] {}".format(value, smart_text(self.message)) if self.message else "New job status {}".format(
                 value)
             logger.debug('JobHistory saved [%s][%s] status: %s', self.slug, self.get_status_display(), message)
-            self.job_history.create(message=message, status=value)
+            self.add_history(message, status=value)
+            self.next_check_at = None
+            if self._step is not None:
+                # status change is written at step end, even if not explicitly saved
+                self._step.save_job = True
         self._status = value
 
     def colored_status(self):
@@ -326,9 +664,47 @@ class Job(TimeStamped, Slugged, UrlMixin, LoggerClass):
             os.makedirs(self.working_dir, mode=0o775)
             os.chmod(self.working_dir, 0o775)
 
+    def unshare_results(self):
+        """ Replace results files linked from another job (see :func:`link_results`) with own copies, before they
+        are written again (i.e on re-run), which would otherwise truncate both jobs results
+        """
+        for dir_path, _, file_names in os.walk(self.working_dir):
+            for file_name in file_names:
+                file_path = join(dir_path, file_name)
+                if is_shared(file_path):
+                    unshare_file(file_path)
+
     def delete_job_dirs(self):
-        """ Upon job deletion in database, cleanup associated working dirs """
+        """ Upon job deletion in database, cleanup associated working dirs, release stored inputs files """
+        log_files.close(self.log_file)
+        digests = blob_store.manifest(self.working_dir)
         shutil.rmtree(self.working_dir, ignore_errors=True)
+        blob_store.release(digests)
+
+    def link_results(self, source):
+        """ Link another job results files into job working dir (inputs already written are kept), standard output
+        and error files are copied
+
+        :param source: the job results are retrieved from
+        """
+        excluded = (self.logger_file_name, 'job_run_details.json')
+        if os.path.isfile(join(source.working_dir, ARCHIVE_NAME)):
+            # archived results are read from linked archive
+            link_file(join(source.working_dir, ARCHIVE_NAME), join(self.working_dir, ARCHIVE_NAME))
+        for dir_path, dir_names, file_names in os.walk(source.working_dir):
+            relative = os.path.relpath(dir_path, source.working_dir)
+            target_dir = self.working_dir if relative == '.' else join(self.working_dir, relative)
+            if not os.path.isdir(target_dir):
+                os.makedirs(target_dir)
+            for file_name in file_names:
+                if file_name.startswith('.') or file_name in excluded:
+                    continue
+                if os.path.exists(join(target_dir, file_name)):
+                    continue
+                if relative == '.' and file_name in (self.stdout, self.stderr):
+                    shutil.copyfile(join(dir_path, file_name), join(target_dir, file_name))
+                else:
+                    link_file(join(dir_path, file_name), join(target_dir, file_name))
 
     @classmethod
     def from_db(cls, db, field_names, values):
@@ -371,7 +747,7 @@ class Job(TimeStamped, Slugged, UrlMixin, LoggerClass):
                      api_name=the_output.get_api_name(),
                      label=the_output.name,
                      slug=the_output.slug,
-                     available=os.path.isfile(the_output.file_path) and os.path.getsize(the_output.file_path) > 0))
+                     available=(file_size(the_output.file_path) or 0) > 0))
         return existing
 
     @property
@@ -399,13 +775,13 @@ class Job(TimeStamped, Slugged, UrlMixin, LoggerClass):
 
     @property
     def working_dir(self):
-        """Base job working dir
+        """Base job working dir, see ``JOB_DIR_LAYOUT`` setting
 
         :return: working dir
         :rtype: unicode
         """
-        from waves.wcore.settings import waves_settings
-        return os.path.join(waves_settings.JOB_BASE_DIR, str(self.slug))
+        from waves.wcore.utils.layout import job_dir_layout
+        return job_dir_layout().path(self.slug)
 
     @property
     def adaptor(self):
@@ -416,8 +792,11 @@ class Job(TimeStamped, Slugged, UrlMixin, LoggerClass):
         """
         if self._adaptor:
             from waves.wcore.adaptors.loader import AdaptorLoader
+            if self._loaded_adaptor is not None and self._loaded_adaptor[0] == self._adaptor:
+                return self._loaded_adaptor[1]
             try:
                 adaptor = AdaptorLoader.unserialize(self._adaptor)
+                self._loaded_adaptor = (self._adaptor, adaptor)
                 return adaptor
             except Exception as e:
                 self.logger.exception("Unable to load %s adapter %s", self._adaptor, e.message)
@@ -430,6 +809,7 @@ class Job(TimeStamped, Slugged, UrlMixin, LoggerClass):
     @adaptor.setter
     def adaptor(self, value):
         self._adaptor = value.serialize()
+        self._loaded_adaptor = None
         self.save(update_fields=["_adaptor"])
 
     def __str__(self):
@@ -487,8 +867,11 @@ class Job(TimeStamped, Slugged, UrlMixin, LoggerClass):
         :return: the nmmber of mail sent (should be one)
         :rtype: int
         """
-        mailer = waves_settings.MAILER_CLASS()
-        mailer.check_send_mail(self)
+        if self.status == self.status_mail:
+            # nothing to notify, avoid mailer set up
+            return 0
+        from waves.wcore.mails import job_mailer
+        return job_mailer().check_send_mail(self)
 
     def get_absolute_url(self):
         """Reverse url for this Job according to Django urls configuration
@@ -514,64 +897,162 @@ class Job(TimeStamped, Slugged, UrlMixin, LoggerClass):
         """
         return 'job.stderr'
 
-    def create_non_editable_inputs(self):
+    def build_non_editable_inputs(self, service_inputs=None):
         """
-        Create non editable (i.e not submitted anywhere and used for run)
+        Build (not saved) non editable job inputs (i.e not submitted anywhere and used for run)
 
-        :return: None
+        :param service_inputs: submission non editable inputs, retrieved from job submission if not set
+        :return: list of JobInput
         """
+        job_inputs = []
         if self.submission:
-            for service_input in self.submission.inputs.filter(required=None):
+            if service_inputs is None:
+                service_inputs = self.submission.inputs.filter(required=None)
+            for service_input in service_inputs:
                 # Create fake "submitted_inputs" with non editable ones with default value if not already set
                 self.logger.debug('Created non editable job input: %s (%s, %s)', service_input.label,
                                   service_input.name, service_input.default)
-                self.job_inputs.add(JobInput.objects.create(job=self, name=service_input.name,
-                                                            param_type=service_input.type,
-                                                            cmd_format=service_input.cmd_format,
-                                                            label=service_input.label,
-                                                            order=service_input.order,
-                                                            value=service_input.default))
+                job_inputs.append(JobInput(job=self, name=service_input.name,
+                                           param_type=service_input.type,
+                                           cmd_format=service_input.cmd_format,
+                                           label=service_input.label,
+                                           order=service_input.order,
+                                           value=service_input.default))
+        return job_inputs
+
+    def create_non_editable_inputs(self):
+        """
+        Create non editable (i.e not submitted anywhere and used for run)
+
+        :return: None
+        """
+        for job_input in self.build_non_editable_inputs():
+            job_input.save()
+
+    def build_default_outputs(self):
+        """ Build (not saved) standard outputs for job (stdout and stderr), create empty files
+
+        :return: list of JobOutput
+        """
+        outputs = []
+        for value, name in ((self.stdout, 'Standard output'), (self.stderr, 'Standard error')):
+            outputs.append(JobOutput(job=self, value=value, _name=name))
+            std_file = join(self.working_dir, value)
+            open(std_file, 'w').close()
+            os.chmod(std_file, 0o664)
+        return outputs
 
     def create_default_outputs(self):
         """ Create standard outputs for job (stdout and stderr) files
 
         :return: None
         """
-        output_dict = dict(job=self, value=self.stdout, _name='Standard output')
-        out = JobOutput.objects.create(**output_dict)
-        self.outputs.add(out)
-        std_file = join(self.working_dir, self.stdout)
-        open(std_file, 'w').close()
-        os.chmod(std_file, 0o664)
-        output_dict['value'] = self.stderr
-        output_dict['_name'] = "Standard error"
-        out1 = JobOutput.objects.create(**output_dict)
-        self.outputs.add(out1)
-        std_file = join(self.working_dir, self.stderr)
-        open(std_file, 'w').close()
-        os.chmod(std_file, 0o664)
+        for output in self.build_default_outputs():
+            output.save()
+
+    @staticmethod
+    def public_history_prefetch():
+        """ Prefetch lookup for jobs public history, then read from :func:`public_history` without further query
+
+        :rtype: Prefetch
+        """
+        return Prefetch('job_history', queryset=JobHistory.objects.filter(is_admin=False),
+                        to_attr='_prefetched_public_history')
 
     @property
     def public_history(self):
         """ Filter Job history elements for public (non `JobAdminHistory` elements)
 
-        :rtype: QuerySet
+        :rtype: QuerySet, or list when prefetched (see :func:`public_history_prefetch`)
         """
+        if hasattr(self, '_prefetched_public_history'):
+            return self._prefetched_public_history
         return self.job_history.filter(is_admin=False)
 
     @property
     def last_history(self):
         """ Retrieve last public history message """
-        return self.public_history.first()
+        history = self.public_history
+        if isinstance(history, list):
+            return history[0] if history else None
+        return history.first()
+
+    def add_history(self, message=None, status=None, is_admin=False):
+        """ Add a job history event, buffered until step end during a lifecycle step
+
+        :param message: event message, default to current job message
+        :param status: event status, default to current job status
+        :param is_admin: event is only intended for admin
+        :return: JobHistory
+        """
+        message = self.message if message is None else message
+        status = self.status if status is None else status
+        if self._step is not None:
+            return self._step.add_history(message, status, is_admin)
+        return self.job_history.create(message=message, status=status, is_admin=is_admin)
+
+    def add_related(self, obj):
+        """ Save a new job related object (i.e queued email), buffered until step end during a lifecycle step
+
+        :return: obj
+        """
+        if self._step is not None:
+            self._step.objects.append(obj)
+        else:
+            obj.save()
+        return obj
+
+    @contextmanager
+    def lifecycle_step(self, lease_owner=None):
+        """ Context manager buffering job history events and saves during a lifecycle step, written all at once on
+        exit (see :class:`JobStep`). Nested steps are merged into outermost one.
+
+        :param lease_owner: queue worker processing the step, changes are discarded if job lease has been lost
+        :return: JobStep
+        """
+        if self._step is not None:
+            yield self._step
+            return
+        self._step = JobStep(self, lease_owner)
+        try:
+            yield self._step
+        finally:
+            step, self._step = self._step, None
+            step.flush()
+
+    def save(self, *args, **kwargs):
+        """ Save job, deferred until step end during a lifecycle step (see :func:`lifecycle_step`). Queue lease
+        fields are not written when updating an existing job (see :attr:`LEASE_FIELDS`)
+        """
+        if self._step is not None and self.pk is not None:
+            self._step.save_job = True
+            return
+        if self.pk is not None and not self._state.adding and not kwargs.get('force_insert') \
+                and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in self.LEASE_FIELDS]
+        super(Job, self).save(*args, **kwargs)
+
+    def save_leased(self, owner):
+        """ Update job only if it is still leased by queue worker owner (see :func:`JobManager.claim_queue_jobs`),
+        save signals are not sent.
+
+        :param owner: queue worker identifier
+        :return: True if job has been updated
+        """
+        self.updated = timezone.now()
+        values = dict((field.attname, getattr(self, field.attname)) for field in self._meta.concrete_fields
+                      if not field.primary_key and field.name not in self.LEASE_FIELDS)
+        return Job.objects.filter(pk=self.pk, lease_owner=owner).update(**values) > 0
 
     def retry(self, message):
         """ Add a new try for job execution, save retry reason in JobAdminHistory, save job """
         if self.nb_retry <= waves_settings.JOBS_MAX_RETRY:
             self.nb_retry += 1
             if message is not None:
-                self.job_history.create(message='[Retry] {}'.format(smart_text(message)), status=self.status)
+                self.add_history('[Retry] {}'.format(smart_text(message)))
             else:
-                self.job_history.create(message='[Retry] {}'.format(self.get_status_display()), status=self.status)
+                self.add_history('[Retry] {}'.format(self.get_status_display()))
         else:
             self.error(message)
 
@@ -636,17 +1117,45 @@ class Job(TimeStamped, Slugged, UrlMixin, LoggerClass):
         self._run_action('run_job')
         self.status = JobStatus.JOB_QUEUED
 
-    def run_status(self):
-        """ Ask job adapter current job status """
-        self._run_action('job_status')
+    def run_status(self, status_checked=False):
+        """ Ask job adapter current job status
+
+        :param status_checked: job status has already been retrieved along with other jobs (see
+            :func:`waves.wcore.adaptors.JobAdaptor.jobs_status`)
+        """
+        last_check = self.updated
+        if status_checked:
+            self.nb_retry = 0
+        else:
+            self._run_action('job_status')
         self.logger.debug('job current state :%s', self.status)
         if self.status == JobStatus.JOB_COMPLETED:
             self.run_results()
         if self.status == JobStatus.JOB_UNDEFINED and self.nb_retry > waves_settings.JOBS_MAX_RETRY:
             self.run_cancel()
+        self.schedule_status_check(last_check)
         self.save()
         return self.status
 
+    def schedule_status_check(self, last_check=None):
+        """ Set next remote status check date: while job status does not change, delay since last check is doubled,
+        starting from QUEUE_CHECK_MIN seconds, up to QUEUE_CHECK_MAX (or per runner QUEUE_RUNNER_CHECK_MAX).
+        Any status change resets schedule (see :func:`status` setter).
+
+        :param last_check: previous check date
+        """
+        if self.status not in (JobStatus.JOB_QUEUED, JobStatus.JOB_RUNNING, JobStatus.JOB_SUSPENDED,
+                               JobStatus.JOB_UNDEFINED):
+            self.next_check_at = None
+            return
+        from waves.wcore.job_queue import runner_setting
+        now = timezone.now()
+        delay = waves_settings.QUEUE_CHECK_MIN
+        if last_check is not None and self.next_check_at is not None:
+            delay = max(delay, 2 * (now - last_check).total_seconds())
+        max_delay = runner_setting(self.adaptor, waves_settings.QUEUE_RUNNER_CHECK_MAX, waves_settings.QUEUE_CHECK_MAX)
+        self.next_check_at = now + timedelta(seconds=min(delay, max_delay))
+
     def run_cancel(self):
         """ Ask job adapter to cancel job if possible """
         self.message = 'Job cancelled'
@@ -660,7 +1169,7 @@ class Job(TimeStamped, Slugged, UrlMixin, LoggerClass):
                           os.stat(join(self.working_dir, self.stderr)).st_size)
         if os.stat(join(self.working_dir, self.stderr)).st_size > 0:
             logger.error('Error found %s %s ', self.exit_code, smart_text(self.stderr_txt))
-            self.job_history.create(message='job.stderr is not empty', status=JobStatus.JOB_WARNING)
+            self.add_history('job.stderr is not empty', status=JobStatus.JOB_WARNING)
             self.status = JobStatus.JOB_WARNING
         else:
             self.message = "Data retrieved"
@@ -696,12 +1205,12 @@ class Job(TimeStamped, Slugged, UrlMixin, LoggerClass):
     @property
     def stdout_txt(self):
         """Retrieve stdout content for this job"""
-        with open(join(self.working_dir, self.stdout), 'r') as fp:
+        with open_file(join(self.working_dir, self.stdout), 'r') as fp:
             return fp.read()
 
     @property
     def stderr_txt(self):
-        with open(join(self.working_dir, self.stderr), 'r') as fp:
+        with open_file(join(self.working_dir, self.stderr), 'r') as fp:
             return fp.read()
 
     @property
@@ -714,15 +1223,22 @@ class Job(TimeStamped, Slugged, UrlMixin, LoggerClass):
         # self.job_history.all().delete()
         self.nb_retry = 0
         self.job_history.all().update(is_admin=True)
-        self.job_history.create(message='Marked for re-run', status=self.status)
+        self.add_history('Marked for re-run')
         self.status = JobStatus.JOB_CREATED
         self._command_line = None
+        restore_dir(self.working_dir)
 
         for job_out in self.outputs.all():
+            # unlink first, file may be shared with another job (see :func:`link_results`)
+            if os.path.lexists(job_out.file_path):
+                os.remove(job_out.file_path)
             open(job_out.file_path, 'w').close()
+        self.unshare_results()
         # Reset logs
         open(self.log_file, 'w').close()
         self.save()
+        from waves.wcore.job_queue import notify_queue
+        transaction.on_commit(notify_queue)
 
     def default_run_details(self):
         """ Get and retriver a JobStatus.JobRunDetails namedtuple with defaults values"""
@@ -757,13 +1273,22 @@ class JobInputManager(models.Manager):
 
     @transaction.atomic
     def create_from_submission(self, job, service_input, order, submitted_input):
-        """ Create Job Input from submitted data
+        """ Create Job Input from submitted data, see :func:`build_from_submission`
+
+        :rtype: :class:`waves.wcore.models.jobs.JobInput`
+        """
+        new_input = self.build_from_submission(job, service_input, order, submitted_input)
+        new_input.save()
+        return new_input
+
+    def build_from_submission(self, job, service_input, order, submitted_input):
+        """ Build (not saved) Job Input from submitted data, uploaded files are written in job working dir
 
         :param job: The current job being created,
         :param service_input: current service submission input
         :param order: given order in future command line creation (if needed)
         :param submitted_input: received value for this service submission input
-        :return: return the newly created JobInput
+        :return: return the new JobInput
         :rtype: :class:`waves.wcore.models.jobs.JobInput`
         """
         input_dict = dict(job=job,
@@ -774,23 +1299,20 @@ class JobInputManager(models.Manager):
                           cmd_format=service_input.cmd_format,
                           label=service_input.label,
                           value=str(submitted_input))
+        content_digest = None
         if service_input.param_type == ParamType.TYPE_FILE:
             if isinstance(submitted_input, File):
                 # classic uploaded file
                 filename = path.join(job.working_dir, submitted_input.name)
-                with open(filename, 'wb+') as uploaded_file:
-                    for chunk in submitted_input.chunks():
-                        uploaded_file.write(chunk)
-                        # input_dict.update(dict(value='inputs/' + submitted_input.name))
+                content_digest = blob_store.write(filename, submitted_input.chunks)
+                # input_dict.update(dict(value='inputs/' + submitted_input.name))
             elif isinstance(submitted_input, (int, long)):
                 # Manage sample data
                 input_sample = FileInputSample.objects.get(pk=submitted_input)
                 filename = path.join(job.working_dir, path.basename(input_sample.file.name))
                 # input_dict['command_type'] = input_sample.file_input.cmd_format
                 input_dict['value'] = path.basename(input_sample.file.name)
-                with open(filename, 'wb+') as uploaded_file:
-                    for chunk in input_sample.file.chunks():
-                        uploaded_file.write(chunk)
+                content_digest = blob_store.write(filename, input_sample.file.chunks, source=input_sample.file.path)
             elif isinstance(submitted_input, (str, unicode)):
                 # copy / paste content
                 if service_input.default:
@@ -799,11 +1321,12 @@ class JobInputManager(models.Manager):
                 else:
                     filename = path.join(job.working_dir, service_input.name + '.txt')
                     input_dict.update(dict(value=service_input.name + '.txt'))
-                with open(filename, 'wb+') as uploaded_file:
-                    uploaded_file.write(submitted_input)
+                content_digest = blob_store.write(filename, [force_bytes(submitted_input)])
             else:
                 logger.warn("Unable to determine usable type for input %s:%s " % (service_input.name, submitted_input))
-        new_input = self.create(**input_dict)
+        new_input = self.model(**input_dict)
+        # stored file content digest (see :mod:`waves.wcore.utils.blobs`), used for job results fingerprint
+        new_input.content_digest = content_digest
         return new_input
 
 
@@ -964,6 +1487,12 @@ class JobOutputManager(models.Manager):
     @transaction.atomic
     def create_from_submission(self, job, submission_output, submitted_inputs):
         """ Create job expected output from submission data """
+        new_output = self.build_from_submission(job, submission_output, submitted_inputs)
+        new_output.save()
+        return new_output
+
+    def build_from_submission(self, job, submission_output, submitted_inputs):
+        """ Build (not saved) job expected output from submission data """
         assert (isinstance(submission_output, SubmissionOutput))
         output_dict = dict(job=job, _name=submission_output.label, extension=submission_output.extension,
                            api_name=submission_output.api_name)
@@ -988,7 +1517,7 @@ class JobOutputManager(models.Manager):
             output_dict.update(dict(value=formatted_value))
         else:
             output_dict.update(dict(value=submission_output.file_pattern))
-        return self.create(**output_dict)
+        return self.model(**output_dict)
 
 
 class JobOutput(Ordered, Slugged, UrlMixin, ApiModel):
@@ -1065,8 +1594,8 @@ class JobOutput(Ordered, Slugged, UrlMixin, ApiModel):
 
     @property
     def file_content(self):
-        if os.path.isfile(self.file_path):
-            with open(self.file_path, 'r') as f:
+        if file_exists(self.file_path):
+            with open_file(self.file_path, 'r') as f:
                 return f.read()
         return None
 
@@ -1087,7 +1616,7 @@ class JobOutput(Ordered, Slugged, UrlMixin, ApiModel):
 
     @property
     def available(self):
-        return os.path.isfile(self.file_path) and os.path.getsize(self.file_path) > 0
+        return (file_size(self.file_path) or 0) > 0
 
     def duplicate_api_name(self, api_name):
         """ Check is another entity is set with same api_name
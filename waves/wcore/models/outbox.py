@@ -0,0 +1,82 @@
+""" WAVES notification emails outbox """
+from __future__ import unicode_literals
+
+from datetime import timedelta
+
+from django.db import models, transaction, connections
+from django.db.models import Q
+from django.utils import timezone
+
+from waves.wcore.models.base import WavesBaseModel
+
+__all__ = ['OutboxMail']
+
+
+class OutboxMailManager(models.Manager):
+
+    def pending(self, max_retry, limit=None):
+        """ Unsent emails due for a send attempt, oldest first
+
+        :param max_retry: max send attempts for an email
+        :param limit: max emails retrieved
+        :return: QuerySet
+        """
+        queryset = self.filter(Q(next_try_at__isnull=True) | Q(next_try_at__lte=timezone.now()),
+                               sent_at__isnull=True, attempts__lt=max_retry).order_by('pk')
+        return queryset[:limit] if limit else queryset
+
+    def claim(self, owner, max_retry, limit=None, lease_time=600):
+        """ Lease pending emails to a sender, so that concurrent senders (i.e several queue daemons, cron command)
+        never send the same email. Claimed emails are not pending until lease expires (next_try_at), allowing to
+        retry emails from a crashed sender.
+
+        :param owner: sender unique identifier
+        :param max_retry: max send attempts for an email
+        :param limit: max emails claimed
+        :param lease_time: lease duration in seconds
+        :return: QuerySet of emails leased by owner
+        """
+        now = timezone.now()
+        due = Q(next_try_at__isnull=True) | Q(next_try_at__lte=now)
+        with transaction.atomic(using=self.db):
+            candidates = self.pending(max_retry)
+            if connections[self.db].features.has_select_for_update_skip_locked:
+                candidates = candidates.select_for_update(skip_locked=True)
+            ids = candidates.values_list('pk', flat=True)
+            ids = list(ids[:limit] if limit else ids)
+            lease = now + timedelta(seconds=lease_time)
+            self.filter(due, pk__in=ids, sent_at__isnull=True).update(lease_owner=owner, next_try_at=lease)
+        return self.filter(pk__in=ids, lease_owner=owner, sent_at__isnull=True).order_by('pk')
+
+
+class OutboxMail(WavesBaseModel):
+    """ Notification email queued for sending (see :class:`waves.wcore.mails.OutboxSender`), written within job
+    status change transaction
+    """
+
+    class Meta:
+        ordering = ['-created']
+        index_together = [('sent_at', 'next_try_at')]
+
+    objects = OutboxMailManager()
+    #: Related :class:`waves.wcore.models.jobs.Job`, if any
+    job = models.ForeignKey('Job', related_name='outbox_mails', on_delete=models.SET_NULL, null=True, blank=True)
+    created = models.DateTimeField('Created on', auto_now_add=True)
+    subject = models.CharField('Subject', max_length=255)
+    body = models.TextField('Body')
+    from_email = models.CharField('From', max_length=255)
+    #: Recipients, comma separated
+    to = models.TextField('To')
+    attempts = models.IntegerField('Send attempts', default=0)
+    next_try_at = models.DateTimeField('Next send attempt', null=True, blank=True)
+    sent_at = models.DateTimeField('Sent on', null=True, blank=True)
+    last_error = models.TextField('Last send error', null=True, blank=True)
+    #: Sender currently sending email (see :func:`OutboxMailManager.claim`)
+    lease_owner = models.CharField('Sender lease owner', max_length=255, null=True, blank=True, editable=False)
+
+    def __str__(self):
+        return '[%s] %s' % (self.to, self.subject)
+
+    @property
+    def recipients(self):
+        return [address.strip() for address in self.to.split(',') if address.strip()]
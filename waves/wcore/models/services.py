@@ -131,6 +131,10 @@ class BaseService(TimeStamped, Described, ApiModel, ExportAbleMixin, HasRunnerPa
     #: Set whether or not the service's outputs are knows in advance
     partial = models.BooleanField('Dynamic outputs', default=False,
                                   help_text='Set whether some service outputs are dynamic (not known in advance)')
+    #: Identical jobs reuse previous job results
+    cache_results = models.BooleanField('Cache results', default=False,
+                                        help_text='Jobs with identical inputs values and files reuse results from '
+                                                  'a previous job')
     #: Service creator user
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
     #: Service is identifier on computing platform with this id
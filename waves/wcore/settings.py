@@ -54,15 +54,20 @@ DEFAULTS = {
     'DB_VERSION': __db_version__,
     'DATA_ROOT': join(getattr(settings, 'BASE_DIR', '/tmp'), 'data'),
     'JOB_BASE_DIR': join(getattr(settings, 'BASE_DIR', '/tmp'), 'data', 'jobs'),
+    'JOB_DIR_LAYOUT': 'waves.wcore.utils.layout.FlatLayout',
     'BINARIES_DIR': join(getattr(settings, 'BASE_DIR', '/tmp'), 'data', 'bin'),
     'SAMPLE_DIR': join(getattr(settings, 'BASE_DIR', '/tmp'), 'data', 'sample'),
+    'BLOBS_DIR': join(getattr(settings, 'BASE_DIR', '/tmp'), 'data', 'blobs'),
+    'BLOBS_ENABLED': True,
     'UPLOAD_MAX_SIZE': 20 * 1024 * 1024,
     'HOST': HOSTNAME,
     'ADMIN_EMAIL': 'admin@your-site.com',
     'ALLOW_JOB_SUBMISSION': True,
     'APP_NAME': 'WAVES',
     'JOBS_MAX_RETRY': 5,
+    'JOBS_BATCH_MAX': 1000,
     'JOB_LOG_LEVEL': logging.INFO,
+    'JOB_LOG_FILES_MAX': 128,
     'SRV_IMPORT_LOG_LEVEL': logging.INFO,
     'KEEP_ANONYMOUS_JOBS': 30,
     'KEEP_REGISTERED_JOBS': 120,
@@ -78,10 +83,38 @@ DEFAULTS = {
         'waves.wcore.adaptors.shell.LocalShellAdaptor',
         'waves.wcore.adaptors.cluster.SshClusterAdaptor',
         'waves.wcore.adaptors.cluster.SshKeyClusterAdaptor',
+        'waves.wcore.adaptors.local.LocalProcessAdaptor',
     ),
     'PURGE_WAIT': 86400,
+    'PURGE_CHUNK_SIZE': 500,
+    'PURGE_WORKERS': 4,
+    'PURGE_ORPHANS_GRACE': 3600,
+    'ARCHIVE_JOBS_AFTER': 7,
+    'QUEUE_WORKERS': 4,
+    'QUEUE_RUNNER_WORKERS': {},
+    'QUEUE_BATCH_SIZE': 500,
+    'QUEUE_LEASE_TIME': 600,
+    'QUEUE_POLL_MIN': 5,
+    'QUEUE_POLL_MAX': 60,
+    'QUEUE_CHECK_MIN': 5,
+    'QUEUE_CHECK_MAX': 600,
+    'QUEUE_RUNNER_CHECK_MAX': {},
+    'CONNECTION_POOL_SIZE': 2,
+    'CONNECTION_POOL_IDLE': 300,
+    'CONNECTION_POOL_WAIT': 60,
+    'STAGING_WORKERS': 4,
+    'STAGING_COMPRESS': False,
+    'RESULTS_CLEAN_REMOTE': True,
+    'ADAPTORS_CACHE_SIZE': 256,
     'PERMISSION_CLASSES': (),
+    'API_JOBS_PAGE_SIZE': 50,
+    'API_JOBS_PAGE_SIZE_MAX': 500,
     'MAILER_CLASS': 'waves.wcore.mails.JobMailer',
+    'MAILS_BATCH_SIZE': 100,
+    'MAILS_MAX_RETRY': 5,
+    'MAILS_RETRY_DELAY': 60,
+    'MAILS_SEND_INTERVAL': 10,
+    'MAILS_LEASE_TIME': 600,
 }
 
 TEMPLATES_PACKS = ['bootstrap3', 'bootstrap2'],
@@ -89,6 +122,7 @@ TEMPLATES_PACKS = ['bootstrap3', 'bootstrap2'],
 IMPORT_STRINGS = [
     'ADAPTORS_CLASSES',
     'MAILER_CLASS',
+    'JOB_DIR_LAYOUT',
 ]
 
 
@@ -6,9 +6,13 @@ from __future__ import unicode_literals
 import os
 import shutil
 
+from django.db import transaction
 from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 
+from waves.wcore.adaptors.loader import AdaptorLoader
+from waves.wcore.job_purge import dirs_removal_deferred
+from waves.wcore.job_queue import notify_queue
 from waves.wcore.models import get_service_model, get_submission_model
 from waves.wcore.models.adaptors import AdaptorInitParam, HasAdaptorClazzMixin
 from waves.wcore.models.base import ApiModel
@@ -44,15 +48,18 @@ def job_post_save_handler(sender, instance, created, **kwargs):
         if created:
             # create job working dirs locally
             instance.make_job_dirs()
-            instance.create_non_editable_inputs()
-            instance.create_default_outputs()
-            instance.job_history.create(message="Job defaults created", status=instance.status)
+            if not instance.bulk_created:
+                instance.create_non_editable_inputs()
+                instance.create_default_outputs()
+                instance.job_history.create(message="Job defaults created", status=instance.status)
+            transaction.on_commit(notify_queue)
 
 
 @receiver(post_delete, sender=Job)
 def job_post_delete_handler(sender, instance, **kwargs):
-    """ post delete job handler """
-    instance.delete_job_dirs()
+    """ post delete job handler, working dirs are removed afterwards when jobs are purged in bulk """
+    if not dirs_removal_deferred():
+        instance.delete_job_dirs()
 
 
 @receiver(post_delete, sender=Service)
@@ -108,6 +115,18 @@ def runner_post_save_handler(sender, instance, created, **kwargs):
         instance.set_defaults()
 
 
+def adaptor_config_changed_handler(sender, instance, **kwargs):
+    """ Runners / adaptors params changes invalidate loaded adaptors cache """
+    AdaptorLoader.invalidate()
+
+
+for model in [Runner, AdaptorInitParam] + get_all_subclasses(AdaptorInitParam):
+    # noinspection PyProtectedMember
+    if not model._meta.abstract:
+        post_save.connect(adaptor_config_changed_handler, model)
+        post_delete.connect(adaptor_config_changed_handler, model)
+
+
 @receiver(post_save, sender=HasAdaptorClazzMixin)
 def adaptor_mixin_post_save_handler(sender, instance, created, **kwargs):
     if not kwargs.get('raw', False) and (instance.config_changed or created):
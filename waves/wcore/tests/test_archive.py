@@ -0,0 +1,56 @@
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+from os.path import join
+
+from waves.wcore.utils.archive import ARCHIVE_NAME, archive_dir, restore_dir, file_exists, file_size, open_file, \
+    dir_files
+
+
+class JobArchiveTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        os.makedirs(join(self.working_dir, 'sub'))
+        self.files = {'output.txt': b'A' * 10000, 'sub/nested.txt': b'nested', 'job.log': b'log'}
+        for name, content in self.files.items():
+            with open(join(self.working_dir, name), 'wb') as fp:
+                fp.write(content)
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def test_archive_read(self):
+        archived, freed = archive_dir(self.working_dir)
+        self.assertEqual(archived, 2)
+        self.assertGreater(freed, 0)
+        self.assertTrue(os.path.isfile(join(self.working_dir, ARCHIVE_NAME)))
+        # job log is kept on disk, others files are only in archive
+        self.assertTrue(os.path.isfile(join(self.working_dir, 'job.log')))
+        self.assertFalse(os.path.isfile(join(self.working_dir, 'output.txt')))
+        for name, content in self.files.items():
+            path = join(self.working_dir, name)
+            self.assertTrue(file_exists(path))
+            self.assertEqual(file_size(path), len(content))
+            with open_file(path) as fp:
+                self.assertEqual(fp.read(), content)
+        self.assertFalse(file_exists(join(self.working_dir, 'missing.txt')))
+        self.assertEqual(dir_files(self.working_dir), {'output.txt', 'job.log', 'sub'})
+        self.assertRaises(IOError, open_file, join(self.working_dir, 'missing.txt'))
+
+    def test_archive_append_restore(self):
+        archive_dir(self.working_dir)
+        with open(join(self.working_dir, 'output.txt'), 'wb') as fp:
+            fp.write(b'new')
+        self.assertEqual(archive_dir(self.working_dir)[0], 1)
+        with open_file(join(self.working_dir, 'output.txt')) as fp:
+            self.assertEqual(fp.read(), b'new')
+        self.assertEqual(restore_dir(self.working_dir), 2)
+        self.assertFalse(os.path.isfile(join(self.working_dir, ARCHIVE_NAME)))
+        with open(join(self.working_dir, 'output.txt'), 'rb') as fp:
+            self.assertEqual(fp.read(), b'new')
+        with open(join(self.working_dir, 'sub', 'nested.txt'), 'rb') as fp:
+            self.assertEqual(fp.read(), b'nested')
@@ -0,0 +1,75 @@
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+from os.path import join
+
+from waves.wcore.utils.blobs import BlobStore
+
+
+class BlobStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = BlobStore(root=join(self.root, 'blobs'), enabled=True)
+        self.jobs_dirs = [join(self.root, 'job%i' % i) for i in range(2)]
+        for job_dir in self.jobs_dirs:
+            os.makedirs(job_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_write_once(self):
+        digests = [self.store.write(join(job_dir, 'input.txt'), [b'some ', b'content']) for job_dir in self.jobs_dirs]
+        self.assertEqual(digests[0], digests[1])
+        blob = self.store.blob_path(digests[0])
+        self.assertEqual(os.stat(blob).st_nlink, 3)
+        with open(join(self.jobs_dirs[1], 'input.txt'), 'rb') as fp:
+            self.assertEqual(fp.read(), b'some content')
+        self.assertEqual(self.store.manifest(self.jobs_dirs[0]), {digests[0]})
+
+    def test_source_digest(self):
+        source = join(self.root, 'sample.txt')
+        with open(source, 'wb') as fp:
+            fp.write(b'sample')
+        self.store.write(join(self.jobs_dirs[0], 'sample.txt'), lambda: [b'sample'], source=source)
+        # content is not read again for a known source
+        self.store.write(join(self.jobs_dirs[1], 'sample.txt'), lambda: self.fail('Source read again'),
+                         source=source)
+        self.assertTrue(os.path.isfile(join(self.jobs_dirs[1], 'sample.txt')))
+
+    def test_release(self):
+        digest = self.store.write(join(self.jobs_dirs[0], 'input.txt'), [b'content'])
+        self.store.write(join(self.jobs_dirs[1], 'input.txt'), [b'content'])
+        for job_dir in self.jobs_dirs:
+            digests = self.store.manifest(job_dir)
+            shutil.rmtree(job_dir)
+            self.store.release(digests)
+            self.assertEqual(os.path.exists(self.store.blob_path(digest)), job_dir == self.jobs_dirs[0])
+
+    def test_collect(self):
+        digest = self.store.write(join(self.jobs_dirs[0], 'input.txt'), [b'content'])
+        shutil.rmtree(self.jobs_dirs[0])
+        self.assertEqual(self.store.collect(), 1)
+        self.assertFalse(os.path.exists(self.store.blob_path(digest)))
+
+    def test_concurrent_collect(self):
+        store = self.store
+        removed = []
+
+        class CollectedStore(BlobStore):
+            def _store(self, tmp_path, digest):
+                super(CollectedStore, self)._store(tmp_path, digest)
+                # stored blob is still referenced by the temporary file
+                removed.append(store.collect())
+                if len(removed) == 1:
+                    os.remove(self.blob_path(digest))
+
+        self.store = CollectedStore(root=store.root, enabled=True)
+        self.store.write(join(self.jobs_dirs[0], 'input.txt'), [b'content'])
+        self.assertEqual(removed, [0, 0])
+        with open(join(self.jobs_dirs[0], 'input.txt'), 'rb') as fp:
+            self.assertEqual(fp.read(), b'content')
+        self.assertEqual(os.stat(join(self.jobs_dirs[0], 'input.txt')).st_nlink, 2)
@@ -1,16 +1,24 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function
 
+import os
 import shutil
+import stat
 import json
 from os.path import basename, join
 
 from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from waves.wcore.adaptors.const import JobStatus
 from waves.wcore.adaptors.tests import logger
-from waves.wcore.models import JobInput, JobOutput, Job
+from waves.wcore.models import JobInput, JobOutput, Job, TextParam
 from waves.wcore.models.const import ParamType
+from waves.wcore.models.inputs import FileInputSample
 from waves.wcore.models.services import Service
+from waves.wcore.settings import waves_settings
 from waves.wcore.tests.base import BaseTestCase, TestJobWorkflowMixin
+from waves.wcore.utils.blobs import blob_store
 
 
 class CopyServiceTestCase(BaseTestCase, TestJobWorkflowMixin):
@@ -38,3 +46,94 @@ class CopyServiceTestCase(BaseTestCase, TestJobWorkflowMixin):
         job = Job.objects.create_from_submission(cp_service.default_submission, job_payload)
         logger.info('job command line %s ', job.command_line)
         self.run_job_workflow(job)
+
+    def test_create_from_submission(self):
+        cp_service = Service.objects.filter(api_name='copy').first()
+        submission = cp_service.default_submission
+        job_payload = {
+            'src': 'ACGT',
+            'dest': 'test_fasta_copy.txt'
+        }
+        data = Job.objects.submission_data(submission)
+        with CaptureQueriesContext(connection) as context:
+            job = Job.objects.create_from_submission(submission, job_payload, submission_data=data)
+        # inputs, outputs and history are bulk inserted, job is saved once
+        queries = len(context.captured_queries)
+        self.assertLess(queries, 10)
+        self.assertEqual(job.job_history.count(), 1)
+        self.assertEqual(job.job_inputs.count(), submission.inputs.filter(api_name__in=job_payload.keys()).count() +
+                         submission.inputs.filter(required=None).count())
+        self.assertEqual(job.outputs.count(), submission.outputs.count() + 2)
+        self.assertTrue(all(output.api_name for output in job.outputs.all()))
+        self.assertIsNotNone(job._command_line)
+        # pasted content is stored once, read only
+        self.assertEqual(len(blob_store.manifest(job.working_dir)), 1)
+        self.assertFalse(os.stat(join(job.working_dir, 'src.txt')).st_mode & stat.S_IWUSR)
+        # queries count does not depend on parameters count
+        params = [TextParam.objects.create(name='param%i' % i, api_name='param%i' % i, label='Param %i' % i,
+                                           order=i + 3, submission=submission) for i in range(40)]
+        job_payload.update((param.api_name, 'value') for param in params)
+        data = Job.objects.submission_data(submission)
+        with CaptureQueriesContext(connection) as context:
+            job = Job.objects.create_from_submission(submission, job_payload, submission_data=data)
+        self.assertEqual(len(context.captured_queries), queries)
+        self.assertEqual(job.job_inputs.filter(api_name__startswith='param').count(), len(params))
+
+    def test_create_from_submission_failure(self):
+        submission = Service.objects.filter(api_name='copy').first().default_submission
+        self.create_base_job('Sample CP job', submission)
+        job_dirs = set(os.listdir(waves_settings.JOB_BASE_DIR))
+        job_count = Job.objects.count()
+        # unknown sample file, failure happens once job working dir is created
+        with self.assertRaises(FileInputSample.DoesNotExist):
+            Job.objects.create_from_submission(submission, {'src': 999999, 'dest': 'test_fasta_copy.txt'})
+        self.assertEqual(Job.objects.count(), job_count)
+        self.assertEqual(set(os.listdir(waves_settings.JOB_BASE_DIR)), job_dirs)
+
+    def test_create_batch_failure(self):
+        submission = Service.objects.filter(api_name='copy').first().default_submission
+        self.create_base_job('Sample CP job', submission)
+        job_dirs = set(os.listdir(waves_settings.JOB_BASE_DIR))
+        created, errors = Job.objects.create_batch_from_submission(submission, [
+            {'src': 'ACGT', 'dest': 'test_fasta_copy.txt'},
+            {'src': 999999, 'dest': 'test_fasta_copy.txt'}])
+        self.assertEqual([index for index, _ in created], [0])
+        self.assertEqual([index for index, _ in errors], [1])
+        # only created job working dir is left
+        self.assertEqual(set(os.listdir(waves_settings.JOB_BASE_DIR)) - job_dirs, {str(created[0][1].slug)})
+
+    def test_results_cache(self):
+        cp_service = Service.objects.filter(api_name='copy').first()
+        cp_service.cache_results = True
+        cp_service.save()
+        submission = cp_service.default_submission
+        job_payload = {
+            'src': 'ACGT',
+            'dest': 'test_fasta_copy.txt'
+        }
+        source = Job.objects.create_from_submission(submission, job_payload)
+        self.assertIsNotNone(source.fingerprint)
+        with open(join(source.working_dir, 'test_fasta_copy.txt'), 'w') as fp:
+            fp.write('ACGT')
+        source.status = JobStatus.JOB_TERMINATED
+        source.save()
+        job = Job.objects.create_from_submission(submission, job_payload)
+        self.assertEqual(job.status, JobStatus.JOB_TERMINATED)
+        self.assertEqual(job.cached_from, str(source.slug))
+        self.assertEqual(job.fingerprint, source.fingerprint)
+        self.assertTrue(os.path.isfile(join(job.working_dir, 'test_fasta_copy.txt')))
+        # results are linked, not copied
+        self.assertGreater(os.stat(join(job.working_dir, 'test_fasta_copy.txt')).st_nlink, 1)
+        job.save()
+        self.assertGreater(os.stat(join(job.working_dir, 'test_fasta_copy.txt')).st_nlink, 1)
+        # re-run cached job does not reset source job results
+        job.re_run()
+        self.assertEqual(os.stat(join(source.working_dir, 'test_fasta_copy.txt')).st_nlink, 1)
+        self.assertEqual(os.stat(join(job.working_dir, 'test_fasta_copy.txt')).st_nlink, 1)
+        with open(join(source.working_dir, 'test_fasta_copy.txt')) as fp:
+            self.assertEqual(fp.read(), 'ACGT')
+        self.assertEqual(os.path.getsize(join(job.working_dir, 'test_fasta_copy.txt')), 0)
+        other = Job.objects.create_from_submission(submission, dict(job_payload, src='TTTT'))
+        self.assertEqual(other.status, JobStatus.JOB_CREATED)
+        self.assertNotEqual(other.fingerprint, source.fingerprint)
+        self.assertEqual(Job.objects.results_cache_stats(), dict(hits=1, misses=2, ratio=1.0 / 3))
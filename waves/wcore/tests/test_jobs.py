@@ -2,13 +2,24 @@ from __future__ import unicode_literals
 
 import logging
 import os
+import shutil
+import time
+import uuid
+from datetime import timedelta
 
 from django.contrib.auth import get_user_model
 from django.core import mail
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
 from waves.wcore.adaptors.const import JobStatus
-from waves.wcore.models import get_service_model, get_submission_model
+from waves.wcore.job_purge import JobPurger, JobArchiver, JobDirsChecker
+from waves.wcore.mails import OutboxSender
+from waves.wcore.models import get_service_model, get_submission_model, Job, JobInput, OutboxMail
+from waves.wcore.settings import waves_settings
 from waves.wcore.tests.base import BaseTestCase
+from waves.wcore.utils.layout import job_dir_layout
 
 logger = logging.getLogger(__name__)
 Service = get_service_model()
@@ -36,6 +47,59 @@ class JobsTestCase(BaseTestCase):
         self.assertFalse(os.path.isdir(work_dir))
         logger.debug('Job directories has been deleted')
 
+    def test_purge_jobs(self):
+        jobs = [self.create_random_job() for _ in range(3)]
+        for job in jobs:
+            job.make_job_dirs()
+        expired = [job.pk for job in jobs[:2]]
+        Job.objects.filter(pk__in=expired).update(updated=timezone.now() - timedelta(days=31))
+        self.assertEqual(Job.objects.expired().count(), 2)
+        report = JobPurger(dry_run=True).purge()
+        self.assertEqual((report['jobs'], report['dirs']), (2, 2))
+        self.assertEqual(Job.objects.count(), 3)
+        report = JobPurger(chunk_size=1).purge()
+        self.assertEqual(report['jobs'], 2)
+        self.assertEqual(list(Job.objects.values_list('pk', flat=True)), [jobs[2].pk])
+        self.assertFalse(any(os.path.isdir(job.working_dir) for job in jobs[:2]))
+        self.assertTrue(os.path.isdir(jobs[2].working_dir))
+        self.assertFalse(JobInput.objects.filter(job_id__in=expired).exists())
+
+    def test_archive_jobs(self):
+        job = self.create_random_job()
+        job.make_job_dirs()
+        output = job.outputs.first()
+        with open(output.file_path, 'w') as fp:
+            fp.write('archived output')
+        Job.objects.filter(pk=job.pk).update(_status=JobStatus.JOB_TERMINATED,
+                                             updated=timezone.now() - timedelta(days=8))
+        report = JobArchiver(age=7).archive()
+        self.assertEqual(report['jobs'], 1)
+        self.assertFalse(os.path.isfile(output.file_path))
+        self.assertTrue(output.available)
+        self.assertEqual(output.file_content, b'archived output')
+
+    def test_check_job_dirs(self):
+        jobs = [self.create_random_job() for _ in range(2)]
+        jobs[0].make_job_dirs()
+        shutil.rmtree(jobs[1].working_dir, ignore_errors=True)
+        orphan = job_dir_layout().path(uuid.uuid4())
+        os.makedirs(orphan)
+        with open(os.path.join(orphan, 'output.txt'), 'w') as fp:
+            fp.write('orphan')
+        checker = JobDirsChecker(chunk_size=1, grace=3600)
+        # recently modified dirs may belong to jobs being created
+        self.assertNotIn(orphan, checker.diff()[0])
+        os.utime(orphan, (time.time() - 7200, time.time() - 7200))
+        orphans, missing = checker.diff()
+        self.assertIn(orphan, orphans)
+        self.assertNotIn(jobs[0].working_dir, orphans)
+        self.assertIn(jobs[1].slug, missing)
+        self.assertNotIn(jobs[0].slug, missing)
+        self.assertGreaterEqual(checker.sizes([orphan]), 6)
+        # dirs are checked again against database before removal
+        self.assertEqual(checker.delete([orphan, jobs[0].working_dir]), [orphan])
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(os.path.isdir(jobs[0].working_dir))
 
     def test_job_history(self):
         job = self.create_random_job()
@@ -51,6 +115,44 @@ class JobsTestCase(BaseTestCase):
             raise
         job.delete()
 
+    def test_job_lifecycle_step(self):
+        job = self.create_random_job()
+        nb_history = job.job_history.count()
+        with CaptureQueriesContext(connection) as queries:
+            with job.lifecycle_step():
+                job.retry('Remote host unreachable')
+                job.message = 'Inputs prepared'
+                job.status = JobStatus.JOB_PREPARED
+                job.add_history('Inputs checked')
+                job.add_history('Admin note', is_admin=True)
+                job.save()
+                self.assertEqual(Job.objects.get(pk=job.pk).status, JobStatus.JOB_CREATED)
+        writes = [query for query in queries.captured_queries if query['sql'].startswith(('INSERT', 'UPDATE'))]
+        self.assertEqual(len(writes), 2)
+        job = Job.objects.get(pk=job.pk)
+        self.assertEqual(job.status, JobStatus.JOB_PREPARED)
+        self.assertEqual(job.nb_retry, 1)
+        self.assertEqual(job.job_history.count(), nb_history + 4)
+        # events sharing a status are kept apart
+        self.assertTrue(job.job_history.filter(status=JobStatus.JOB_PREPARED,
+                                               message__contains='Inputs prepared').exists())
+        self.assertTrue(job.job_history.filter(status=JobStatus.JOB_PREPARED, message='Inputs checked').exists())
+
+    def test_outbox_senders(self):
+        job = self.create_random_job()
+        for index in range(3):
+            OutboxMail.objects.create(job=job, subject='Mail %i' % index, body='Body', from_email='waves@test.com',
+                                      to='user@test.com')
+        first, second = OutboxSender(batch_size=2), OutboxSender(batch_size=2)
+        claimed = first.claim()
+        self.assertEqual(len(claimed), 2)
+        # claimed emails are skipped by other senders
+        self.assertEqual(second.send(), 1)
+        self.assertEqual(first.deliver(claimed), (2, 0))
+        self.assertEqual(second.send(), 0)
+        self.assertEqual(sorted(sent.subject for sent in mail.outbox), ['Mail 0', 'Mail 1', 'Mail 2'])
+        self.assertFalse(OutboxMail.objects.filter(lease_owner__isnull=False).exists())
+
     def test_mail_job(self):
         user = User.objects.create(username='TestDomain', is_active=True)
         user.waves_user.domain = 'https://waves.test.com'
@@ -59,8 +161,14 @@ class JobsTestCase(BaseTestCase):
 
         logger.info("Job link: %s", job.link)
         logger.debug("Job notify: %s", job.notify)
+        sender = OutboxSender()
         job.check_send_mail()
+        # emails are only queued, sent afterwards
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboxMail.objects.pending(waves_settings.MAILS_MAX_RETRY).count(), 1)
+        self.assertEqual(sender.send(), 1)
         self.assertEqual(len(mail.outbox), 1)
+        self.assertIsNotNone(OutboxMail.objects.get(job=job).sent_at)
         sent_mail = mail.outbox[-1]
         self.assertTrue(job.service in sent_mail.subject)
         self.assertEqual(job.email_to, sent_mail.to[0])
@@ -70,12 +178,14 @@ class JobsTestCase(BaseTestCase):
         job.status = JobStatus.JOB_COMPLETED
         # job.save()
         job.check_send_mail()
+        sender.send()
         # no more mails
         self.assertEqual(len(mail.outbox), 1)
 
         job.status = JobStatus.JOB_TERMINATED
         # job.save()
         job.check_send_mail()
+        sender.send()
         self.assertEqual(len(mail.outbox), 2)
         sent_mail = mail.outbox[-1]
         logger.debug('Mail subject: %s', sent_mail.subject)
@@ -84,6 +194,7 @@ class JobsTestCase(BaseTestCase):
         job.status = JobStatus.JOB_ERROR
         # job.save()
         job.check_send_mail()
+        sender.send()
         # mail to user and mail to admin so +2
         self.assertEqual(len(mail.outbox), 4)
         sent_mail = mail.outbox[-1]
@@ -93,6 +204,7 @@ class JobsTestCase(BaseTestCase):
         job.status = JobStatus.JOB_CANCELLED
         # job.save()
         job.check_send_mail()
+        sender.send()
         self.assertEqual(len(mail.outbox), 5)
         sent_mail = mail.outbox[-1]
         logger.debug('Mail subject: %s', sent_mail.subject)
@@ -0,0 +1,71 @@
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+import uuid
+from os.path import join
+
+from django.core.management import call_command
+from django.utils.six import StringIO
+
+from waves.wcore.adaptors.const import JobStatus
+from waves.wcore.management.subcommands import RelayoutCommand
+from waves.wcore.models import Job
+from waves.wcore.tests.base import BaseTestCase
+from waves.wcore.utils.layout import FlatLayout, ShardedLayout
+
+
+class JobDirLayoutTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.slug = uuid.UUID('abcdef01-2345-6789-abcd-ef0123456789')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_paths(self):
+        self.assertEqual(FlatLayout(self.root).path(self.slug), join(self.root, str(self.slug)))
+        self.assertEqual(ShardedLayout(self.root).path(self.slug), join(self.root, 'ab', 'cd', str(self.slug)))
+
+    def test_relayout(self):
+        flat, sharded = FlatLayout(self.root), ShardedLayout(self.root)
+        os.makedirs(flat.path(self.slug))
+        os.makedirs(join(self.root, 'not_a_job'))
+        # previous place is still resolved until dir is moved
+        self.assertEqual(sharded.path(self.slug), flat.expected_path(self.slug))
+        misplaced = list(sharded.misplaced())
+        self.assertEqual(misplaced, [(self.slug, flat.expected_path(self.slug), sharded.expected_path(self.slug))])
+        os.makedirs(os.path.dirname(sharded.expected_path(self.slug)))
+        os.rename(flat.expected_path(self.slug), sharded.expected_path(self.slug))
+        self.assertEqual(list(sharded.misplaced()), [])
+        self.assertEqual(list(flat.scan()), [(self.slug, sharded.expected_path(self.slug))])
+        self.assertEqual(flat.path(self.slug), sharded.expected_path(self.slug))
+
+
+class RelayoutCommandTestCase(BaseTestCase):
+
+    def test_relayout_command(self):
+        running, terminated = self.create_random_job(), self.create_random_job()
+        Job.objects.filter(pk=running.pk).update(_status=JobStatus.JOB_RUNNING)
+        Job.objects.filter(pk=terminated.pk).update(_status=JobStatus.JOB_TERMINATED)
+        sharded = ShardedLayout()
+        dirs = dict((job.slug, FlatLayout().path(job.slug)) for job in (running, terminated))
+        for dir_path in dirs.values():
+            if not os.path.isdir(dir_path):
+                os.makedirs(dir_path)
+        out = StringIO()
+        call_command(RelayoutCommand(), layout='waves.wcore.utils.layout.ShardedLayout', stdout=out)
+        # running job dir is left in place, terminated job dir is moved
+        self.assertTrue(os.path.isdir(dirs[running.slug]))
+        self.assertFalse(os.path.isdir(dirs[terminated.slug]))
+        self.assertTrue(os.path.isdir(sharded.expected_path(terminated.slug)))
+        self.assertIn('1 active job dir(s) skipped', out.getvalue())
+        # job still finds its working dir
+        self.assertEqual(terminated.working_dir, sharded.expected_path(terminated.slug))
+        call_command(RelayoutCommand(), layout='waves.wcore.utils.layout.ShardedLayout', all=True, stdout=out)
+        self.assertTrue(os.path.isdir(sharded.expected_path(running.slug)))
+        for job in (running, terminated):
+            job.delete()
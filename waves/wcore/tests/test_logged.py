@@ -0,0 +1,73 @@
+from __future__ import unicode_literals
+
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from os.path import join
+
+from waves.wcore.utils.logged import LoggerClass, LogFilesCache, log_files
+
+
+class SampleLogged(LoggerClass):
+    pk = None
+
+    def __init__(self, log_dir, name):
+        self.log_dir = log_dir
+        self.name = name
+
+    @property
+    def logger_name(self):
+        return 'waves.test.%s' % self.name
+
+
+class LogFilesCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        log_files.close()
+        shutil.rmtree(self.log_dir)
+
+    def test_bounded_open_files(self):
+        cache = LogFilesCache(size=2)
+        paths = [join(self.log_dir, 'job%i.log' % i) for i in range(5)]
+        for path in paths + paths:
+            cache.write(path, 'line\n')
+        self.assertEqual(len(cache), 2)
+        cache.close()
+        self.assertEqual(len(cache), 0)
+        for path in paths:
+            with open(path) as fp:
+                self.assertEqual(fp.read(), 'line\nline\n')
+
+    def test_close_dir(self):
+        cache = LogFilesCache(size=5)
+        os.makedirs(join(self.log_dir, 'job'))
+        for path in (join(self.log_dir, 'job', 'job.log'), join(self.log_dir, 'job', 'other.log'),
+                     join(self.log_dir, 'job.log')):
+            cache.write(path, 'line\n')
+        cache.close_dir(join(self.log_dir, 'job'))
+        self.assertEqual(len(cache), 1)
+        cache.close()
+
+    def test_logger(self):
+        objects = [SampleLogged(self.log_dir, 'job%i' % i) for i in range(3)]
+        for obj in objects:
+            obj.logger.error('Some error')
+            self.assertIs(obj.logger, obj.logger)
+        log_files.close()
+        with open(objects[0].log_file) as fp:
+            self.assertIn('ERROR Some error', fp.read())
+
+    def test_logger_fallback(self):
+        obj = SampleLogged(join(self.log_dir, 'missing'), 'job')
+        self.assertIs(obj.logger, logging.getLogger('waves.errors'))
+        # failure is remembered, log file is not opened again
+        os.makedirs(obj.log_dir)
+        self.assertIs(obj.logger, logging.getLogger('waves.errors'))
+        self.assertEqual(len(log_files), 0)
+        obj.name = 'renamed'
+        self.assertEqual(obj.logger.name, 'waves.test.renamed')
@@ -0,0 +1,220 @@
+from __future__ import unicode_literals
+
+import logging
+import os
+import shutil
+import socket
+import tempfile
+import threading
+from datetime import timedelta
+
+from django.utils import timezone
+
+from waves.wcore.adaptors.const import JobStatus
+from waves.wcore.adaptors.mocks import MockJobRunnerAdaptor
+from waves.wcore.job_queue import JobQueueProcessor, QueueListener
+from waves.wcore.models import Job
+from waves.wcore.settings import waves_settings
+from waves.wcore.tests.base import BaseTestCase, TestJobWorkflowMixin
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueTestCase(BaseTestCase, TestJobWorkflowMixin):
+
+    def test_pool_size(self):
+        adaptor = MockJobRunnerAdaptor()
+        clazz = '.'.join([adaptor.__module__, adaptor.__class__.__name__])
+        processor = JobQueueProcessor(workers=8, runner_workers={})
+        self.assertEqual(processor.pool_size(adaptor, 100), 8)
+        self.assertEqual(processor.pool_size(adaptor, 3), 3)
+        self.assertEqual(processor.pool_size(None, 0), 1)
+        processor = JobQueueProcessor(workers=8, runner_workers={clazz: 2})
+        self.assertEqual(processor.pool_size(adaptor, 100), 2)
+        processor = JobQueueProcessor(workers=8, runner_workers={adaptor.connexion_string(): 5, clazz: 2})
+        self.assertEqual(processor.pool_size(adaptor, 100), 5)
+
+    def test_runner_pool(self):
+        service = self.sample_service()
+        jobs = [self.sample_job(service) for _ in range(3)]
+        runner = jobs[0].adaptor
+        clazz = '.'.join([runner.__module__, runner.__class__.__name__])
+        threads = []
+
+        class RecordingProcessor(JobQueueProcessor):
+            def process_job(self, job, status_checked=False):
+                threads.append(threading.current_thread().name)
+
+        # runner pool size prevails over global workers count
+        RecordingProcessor(workers=1, runner_workers={clazz: 3}).process(jobs)
+        self.assertEqual(len(threads), 3)
+        self.assertNotIn('MainThread', threads)
+        del threads[:]
+        RecordingProcessor(workers=1, runner_workers={}).process(jobs)
+        self.assertEqual(threads, ['MainThread'] * 3)
+
+    def test_process_queue(self):
+        service = self.sample_service()
+        jobs = [self.sample_job(service) for _ in range(3)]
+        processor = JobQueueProcessor(workers=1)
+        self.assertEqual(processor.process(), len(jobs))
+        for job in jobs:
+            job.refresh_from_db()
+            self.assertEqual(job.status, JobStatus.JOB_PREPARED)
+
+    def test_queue_batch(self):
+        service = self.sample_service()
+        jobs = [self.sample_job(service) for _ in range(3)]
+        jobs[0].status = JobStatus.JOB_TERMINATED
+        jobs[0].save()
+        self.assertEqual(Job.objects.queue_jobs().count(), 2)
+        self.assertEqual(len(Job.objects.queue_jobs(limit=1)), 1)
+        self.assertEqual(JobQueueProcessor(workers=1, batch_size=1).process(), 1)
+
+    def test_queue_lease(self):
+        service = self.sample_service()
+        jobs = [self.sample_job(service) for _ in range(3)]
+        claimed = Job.objects.claim_queue_jobs('worker-1', limit=2)
+        self.assertEqual(claimed.count(), 2)
+        # other worker only gets remaining job
+        other = Job.objects.claim_queue_jobs('worker-2')
+        self.assertEqual(other.count(), 1)
+        self.assertFalse(set(claimed.values_list('id', flat=True)) & set(other.values_list('id', flat=True)))
+        self.assertEqual(Job.objects.claim_queue_jobs('worker-3').count(), 0)
+        # expired leases are reclaimed
+        Job.objects.filter(lease_owner='worker-1').update(lease_expires=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(Job.objects.claim_queue_jobs('worker-3').count(), 2)
+        self.assertEqual(Job.objects.release_queue_jobs('worker-3'), 2)
+        self.assertEqual(Job.objects.release_queue_jobs('worker-2'), 1)
+        self.assertEqual(JobQueueProcessor(workers=1).process(), len(jobs))
+        self.assertFalse(Job.objects.filter(lease_owner__isnull=False).exists())
+
+    def test_queue_lease_lost(self):
+        service = self.sample_service()
+        self.sample_job(service)
+        processor = JobQueueProcessor(workers=1)
+        job = processor.get_queryset().get()
+        # lease is only renewed when close to expiration
+        expires = job.lease_expires
+        self.assertTrue(Job.objects.renew_queue_lease(job, processor.owner))
+        self.assertEqual(job.lease_expires, expires)
+        job.lease_expires = timezone.now() + timedelta(seconds=1)
+        self.assertTrue(Job.objects.renew_queue_lease(job, processor.owner))
+        self.assertGreater(job.lease_expires, expires)
+        # lease expires, job is reclaimed by another worker
+        Job.objects.filter(pk=job.pk).update(lease_expires=timezone.now() - timedelta(seconds=1))
+        job.lease_expires = None
+        self.assertEqual(Job.objects.claim_queue_jobs('worker-2').count(), 1)
+        # job saves do not override other worker lease
+        job.save()
+        self.assertEqual(Job.objects.get(pk=job.pk).lease_owner, 'worker-2')
+        # first worker does not process job anymore, step changes are discarded
+        processor.process_job(job)
+        with job.lifecycle_step(lease_owner=processor.owner):
+            job.status = JobStatus.JOB_ERROR
+            job.add_history('Lost lease')
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.JOB_CREATED)
+        self.assertFalse(job.job_history.filter(message='Lost lease').exists())
+        self.assertEqual(Job.objects.release_queue_jobs(processor.owner), 0)
+        self.assertEqual(Job.objects.release_queue_jobs('worker-2'), 1)
+
+    def test_launch_jobs(self):
+        service = self.sample_service()
+        for _ in range(2):
+            job = self.sample_job(service)
+            job.status = JobStatus.JOB_PREPARED
+            job.save()
+        processor = JobQueueProcessor(workers=1)
+        jobs = list(processor.get_queryset())
+        runner = jobs[0].adaptor
+        runner.bulk_launch = True
+        self.assertEqual(len(processor.launch_jobs(runner, jobs)), 2)
+        for job in jobs:
+            job.refresh_from_db()
+            self.assertEqual(job.status, JobStatus.JOB_QUEUED)
+            self.assertEqual(job.lease_owner, processor.owner)
+            self.assertTrue(job.job_history.filter(status=JobStatus.JOB_QUEUED).exists())
+        Job.objects.release_queue_jobs(processor.owner)
+
+    def test_launch_jobs_failure(self):
+        service = self.sample_service()
+        for _ in range(2):
+            job = self.sample_job(service)
+            job.status = JobStatus.JOB_PREPARED
+            job.save()
+        processor = JobQueueProcessor(workers=1)
+        jobs = list(processor.get_queryset())
+        runner = jobs[0].adaptor
+        runner.bulk_launch = True
+
+        def broken_run_jobs(launched_jobs):
+            raise RuntimeError('Broken runner')
+
+        runner.run_jobs = broken_run_jobs
+        # unexpected launch errors are recorded on jobs, steps are still written
+        self.assertEqual(len(processor.launch_jobs(runner, jobs)), 2)
+        for job in jobs:
+            job.refresh_from_db()
+            self.assertEqual(job.status, JobStatus.JOB_ERROR)
+            self.assertTrue(job.job_history.filter(status=JobStatus.JOB_ERROR).exists())
+        Job.objects.release_queue_jobs(processor.owner)
+
+    def test_process_queue_status(self):
+        service = self.sample_service()
+        jobs = [self.sample_job(service) for _ in range(2)]
+        for job in jobs:
+            job.status = JobStatus.JOB_QUEUED
+            job.remote_job_id = '%s-remote' % job.id
+            job.save()
+        runner = jobs[0].adaptor
+        checked = runner.jobs_status(jobs)
+        self.assertEqual(len(checked), len(jobs))
+        self.assertTrue(all(job.status == JobStatus.JOB_RUNNING for job in jobs))
+        # status not saved, queue processes jobs from their queued status
+        JobQueueProcessor(workers=1).process()
+        for job in jobs:
+            job.refresh_from_db()
+            self.assertEqual(job.status, JobStatus.JOB_RUNNING)
+
+    def test_queue_listener(self):
+        tmp_dir = tempfile.mkdtemp()
+        listener = QueueListener(path=os.path.join(tmp_dir, 'queue.sock'), min_wait=0.01, max_wait=0.04)
+        try:
+            listener.open()
+            self.assertFalse(listener.wait(busy=False))
+            self.assertEqual(listener.delay, 0.02)
+            listener.wait(busy=False)
+            listener.wait(busy=False)
+            self.assertEqual(listener.delay, 0.04)
+            # a notification wakes up the listener and resets poll delay
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.sendto(b'1', listener.path)
+            sock.close()
+            self.assertTrue(listener.wait(busy=False))
+            self.assertEqual(listener.delay, 0.01)
+        finally:
+            listener.close()
+            shutil.rmtree(tmp_dir)
+
+    def test_status_check_schedule(self):
+        service = self.sample_service()
+        job = self.sample_job(service)
+        job.status = JobStatus.JOB_RUNNING
+        job.save()
+        self.assertIsNone(job.next_check_at)
+        job.schedule_status_check(job.updated)
+        delay = (job.next_check_at - timezone.now()).total_seconds()
+        self.assertTrue(0 < delay <= waves_settings.QUEUE_CHECK_MIN)
+        # unchanged status, delay since last check is doubled
+        job.schedule_status_check(timezone.now() - timedelta(seconds=60))
+        delay = (job.next_check_at - timezone.now()).total_seconds()
+        self.assertTrue(110 < delay <= 120)
+        job.schedule_status_check(timezone.now() - timedelta(days=2))
+        delay = (job.next_check_at - timezone.now()).total_seconds()
+        self.assertTrue(delay <= waves_settings.QUEUE_CHECK_MAX)
+        job.save()
+        # job is not due for next queue pass
+        self.assertEqual(JobQueueProcessor(workers=1).process(), 0)
+        job.status = JobStatus.JOB_COMPLETED
+        self.assertIsNone(job.next_check_at)
@@ -0,0 +1,176 @@
+"""
+WAVES jobs working dirs archives
+
+Finished jobs working dirs files are packed in a compressed zip archive kept in working dir (see
+:class:`waves.wcore.job_purge.JobArchiver`). Zip central directory indexes archive members: a single file is read
+without extracting whole archive.
+
+Job files should be read with :func:`file_exists`, :func:`file_size` and :func:`open_file`, whether archived or not.
+"""
+from __future__ import unicode_literals
+
+import errno
+import os
+import shutil
+import stat
+import zipfile
+from contextlib import closing
+from os.path import basename, dirname, getsize, isfile, join
+
+__all__ = ['ARCHIVE_NAME', 'archive_dir', 'restore_dir', 'file_exists', 'file_size', 'open_file', 'read_head',
+           'dir_files']
+
+#: Archive file name in job working dir
+ARCHIVE_NAME = '.waves_archive.zip'
+#: Files kept on disk (job log, run details read on each job display)
+KEPT_FILES = ('job.log', 'job_run_details.json')
+#: Parent dirs levels searched for an archive (files in job working dir sub dirs)
+ARCHIVE_LEVELS = 3
+
+
+def find_archive(file_path):
+    """ Find archive which may contain file
+
+    :return: tuple (archive path, member name), (None, None) if no archive found
+    """
+    directory, member = dirname(file_path), basename(file_path)
+    for _ in range(ARCHIVE_LEVELS):
+        archive = join(directory, ARCHIVE_NAME)
+        if isfile(archive):
+            return archive, member
+        member = '%s/%s' % (basename(directory), member)
+        directory = dirname(directory)
+    return None, None
+
+
+def archived_info(file_path):
+    """ Archive member info for file, None if file is not archived """
+    archive, member = find_archive(file_path)
+    if archive is None:
+        return None
+    try:
+        with closing(zipfile.ZipFile(archive)) as zip_file:
+            return zip_file.getinfo(member)
+    except (KeyError, IOError, zipfile.BadZipfile):
+        return None
+
+
+def file_exists(file_path):
+    """ Whether file exists on disk or in job archive """
+    return isfile(file_path) or archived_info(file_path) is not None
+
+
+def file_size(file_path):
+    """ File size, on disk or in job archive (uncompressed), None if file does not exist """
+    if isfile(file_path):
+        return getsize(file_path)
+    info = archived_info(file_path)
+    return info.file_size if info is not None else None
+
+
+def open_file(file_path, mode='rb'):
+    """ Open file for reading, from disk or from job archive (archived file content is bytes)
+
+    :raise: IOError if file does not exist
+    """
+    if isfile(file_path):
+        return open(file_path, mode)
+    archive, member = find_archive(file_path)
+    if archive is not None:
+        try:
+            with closing(zipfile.ZipFile(archive)) as zip_file:
+                # member file keeps its own archive file handle
+                return zip_file.open(member)
+        except (KeyError, zipfile.BadZipfile):
+            pass
+    raise IOError(errno.ENOENT, 'No such file or directory', file_path)
+
+
+def read_head(file_path, size=2048):
+    """ File first bytes (i.e to guess file type), from disk or from job archive """
+    with open_file(file_path) as fp:
+        return fp.read(size)
+
+
+def dir_files(directory):
+    """ Names of entries directly in directory, on disk or in its archive: one dir listing and at most one archive
+    index read, instead of one check per file (see :func:`file_exists`)
+
+    :return: set
+    """
+    try:
+        names = set(os.listdir(directory))
+    except OSError:
+        return set()
+    if ARCHIVE_NAME in names:
+        names.discard(ARCHIVE_NAME)
+        try:
+            with closing(zipfile.ZipFile(join(directory, ARCHIVE_NAME))) as zip_file:
+                names.update(name for name in zip_file.namelist() if '/' not in name)
+        except (IOError, zipfile.BadZipfile):
+            pass
+    return names
+
+
+def is_stored(file_path):
+    """ Whether file is a stored input, i.e read only file linked in blobs store (see :mod:`waves.wcore.utils.blobs`)
+    """
+    file_stat = os.stat(file_path)
+    return file_stat.st_nlink > 1 and not file_stat.st_mode & stat.S_IWUSR
+
+
+def archive_dir(working_dir):
+    """ Move working dir files into archive (added to existing archive if any). Hidden files, kept files and stored
+    inputs (read only files linked in blobs store) stay on disk.
+
+    :return: tuple (archived files count, disk bytes freed)
+    """
+    members = []
+    for dir_path, _, file_names in os.walk(working_dir):
+        for file_name in file_names:
+            path = join(dir_path, file_name)
+            member = os.path.relpath(path, working_dir).replace(os.sep, '/')
+            if file_name.startswith('.') or member in KEPT_FILES or os.path.islink(path) or is_stored(path):
+                continue
+            members.append((path, member))
+    if not members:
+        return 0, 0
+    archive = join(working_dir, ARCHIVE_NAME)
+    previous_size = getsize(archive) if isfile(archive) else 0
+    tmp_archive = archive + '.part'
+    if previous_size:
+        shutil.copyfile(archive, tmp_archive)
+    try:
+        with closing(zipfile.ZipFile(tmp_archive, 'a' if previous_size else 'w', zipfile.ZIP_DEFLATED,
+                                     allowZip64=True)) as zip_file:
+            for path, member in members:
+                zip_file.write(path, member)
+        os.rename(tmp_archive, archive)
+    except Exception:
+        if isfile(tmp_archive):
+            os.remove(tmp_archive)
+        raise
+    freed = previous_size - getsize(archive)
+    for path, _ in members:
+        freed += getsize(path)
+        os.remove(path)
+    return len(members), freed
+
+
+def restore_dir(working_dir):
+    """ Extract archived files back into working dir (files on disk are kept), remove archive
+
+    :return: restored files count
+    """
+    archive = join(working_dir, ARCHIVE_NAME)
+    if not isfile(archive):
+        return 0
+    restored = 0
+    with closing(zipfile.ZipFile(archive)) as zip_file:
+        # latest archived version first
+        for info in reversed(zip_file.infolist()):
+            if not isfile(join(working_dir, info.filename)):
+                zip_file.extract(info, working_dir)
+                restored += 1
+    os.remove(archive)
+    return restored
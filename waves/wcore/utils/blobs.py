@@ -0,0 +1,250 @@
+"""
+WAVES content-addressed files store
+
+Job input files contents (uploaded, sample and pasted ones) are stored once under ``BLOBS_DIR``, keyed by their
+SHA-256 digest, and hard linked into jobs working dirs. Blob file links count is its reference count: once no job
+working dir links it anymore, the blob is removed (see :func:`BlobStore.release` and :func:`BlobStore.collect`).
+
+.. note::
+    Blobs (and so linked job inputs) are read only, ``BLOBS_DIR`` should be on ``JOB_BASE_DIR`` file system, files are
+    copied otherwise.
+
+.. warning::
+    Services whose tools modify their input files in place fail on read only inputs, set ``BLOBS_ENABLED`` to False
+    when running such services: inputs are then written as regular files in jobs working dirs.
+"""
+from __future__ import unicode_literals
+
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import stat
+import tempfile
+import threading
+from os.path import dirname, join
+
+from waves.wcore.settings import waves_settings
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['BlobStore', 'blob_store', 'file_digest', 'link_file', 'is_shared', 'unshare_file']
+
+#: File listing blobs digests linked in a job working dir
+MANIFEST = '.waves_blobs'
+
+
+def file_digest(file_path, block_size=1024 * 1024):
+    """ SHA-256 hex digest of file content """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as fp:
+        for block in iter(lambda: fp.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def link_file(source, target):
+    """ Hard link source file to target path, copy it when hard links are not possible """
+    try:
+        os.link(source, target)
+    except OSError as exc:
+        if exc.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+            raise
+        logger.warning('Unable to link %s (%s), copied to %s', source, exc, target)
+        shutil.copyfile(source, target)
+
+
+def is_shared(file_path):
+    """ Whether file is a writable file hard linked elsewhere (i.e results linked from another job), stored blobs
+    links are read only and never written
+    """
+    file_stat = os.lstat(file_path)
+    return stat.S_ISREG(file_stat.st_mode) and file_stat.st_nlink > 1 and bool(file_stat.st_mode & stat.S_IWUSR)
+
+
+def unshare_file(file_path):
+    """ Replace hard linked file with its own copy, other links are left unchanged when file is written again """
+    tmp_path = file_path + '.unshare'
+    shutil.copy2(file_path, tmp_path)
+    os.rename(tmp_path, file_path)
+
+
+class BlobStore(object):
+    """ Content-addressed files store, blobs are stored as <root>/<digest[0:2]>/<digest[2:4]>/<digest> """
+    #: Attempts to store then link a blob before giving up
+    STORE_ATTEMPTS = 3
+
+    def __init__(self, root=None, enabled=None):
+        self._root = root
+        self._enabled = enabled
+        #: known digests for source files (path, size, mtime), avoid reading again large sample files
+        self._known = {}
+        self._lock = threading.Lock()
+
+    @property
+    def root(self):
+        return self._root or waves_settings.BLOBS_DIR
+
+    @property
+    def enabled(self):
+        return self._enabled if self._enabled is not None else waves_settings.BLOBS_ENABLED
+
+    def blob_path(self, digest):
+        return join(self.root, digest[0:2], digest[2:4], digest)
+
+    @staticmethod
+    def source_key(file_path):
+        """ Key identifying a source file version, None if file is not available on local file system """
+        try:
+            stat = os.stat(file_path)
+        except (OSError, TypeError, ValueError):
+            return None
+        return file_path, stat.st_size, stat.st_mtime
+
+    def _write_temp(self, chunks):
+        """ Write chunks to a temporary file in store, compute digest meanwhile """
+        tmp_dir = join(self.root, 'tmp')
+        if not os.path.isdir(tmp_dir):
+            try:
+                os.makedirs(tmp_dir)
+            except OSError as exc:
+                if exc.errno != errno.EEXIST:
+                    raise
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    fp.write(chunk)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        return tmp_path, digest.hexdigest()
+
+    def _link(self, digest, target):
+        """ Link blob to target, copy it when hard links are not possible
+
+        :return: False if blob does not exist
+        """
+        if os.path.lexists(target):
+            os.remove(target)
+        try:
+            link_file(self.blob_path(digest), target)
+        except (OSError, IOError) as exc:
+            if exc.errno == errno.ENOENT:
+                return False
+            raise
+        return True
+
+    def _store(self, tmp_path, digest):
+        """ Link temporary file to blob location (any concurrently stored blob has same content), temporary file keeps
+        blob referenced until it is removed, so that a concurrent :func:`collect` does not remove it meanwhile
+        """
+        blob = self.blob_path(digest)
+        if not os.path.isdir(dirname(blob)):
+            try:
+                os.makedirs(dirname(blob))
+            except OSError as exc:
+                if exc.errno != errno.EEXIST:
+                    raise
+        os.chmod(tmp_path, 0o444)
+        try:
+            os.link(tmp_path, blob)
+        except OSError as exc:
+            if exc.errno == errno.EEXIST:
+                return
+            if exc.errno not in (errno.EPERM, errno.EMLINK):
+                raise
+            shutil.copy2(tmp_path, blob)
+
+    @staticmethod
+    def _add_manifest(target, digest):
+        with open(join(dirname(target), MANIFEST), 'a') as fp:
+            fp.write('%s\n' % digest)
+
+    def write(self, target, chunks, source=None):
+        """ Write file content to target path, through store when enabled
+
+        :param target: target file path (i.e in job working dir)
+        :param chunks: iterable of file content chunks, or callable returning it
+        :param source: source file path (i.e sample file), content digest is then computed once per source version
+        :return: content digest, None if store is disabled
+        """
+        if not self.enabled:
+            with open(target, 'wb+') as fp:
+                for chunk in (chunks() if callable(chunks) else chunks):
+                    fp.write(chunk)
+            return None
+        key = self.source_key(source) if source else None
+        with self._lock:
+            digest = self._known.get(key) if key else None
+        if digest is None or not self._link(digest, target):
+            tmp_path, digest = self._write_temp(chunks() if callable(chunks) else chunks)
+            try:
+                for _ in range(self.STORE_ATTEMPTS):
+                    if self._link(digest, target):
+                        break
+                    # blob is missing, or has just been removed by a concurrent collect
+                    self._store(tmp_path, digest)
+                else:
+                    raise IOError(errno.ENOENT, 'Unable to store blob %s' % digest, target)
+            finally:
+                os.remove(tmp_path)
+        if key:
+            with self._lock:
+                self._known[key] = digest
+        self._add_manifest(target, digest)
+        return digest
+
+    def _remove_unused(self, digest):
+        """ Remove blob if not linked anywhere else
+
+        :return: True if removed
+        """
+        blob = self.blob_path(digest)
+        try:
+            if os.stat(blob).st_nlink > 1:
+                return False
+            os.remove(blob)
+            return True
+        except OSError as exc:
+            if exc.errno != errno.ENOENT:
+                logger.warning('Unable to release blob %s: %s', digest, exc)
+            return False
+
+    def manifest(self, working_dir):
+        """ Blobs digests linked in working dir """
+        try:
+            with open(join(working_dir, MANIFEST)) as fp:
+                return set(line.strip() for line in fp if line.strip())
+        except IOError:
+            return set()
+
+    def release(self, digests):
+        """ Remove blobs no longer linked by any job (call once jobs working dirs are deleted)
+
+        :param digests: blobs digests, i.e :func:`manifest` of deleted working dirs
+        :return: number of removed blobs
+        """
+        return len([digest for digest in digests if self._remove_unused(digest)])
+
+    def collect(self):
+        """ Scan whole store, remove all blobs no longer linked by any job
+
+        :return: number of removed blobs
+        """
+        removed = 0
+        if not os.path.isdir(self.root):
+            return removed
+        for level1 in os.listdir(self.root):
+            if len(level1) != 2:
+                continue
+            for dir_path, _, file_names in os.walk(join(self.root, level1)):
+                removed += self.release(file_names)
+        return removed
+
+
+#: Process wide blob store
+blob_store = BlobStore()
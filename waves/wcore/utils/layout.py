@@ -0,0 +1,118 @@
+"""
+WAVES jobs working dirs layout
+
+Jobs working dirs paths are resolved by the layout set in ``JOB_DIR_LAYOUT`` setting:
+    - :class:`FlatLayout`: ``JOB_BASE_DIR/<slug>`` (default)
+    - :class:`ShardedLayout`: ``JOB_BASE_DIR/ab/cd/<slug>``, where ``abcd`` are job slug first hex digits, keeping
+      directories entries count low with many jobs
+
+A job working dir not yet moved to current layout place (see ``waves relayout`` command) is still found in its
+previous place.
+"""
+from __future__ import unicode_literals
+
+import os
+import re
+import uuid
+from os.path import isdir, join
+
+from waves.wcore.settings import waves_settings
+
+__all__ = ['FlatLayout', 'ShardedLayout', 'job_dir_layout']
+
+SHARD_RE = re.compile(r'^[0-9a-f]{2}$')
+
+
+def parse_slug(dir_name):
+    """ Job slug from directory name, None if directory is not a job one """
+    try:
+        return uuid.UUID('{%s}' % dir_name)
+    except ValueError:
+        return None
+
+
+class FlatLayout(object):
+    """ Jobs working dirs directly in ``JOB_BASE_DIR`` """
+
+    def __init__(self, base_dir=None):
+        self._base_dir = base_dir
+
+    @property
+    def base_dir(self):
+        return self._base_dir or waves_settings.JOB_BASE_DIR
+
+    def relative_path(self, slug):
+        """ Job working dir path, relative to base dir (also used for remote jobs dirs) """
+        return str(slug)
+
+    def expected_path(self, slug):
+        return join(self.base_dir, self.relative_path(slug))
+
+    def previous_paths(self, slug):
+        """ Places where job working dir may have been created with another layout """
+        return [ShardedLayout(self.base_dir).expected_path(slug)]
+
+    def path(self, slug):
+        """ Job working dir path, current place if dir has not been moved to expected place yet """
+        expected = self.expected_path(slug)
+        if not isdir(expected):
+            for previous in self.previous_paths(slug):
+                if isdir(previous):
+                    return previous
+        return expected
+
+    def scan(self):
+        """ Iterate over all jobs working dirs found in base dir, whatever their layout
+
+        :return: generator of tuples (slug, path)
+        """
+        if not isdir(self.base_dir):
+            return
+        for dir_path, dir_names, _ in os.walk(self.base_dir):
+            shards = []
+            for dir_name in dir_names:
+                slug = parse_slug(dir_name)
+                if slug is not None:
+                    yield slug, join(dir_path, dir_name)
+                elif SHARD_RE.match(dir_name):
+                    shards.append(dir_name)
+            # do not walk into jobs working dirs
+            dir_names[:] = shards
+
+    def misplaced(self):
+        """ Iterate over jobs working dirs not at their expected place
+
+        :return: generator of tuples (slug, current path, expected path)
+        """
+        for slug, current in self.scan():
+            expected = self.expected_path(slug)
+            if os.path.normpath(current) != os.path.normpath(expected):
+                yield slug, current, expected
+
+
+class ShardedLayout(FlatLayout):
+    """ Jobs working dirs in nested directories named after job slug first hex digits """
+    #: Nested directories levels
+    depth = 2
+    #: Nested directories names length
+    width = 2
+
+    def relative_path(self, slug):
+        digits = uuid.UUID(str(slug)).hex
+        shards = [digits[i * self.width:(i + 1) * self.width] for i in range(self.depth)]
+        return join(*(shards + [str(slug)]))
+
+    def previous_paths(self, slug):
+        return [FlatLayout(self.base_dir).expected_path(slug)]
+
+
+_layout = None
+
+
+def job_dir_layout():
+    """ Current jobs working dirs layout (see ``JOB_DIR_LAYOUT`` setting) """
+    global _layout
+    clazz = waves_settings.JOB_DIR_LAYOUT
+    if _layout is None or _layout.__class__ is not clazz:
+        _layout = clazz()
+    return _layout
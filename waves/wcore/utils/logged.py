@@ -1,43 +1,139 @@
 from __future__ import unicode_literals
 
+import io
 import logging
 import os
 import stat
+import threading
+from collections import OrderedDict
 
 from django.conf import settings
 
 logger_file = logging.getLogger(__name__)
 
+__all__ = ['LoggerClass', 'LogFilesCache', 'LogFileHandler', 'log_files']
+
+
+class LogFilesCache(object):
+    """
+    Process wide bounded cache of open log files: least recently written files are closed once ``JOB_LOG_FILES_MAX``
+    files are open, they are reopened (append mode) on next write.
+    """
+
+    def __init__(self, size=None):
+        self._size = size
+        self._lock = threading.RLock()
+        self._streams = OrderedDict()
+
+    @property
+    def size(self):
+        if self._size is None:
+            from waves.wcore.settings import waves_settings
+            return waves_settings.JOB_LOG_FILES_MAX
+        return self._size
+
+    def __len__(self):
+        return len(self._streams)
+
+    def _stream(self, file_path):
+        """ Open log file stream, most recently used (call with lock held) """
+        stream = self._streams.pop(file_path, None)
+        if stream is None:
+            while self._streams and len(self._streams) >= max(1, self.size):
+                self._streams.popitem(last=False)[1].close()
+            stream = io.open(file_path, 'a', encoding='utf-8')
+            mode = os.stat(file_path).st_mode
+            if not bool(mode & stat.S_IWGRP):
+                os.chmod(file_path, 0o664)
+        self._streams[file_path] = stream
+        return stream
+
+    def open(self, file_path):
+        """ Open log file (created if needed)
+
+        :raise: IOError, OSError if file can not be opened
+        """
+        with self._lock:
+            self._stream(file_path)
+
+    def write(self, file_path, text):
+        with self._lock:
+            stream = self._stream(file_path)
+            stream.write(text)
+            stream.flush()
+
+    def close(self, file_path=None):
+        """ Close log file stream, all streams if file_path is None """
+        with self._lock:
+            paths = list(self._streams.keys()) if file_path is None else [file_path]
+            for path in paths:
+                stream = self._streams.pop(path, None)
+                if stream is not None:
+                    stream.close()
+
+    def close_dir(self, dir_path):
+        """ Close all log files streams within a directory (i.e before its removal) """
+        prefix = os.path.join(dir_path, '')
+        with self._lock:
+            for path in [path for path in self._streams if path.startswith(prefix)]:
+                self._streams.pop(path).close()
+
+
+#: Process wide open log files cache
+log_files = LogFilesCache()
+
+
+class LogFileHandler(logging.Handler):
+    """ Append log records to a file, through :data:`log_files` bounded open files cache """
+
+    def __init__(self, file_path, files_cache=None):
+        logging.Handler.__init__(self)
+        self.file_path = file_path
+        self.files_cache = files_cache or log_files
+
+    def emit(self, record):
+        try:
+            msg = self.format(record)
+            if isinstance(msg, bytes):
+                msg = msg.decode('utf-8', 'replace')
+            self.files_cache.write(self.file_path, msg + '\n')
+        except Exception:
+            self.handleError(record)
+
 
 class LoggerClass(object):
     LOG_LEVEL = logging.DEBUG
     log_dir = os.path.dirname(settings.BASE_DIR)
     _logger = None
+    #: Logger name current logger has been set up for (fallback logger included, file is not opened again)
+    _logger_for = None
 
     @property
     def logger(self):
         """ Get or create a new logger for this job
 
+        Loggers are not registered in logging module (they are released with object), they write through
+        process wide :data:`log_files` cache, open files count is bounded by ``JOB_LOG_FILES_MAX`` setting.
+        When log file can not be opened, errors logger is used instead for object lifetime.
+
         :return: Logger"""
-        self._logger = logging.getLogger(self.logger_name)
-        if not len(self._logger.handlers):
-            # Add handler only once !
+        if self._logger is None or self._logger_for != self.logger_name:
+            self._logger_for = self.logger_name
             try:
-                hdlr = logging.FileHandler(self.log_file)
-                mode = os.stat(self.log_file).st_mode
-                if not bool(mode & stat.S_IWGRP):
-                    os.chmod(self.log_file, 0o664)
+                log_files.open(self.log_file)
+                self._logger = logging.Logger(self.logger_name, self.LOG_LEVEL)
+                hdlr = LogFileHandler(self.log_file)
                 formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
                 hdlr.setFormatter(formatter)
                 self._logger.propagate = False
                 self._logger.addHandler(hdlr)
-                self._logger.setLevel(self.LOG_LEVEL)
             except OSError as e:
-                logger_file.exception("OSError in %s: %s [file:%s]", self.__class__.__name__, e.message, e.filename)
+                self._logger = logging.getLogger("waves.errors")
+                logger_file.exception("OSError in %s: %s [file:%s]", self.__class__.__name__, e, e.filename)
             except IOError as err:
                 self._logger = logging.getLogger("waves.errors")
                 self._logger.warn('This object %s is not able to log where it should %s', self.pk, self.log_file)
-                logger_file.exception("IO Error in %s: %s", self.__class__.__name__, err.message)
+                logger_file.exception("IO Error in %s: %s", self.__class__.__name__, err)
         return self._logger
 
     @property
@@ -9,6 +9,7 @@ from django.http import HttpResponse, HttpResponseRedirect
 from django.utils.encoding import smart_str
 from django.views import generic
 from waves.wcore.models.base import ExportAbleMixin
+from waves.wcore.utils.archive import file_exists, file_size, open_file, read_head
 
 
 class DownloadFileView(generic.DetailView):
@@ -32,7 +33,11 @@ class DownloadFileView(generic.DetailView):
         self.object = self.get_object()
         if isinstance(self.object, ExportAbleMixin):
             self.object.serialize()
-        self.file_type = magic.from_file(self.file_path)
+        try:
+            # job files may be archived, file type is guessed from first bytes
+            self.file_type = magic.from_buffer(read_head(self.file_path))
+        except IOError:
+            raise Http404('File does not exists')
         export = 'export' in self.request.GET or self._force_download is True
         if 'text' not in self.file_type and not export:
             return HttpResponseRedirect(self.request.path + "?export=1")
@@ -44,11 +49,12 @@ class DownloadFileView(generic.DetailView):
         # Sniff if we need to return a CSV export
         export = 'export' in self.request.GET or self._force_download is True
         if export:
-            wrapper = FileWrapper(open(self.file_path, 'r'))
+            wrapper = FileWrapper(open_file(self.file_path))
             response = HttpResponse(wrapper, content_type='application/force-download')
             response['Content-Disposition'] = 'attachment; filename="' + self.file_name + '"'
-            response['X-Sendfile'] = smart_str(self.file_path)
-            response['Content-Length'] = os.path.getsize(self.file_path)
+            if os.path.isfile(self.file_path):
+                response['X-Sendfile'] = smart_str(self.file_path)
+            response['Content-Length'] = file_size(self.file_path)
             return response
         else:
             return super(DownloadFileView, self).render_to_response(context, **response_kwargs)
@@ -57,13 +63,13 @@ class DownloadFileView(generic.DetailView):
         """ Add file_content / return link / file_description / file_name to context """
         context = super(DownloadFileView, self).get_context_data(**kwargs)
         try:
-            if not os.path.isfile(self.file_path):
+            if not file_exists(self.file_path):
                 raise Http404('File does not exists')
         except AttributeError as e:
             raise Http404('File does not exists %s' % e)
         if 'export' not in self.request.GET:
             if 'text' in self.file_type:
-                with open(self.file_path) as fp:
+                with open_file(self.file_path, 'r') as fp:
                     context['file_content'] = fp.read()
             else:
                 context['file_content'] = "Not Printable data (Human readable)"
@@ -288,7 +288,8 @@ CRONTAB_DJANGO_SETTINGS_MODULE = 'waves_core.crontab'
 CRONTAB_LOCK_JOBS = True
 CRONJOBS = [
     ('* * * * *', 'waves.wcore.cron.process_job_queue'),
-    ('*/10 * * * *', 'waves.wcore.cron.purge_old_jobs')
+    ('*/10 * * * *', 'waves.wcore.cron.purge_old_jobs'),
+    ('* * * * *', 'waves.wcore.cron.send_queued_mails'),
 ]
 
 